@@ -1,30 +1,92 @@
 # app.py
 import sqlite3
-from datetime import datetime
+from datetime import date, datetime
 import base64
-import csv
+import hashlib
+import hmac
 from pathlib import Path
 import json
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response
 import io
 import os
 import random
+import threading
+import time
+import functools
+
+from events import broker, stream_events, parse_last_event_id
+import pdf_report
+import exports
+from jobs import job_manager
+import metrics
+import profiler
+import customers
+import idempotency
+import validation
+import partitions
+import replication
+import storage
+import leadtime
+import workshops
+import catalogue
+import prices
+import forecasting
 
 # ========== Flask приложение ==========
 app = Flask(__name__)
+# Учет задержек и SQL по маршрутам (если FURNITURE_METRICS=1)
+metrics.init_app(app)
+# Профили медленных запросов (/admin/profiles)
+profiler.init_app(app)
 
 # ========== База данных SQLite ==========
-def init_db():
-    # Подключаемся к существующей базе данных из файла или создаем новую
-    conn = sqlite3.connect('furniture_production.db')
-    cursor = conn.cursor()
-    
-    # Удаляем старые таблицы, если они есть (для тестирования)
-    cursor.execute("DROP TABLE IF EXISTS aggregated_products")
-    cursor.execute("DROP TABLE IF EXISTS orders")
-    cursor.execute("DROP TABLE IF EXISTS products")
-    
-    # Создаем таблицы
+# Путь к файлу базы данных (можно переопределить переменной окружения)
+DB_PATH = os.environ.get('FURNITURE_DB_PATH', 'furniture_production.db')
+
+def get_db_connection():
+    """Открывает новое соединение с базой данных"""
+    if metrics.ENABLED or profiler.ENABLED:
+        # Соединение с замером времени каждого SQL-запроса
+        return metrics.connect(DB_PATH)
+    return sqlite3.connect(DB_PATH)
+
+def analytics_db_path():
+    """База для отчетов: аналитическая копия (FURNITURE_ANALYTICS_DB), если она готова"""
+    return replication.reporting_db_path(DB_PATH)
+
+def get_analytics_connection():
+    """Соединение для отчетов и сводки; без копии - основная база"""
+    path = analytics_db_path()
+    if metrics.ENABLED or profiler.ENABLED:
+        return metrics.connect(path)
+    return sqlite3.connect(path)
+
+# Цены артикулов на дату: история в SQLite, интервалы кэшируются в памяти (см. prices.py)
+price_book = prices.PriceBook(get_db_connection)
+
+# Каталог, заказы, сводка: SQLite или PostgreSQL (FURNITURE_STORAGE, см. storage.py)
+storage_backend = storage.create_storage(get_db_connection, get_analytics_connection, price_book)
+
+# Маршруты, которым нужны таблицы, которые есть только в SQLite
+# (покупатели, история статусов, секции, выгрузки, аналитическая копия)
+SQLITE_ONLY_PATHS = ('/api/orders/', '/api/customers', '/api/jobs', '/api/reports/pdf', '/api/replication',
+                     '/api/lead_time', '/api/workshops', '/api/forecast')
+# Исключения: страницы заказов и счетчики статусов дашборда есть в любом хранилище
+STORAGE_PATHS = ('/api/orders/page', '/api/orders/status_counts')
+
+def sqlite_only_route(path):
+    """Маршрут недоступен при текущем хранилище"""
+    return (storage_backend.name != 'sqlite' and path.startswith(SQLITE_ONLY_PATHS)
+            and path not in STORAGE_PATHS)
+
+# Оценка даты отгрузки: маршруты артикулов и очередь цехов (см. leadtime.py)
+lead_times = leadtime.LeadTimeEstimator(get_db_connection)
+
+# CSV с каталогом продукции
+CSV_PATH = os.environ.get('FURNITURE_CSV_PATH', 'combined_data.csv')
+
+def create_schema(cursor):
+    """Создает недостающие таблицы (существующие данные не трогает)"""
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS products (
         id INTEGER PRIMARY KEY,
@@ -82,120 +144,233 @@ def init_db():
     )
     ''')
     
-    # Загружаем данные из CSV файла
-    load_data_from_csv(conn, cursor)
+    # Служебные данные: версия загруженного каталога
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS catalogue_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    ''')
+    
+    # Индексы для постраничной выдачи (новые заказы сверху, производство по id)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_date_id ON orders (order_date, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_aggregated_name ON aggregated_products (product_name, article)")
     
-    # Создаем агрегированные данные
-    create_aggregated_data(conn, cursor)
+    create_status_schema(cursor)
+    customers.create_customer_schema(cursor)
     
-    conn.commit()
-    conn.close()
+    # Ключ идемпотентности заказа (колонка добавляется и в существующие базы)
+    cursor.execute("PRAGMA table_info(orders)")
+    if 'idempotency_key' not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE orders ADD COLUMN idempotency_key TEXT")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_idempotency ON orders (idempotency_key) "
+                   "WHERE idempotency_key IS NOT NULL")
+    
+    create_items_schema(cursor)
+    # Счетчики загрузки цехов открытыми заказами (триггеры на orders и order_items)
+    workshops.create_workshop_load_schema(cursor)
+    # Отчеты о перезагрузках каталога (что изменилось в CSV) и интервалы цен артикулов
+    catalogue.create_catalogue_schema(cursor)
+    prices.create_price_history_schema(cursor)
+    # Прогноз спроса по артикулам (пересчитывается фоновой задачей)
+    forecasting.create_forecast_schema(cursor)
 
-def load_data_from_csv(conn, cursor):
-    """Загрузка данных из CSV файла в базу данных"""
-    try:
-        csv_file_path = 'combined_data.csv'
-        if not os.path.exists(csv_file_path):
-            print(f"Файл {csv_file_path} не найден!")
-            return
-            
-        with open(csv_file_path, 'r', encoding='utf-8-sig') as file:
-            csv_reader = csv.DictReader(file)
-            
-            # Проверяем заголовки
-            print(f"Заголовки CSV: {csv_reader.fieldnames}")
-            
-            for i, row in enumerate(csv_reader, 1):
-                try:
-                    # Преобразуем числовые значения
-                    article = int(row['article']) if row['article'] and row['article'].isdigit() else 0
-                    
-                    # Обрабатываем числовые поля
-                    product_type_coefficient = float(row['product_type_coefficient']) if row['product_type_coefficient'] else 0.0
-                    minimum_partner_price = float(row['minimum_partner_price']) if row['minimum_partner_price'] else 0.0
-                    raw_material_loss_percentage = float(row['raw_material_loss_percentage']) if row['raw_material_loss_percentage'] else 0.0
-                    number_of_people = int(row['number_of_people_for_production']) if row['number_of_people_for_production'] else 0
-                    manufacturing_time = float(row['manufacturing_time_hours']) if row['manufacturing_time_hours'] else 0.0
-                    total_labor = float(row['total_labor_hours']) if row['total_labor_hours'] else 0.0
-                    
-                    cursor.execute('''
-                    INSERT INTO products (
-                        id, product_name, article, product_type, product_type_coefficient,
-                        minimum_partner_price, main_material, raw_material_loss_percentage,
-                        workshop_name, workshop_type, number_of_people_for_production,
-                        manufacturing_time_hours, total_labor_hours
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        int(row['id']),
-                        row['product_name'],
-                        article,
-                        row['product_type'],
-                        product_type_coefficient,
-                        minimum_partner_price,
-                        row['main_material'],
-                        raw_material_loss_percentage,
-                        row['workshop_name'],
-                        row['workshop_type'],
-                        number_of_people,
-                        manufacturing_time,
-                        total_labor
-                    ))
-                    
-                    if i % 20 == 0:
-                        print(f"Загружено {i} записей...")
-                        
-                except Exception as e:
-                    print(f"Ошибка при обработке строки {i}: {e}")
-                    print(f"Данные строки: {row}")
-                    
-        print(f"Всего загружено {i} записей из CSV файла")
-        
-    except Exception as e:
-        print(f"Ошибка при загрузке данных из CSV: {e}")
+# ========== Состав заказа ==========
+# Заказ с одним товаром хранится только в шапке (orders), как раньше; заказ из
+# корзины - шапкой с итогами и строками в order_items. Представление order_lines
+# дает строки всех заказов (включая секции старых месяцев) для отчетов по товарам.
+def create_items_schema(cursor):
+    """Строки заказов и колонка orders.items_count (для старых баз - миграция)"""
+    cursor.execute("PRAGMA table_info(orders)")
+    if 'items_count' not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE orders ADD COLUMN items_count INTEGER NOT NULL DEFAULT 1")
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS order_items (
+        order_id INTEGER NOT NULL,
+        line_no INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        product_name TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        unit_price REAL,
+        line_total REAL,
+        PRIMARY KEY (order_id, line_no)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items (product_id)")
+    # Представления order_lines и orders_all (с секциями по месяцам) - в partitions.py
+    partitions.create_partition_schema(cursor)
+    # Журнал изменений заказов для аналитической копии (триггеры - только если она включена)
+    replication.create_changelog_schema(cursor)
+
+# ========== Статусы заказов ==========
+# Допустимые переходы: новый -> в производстве -> готов -> доставлен, отмена до доставки
+ORDER_STATUSES = ('новый', 'в производстве', 'готов', 'доставлен', 'отменён')
+STATUS_TRANSITIONS = {
+    'новый': ('в производстве', 'отменён'),
+    'в производстве': ('готов', 'отменён'),
+    'готов': ('доставлен', 'отменён'),
+    'доставлен': (),
+    'отменён': (),
+}
+# Открытые заказы: для каждого статуса частичный индекс, экраны цехов читают только их
+ACTIVE_STATUSES = ('новый', 'в производстве', 'готов')
+
+def create_status_schema(cursor):
+    """История статусов, частичные индексы и счетчики заказов по статусам"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS order_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id INTEGER NOT NULL,
+        from_status TEXT,
+        to_status TEXT NOT NULL,
+        comment TEXT,
+        changed_at TIMESTAMP NOT NULL
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_events_order ON order_events (order_id, id)")
+    
+    for n, status in enumerate(ACTIVE_STATUSES):
+        # Статус - литерал из константы: частичный индекс применим только к литералу в WHERE
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_orders_open_{n} ON orders (order_date, id) "
+                       f"WHERE status = '{status}'")
+    
+    # Счетчики по статусам поддерживаются триггерами при любой вставке и смене статуса
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'order_status_counts'")
+    counts_exist = cursor.fetchone() is not None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS order_status_counts (
+        status TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    )
+    ''')
+    if not counts_exist:
+        cursor.execute("INSERT INTO order_status_counts (status, count) "
+                       "SELECT status, COUNT(*) FROM orders WHERE status IS NOT NULL GROUP BY status")
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_orders_count_insert AFTER INSERT ON orders
+    WHEN NEW.status IS NOT NULL
+    BEGIN
+        INSERT INTO order_status_counts (status, count) VALUES (NEW.status, 1)
+        ON CONFLICT (status) DO UPDATE SET count = count + 1;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_orders_count_update AFTER UPDATE OF status ON orders
+    WHEN OLD.status IS NOT NEW.status
+    BEGIN
+        UPDATE order_status_counts SET count = count - 1 WHERE status = OLD.status;
+        INSERT INTO order_status_counts (status, count) VALUES (NEW.status, 1)
+        ON CONFLICT (status) DO UPDATE SET count = count + 1;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_orders_count_delete AFTER DELETE ON orders
+    BEGIN
+        UPDATE order_status_counts SET count = count - 1 WHERE status = OLD.status;
+    END
+    ''')
 
-def create_aggregated_data(conn, cursor):
-    """Создание агрегированных данных по продуктам"""
+def csv_version(csv_file_path=None):
+    """Версия каталога - хэш содержимого CSV (используется в ключах кэшей)"""
+    csv_file_path = csv_file_path or CSV_PATH
+    if not os.path.exists(csv_file_path):
+        return None
+    digest = hashlib.sha1()
+    with open(csv_file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def init_db(force_reload=False):
+    """
+    Подготовка базы: создает недостающие таблицы и загружает каталог из CSV,
+    только если его версия изменилась (или force_reload). Заказы сохраняются.
+    Возвращает True, если каталог был перезагружен.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        print("Создание агрегированных данных...")
-        
-        # Сначала очистим таблицу
-        cursor.execute("DELETE FROM aggregated_products")
-        
-        # Используем правильные имена столбцов
-        cursor.execute('''
-        INSERT INTO aggregated_products (
-            article, product_name, product_type, product_type_coefficient,
-            minimum_partner_price, main_material, raw_material_loss_percentage,
-            total_production_hours, avg_manufacturing_time, workshop_count
-        )
-        SELECT 
-            article,
-            product_name,
-            product_type,
-            AVG(product_type_coefficient) as avg_coefficient,
-            MIN(minimum_partner_price) as min_price,
-            main_material,
-            AVG(raw_material_loss_percentage) as avg_loss,
-            SUM(total_labor_hours) as total_hours,
-            AVG(manufacturing_time_hours) as avg_time,
-            COUNT(*) as workshop_count
-        FROM products
-        GROUP BY article, product_name, product_type, main_material
-        ORDER BY product_name
-        ''')
-        
-        print("Агрегированные данные успешно созданы")
-        
-        # Проверяем сколько записей создано
-        cursor.execute("SELECT COUNT(*) FROM aggregated_products")
-        count = cursor.fetchone()[0]
-        print(f"Создано {count} агрегированных записей")
-        
-    except Exception as e:
-        print(f"Ошибка при создании агрегированных данных: {e}")
+        # Блокировка записи: параллельно стартующие воркеры загружают каталог один раз
+        cursor.execute("BEGIN IMMEDIATE")
+        create_schema(cursor)
+        # Заказы без покупателя (старая база, генератор данных) привязываются при старте
+        linked = customers.link_unassigned_orders(cursor)
+        if linked:
+            print(f"Привязано заказов к покупателям: {linked}")
+        
+        version = csv_version()
+        row = cursor.execute("SELECT value FROM catalogue_meta WHERE key = 'version'").fetchone()
+        loaded_version = row[0] if row else None
+        if not force_reload and version is not None and version == loaded_version:
+            conn.commit()
+            return False
+        if version is None and loaded_version is not None:
+            # CSV нет рядом, но каталог уже загружен раньше
+            conn.commit()
+            return False
+        
+        # Каталог изменился: применяем только разницу с текущими товарами, заказы остаются
+        report = catalogue.reload_catalogue(cursor, CSV_PATH, version)
+        print(f"Каталог: добавлено {report['rows_added']}, изменено {report['rows_updated']}, "
+              f"удалено {report['rows_removed']}, без изменений {report['rows_unchanged']} строк; "
+              f"смена цены у {report['price_changes']} товаров")
+        if report['articles']:
+            catalogue.refresh_aggregated(cursor, None if report['initial'] else report['articles'])
+            # Новые цены открывают интервалы в истории цен
+            prices.record_prices(cursor, report['articles'])
+            # Трудоемкость по маршрутам могла измениться
+            workshops.rebuild_workshop_load(cursor)
+        conn.commit()
+        lead_times.invalidate(report['articles'])
+        price_book.invalidate(report['articles'])
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+_db_ready = False
+_db_lock = threading.Lock()
 
-# Инициализация БД
-init_db()
+def db_ready():
+    return _db_ready
+
+def ensure_db():
+    """Однократная подготовка базы в процессе (при первом запросе)"""
+    global _db_ready
+    if replication.ENABLED and _db_ready:
+        # Поток копии своего процесса (после fork воркера запускается заново)
+        replication.start(DB_PATH)
+    if _db_ready:
+        return
+    with _db_lock:
+        if not _db_ready:
+            started = time.perf_counter()
+            reloaded = init_db()
+            if storage_backend.name != 'sqlite':
+                # Каталог загружается из CSV в SQLite и копируется на сервер
+                storage_backend.create_schema()
+                conn = get_db_connection()
+                try:
+                    storage_backend.sync_catalogue(conn)
+                finally:
+                    conn.close()
+            print(f"База данных готова за {time.perf_counter() - started:.3f} с"
+                  + (" (каталог загружен из CSV)" if reloaded else ""))
+            if storage_backend.name != 'sqlite':
+                print(f"Хранилище {storage_backend.name} поддерживается частично: заказы (список, страницы, "
+                      f"создание, счетчики статусов), сводка и диаграммы; каталог читается из SQLite; "
+                      f"маршруты {', '.join(SQLITE_ONLY_PATHS)} отвечают 501")
+            _db_ready = True
+            if replication.ENABLED:
+                replication.start(DB_PATH)
+
+@app.before_request
+def _ensure_db_before_request():
+    ensure_db()
+    if sqlite_only_route(request.path):
+        return jsonify({"error": f"Маршрут не поддерживается хранилищем {storage_backend.name}"}), 501
 
 # Функция для создания логотипа из PNG файла
 def create_logo():
@@ -230,9 +405,8 @@ def create_logo():
         logo_base64 = "data:image/svg+xml;base64," + base64.b64encode(svg_content.encode('utf-8')).decode('utf-8')
         return logo_base64
 
-logo_base64 = create_logo()
-
 # ========== HTML страница с полным визуальным обновлением ==========
+# Логотип подставляется при первом запросе главной страницы (см. index_html)
 html_content = '''
 <!DOCTYPE html>
 <html lang="ru">
@@ -691,6 +865,116 @@ html_content = '''
             border-bottom: none;
         }
         
+        /* Virtualized tables: прокрутка внутри контейнера, шапка закреплена */
+        .table-container.virtual-scroll {
+            max-height: 70vh;
+            overflow-y: auto;
+        }
+        
+        .virtual-scroll .data-table th {
+            position: sticky;
+            top: 0;
+            z-index: 1;
+            background: var(--bg-secondary);
+        }
+        
+        .virtual-scroll .data-table td {
+            white-space: nowrap;
+        }
+        
+        .virtual-scroll .virtual-spacer td {
+            padding: 0;
+            border: none;
+        }
+        
+        .filter-input {
+            width: auto;
+            min-width: 180px;
+            padding: 10px 14px;
+        }
+        
+        .status-counts {
+            display: flex;
+            flex-wrap: wrap;
+            gap: 10px;
+            margin-bottom: 15px;
+        }
+        
+        .catalogue-banner {
+            background: var(--bg-card);
+            border: 1px solid var(--border-color);
+            border-left: 4px solid var(--accent-color);
+            border-radius: var(--radius-md);
+            padding: 10px 14px;
+            margin-bottom: 16px;
+            font-size: 0.9rem;
+        }
+        
+        .catalogue-banner ul {
+            margin: 6px 0 0 18px;
+            color: var(--text-secondary);
+        }
+        
+        .workshop-load {
+            display: grid;
+            grid-template-columns: repeat(auto-fill, minmax(260px, 1fr));
+            gap: 12px;
+            margin-bottom: 20px;
+        }
+        
+        .workshop-card {
+            background: var(--bg-card);
+            border: 1px solid var(--border-color);
+            border-radius: var(--radius-md);
+            padding: 12px 14px;
+        }
+        
+        .workshop-card-title {
+            font-size: 14px;
+            font-weight: 600;
+            color: var(--text-primary);
+        }
+        
+        .workshop-card-meta {
+            margin-top: 6px;
+            font-size: 12px;
+            color: var(--text-muted);
+        }
+        
+        .load-bar {
+            height: 8px;
+            margin-top: 8px;
+            border-radius: 4px;
+            background: var(--border-color);
+            overflow: hidden;
+        }
+        
+        .load-bar-fill {
+            height: 100%;
+            background: var(--success-color);
+        }
+        
+        .load-bar-fill.load-high {
+            background: var(--warning-color);
+        }
+        
+        .load-bar-fill.load-over {
+            background: var(--danger-color);
+        }
+        
+        .status-btn {
+            padding: 6px 12px;
+            font-size: 12px;
+            border-radius: var(--radius-md);
+            cursor: pointer;
+        }
+        
+        .table-counter {
+            font-size: 13px;
+            color: var(--text-muted);
+            white-space: nowrap;
+        }
+        
         /* Badges */
         .badge {
             display: inline-flex;
@@ -893,6 +1177,20 @@ html_content = '''
             box-shadow: 0 0 0 3px rgba(79, 70, 229, 0.1);
         }
         
+        .form-input.field-invalid, .form-select.field-invalid, .form-textarea.field-invalid {
+            border-color: var(--danger-color);
+        }
+        
+        .customer-hint {
+            margin-top: 6px;
+            font-size: 13px;
+            color: var(--success-color);
+        }
+        
+        .customer-hint:empty {
+            display: none;
+        }
+        
         .form-textarea {
             min-height: 120px;
             resize: vertical;
@@ -990,6 +1288,10 @@ html_content = '''
             color: var(--text-secondary);
         }
         
+        .stat-archived {
+            font-size: 12px;
+        }
+        
         /* Loading Animation */
         .loading {
             display: flex;
@@ -1121,7 +1423,7 @@ html_content = '''
         <!-- Header -->
         <header class="header">
             <div class="logo-container">
-                <img src="''' + logo_base64 + '''" alt="Логотип Furniture Pro" class="logo">
+                <img src="__LOGO_SRC__" alt="Логотип Furniture Pro" class="logo">
                 <div class="title-container">
                     <h1 class="main-title">Furniture Pro</h1>
                     <p class="subtitle">Система управления мебельным производством</p>
@@ -1181,7 +1483,8 @@ html_content = '''
                 <div class="stat-icon orders">📊</div>
                 <div class="stat-info">
                     <div class="stat-value" id="total-orders">0</div>
-                    <div class="stat-label">Всего заказов</div>
+                    <div class="stat-label">Заказов в базе</div>
+                    <div class="stat-label stat-archived" id="archived-orders"></div>
                 </div>
             </div>
             
@@ -1205,7 +1508,8 @@ html_content = '''
                 <div class="stat-icon revenue">💰</div>
                 <div class="stat-info">
                     <div class="stat-value" id="total-revenue">0</div>
-                    <div class="stat-label">Общая выручка</div>
+                    <div class="stat-label">Выручка заказов в базе</div>
+                    <div class="stat-label stat-archived" id="archived-revenue"></div>
                 </div>
             </div>
         </div>
@@ -1218,6 +1522,12 @@ html_content = '''
                     <h2>Каталог товаров</h2>
                 </div>
                 <div class="section-actions">
+                    <span class="table-counter" id="products-counter"></span>
+                    <input type="search" id="products-search" class="form-input filter-input"
+                           placeholder="Название или артикул" oninput="onProductsFilterChange()">
+                    <select id="products-type-filter" class="form-select filter-input" onchange="loadProducts()">
+                        <option value="">Все типы</option>
+                    </select>
                     <button class="action-btn secondary-btn" onclick="loadRandomProducts()">
                         <i class="fas fa-sync-alt"></i>
                         Обновить
@@ -1226,9 +1536,19 @@ html_content = '''
                         <i class="fas fa-download"></i>
                         Экспорт
                     </button>
+                    <button class="action-btn secondary-btn" onclick="downloadPdfReport()">
+                        <i class="fas fa-file-pdf"></i>
+                        PDF-отчет
+                    </button>
+                    <button class="action-btn secondary-btn" onclick="runJob('excel', 'Excel-отчет')">
+                        <i class="fas fa-file-excel"></i>
+                        Excel-отчет
+                    </button>
                 </div>
             </div>
             
+            <div class="catalogue-banner" id="catalogue-banner" hidden></div>
+            
             <div class="table-container">
                 <table class="data-table" id="products-table">
                     <thead>
@@ -1304,6 +1624,26 @@ html_content = '''
                         <label class="form-label required">Количество</label>
                         <input type="number" id="quantity" class="form-input" min="1" value="1" required onchange="updatePrice()">
                     </div>
+                    
+                    <button type="button" class="action-btn secondary-btn" onclick="addToCart()">
+                        <i class="fas fa-cart-plus"></i>
+                        Добавить в корзину
+                    </button>
+                    
+                    <div id="cart-container" style="display: none; margin-top: 20px;">
+                        <table class="data-table">
+                            <thead>
+                                <tr>
+                                    <th>Товар</th>
+                                    <th>Кол-во</th>
+                                    <th>Цена</th>
+                                    <th>Сумма</th>
+                                    <th></th>
+                                </tr>
+                            </thead>
+                            <tbody id="cart-body"></tbody>
+                        </table>
+                    </div>
                 </div>
                 
                 <!-- Customer Information -->
@@ -1321,6 +1661,7 @@ html_content = '''
                         <div class="form-group">
                             <label class="form-label required">Телефон</label>
                             <input type="tel" id="customerPhone" class="form-input" required placeholder="+7 (999) 123-45-67">
+                            <div class="customer-hint" id="customerHint"></div>
                         </div>
                         <div class="form-group">
                             <label class="form-label">Email</label>
@@ -1360,6 +1701,7 @@ html_content = '''
                         <div class="form-group">
                             <label class="form-label">Желаемая дата доставки</label>
                             <input type="date" id="deliveryDate" class="form-input">
+                            <div class="customer-hint" id="shipHint"></div>
                         </div>
                     </div>
                     
@@ -1401,6 +1743,23 @@ html_content = '''
                     <h2>История заказов</h2>
                 </div>
                 <div class="section-actions">
+                    <span class="table-counter" id="orders-counter"></span>
+                    <input type="search" id="orders-search" class="form-input filter-input"
+                           placeholder="Клиент, телефон, товар или #id" oninput="onOrdersFilterChange()">
+                    <select id="orders-status-filter" class="form-select filter-input" onchange="loadOrders()">
+                        <option value="">Все статусы</option>
+                        <option value="новый">Новые</option>
+                        <option value="в производстве">В производстве</option>
+                        <option value="готов">Готовые</option>
+                        <option value="доставлен">Доставленные</option>
+                        <option value="отменён">Отмененные</option>
+                    </select>
+                    <select id="orders-urgency-filter" class="form-select filter-input" onchange="loadOrders()">
+                        <option value="">Любая срочность</option>
+                        <option value="обычный">Обычный</option>
+                        <option value="срочный">Срочный</option>
+                        <option value="очень срочно">Очень срочно</option>
+                    </select>
                     <button class="action-btn secondary-btn" onclick="loadOrders()">
                         <i class="fas fa-sync-alt"></i>
                         Обновить
@@ -1408,6 +1767,8 @@ html_content = '''
                 </div>
             </div>
             
+            <div class="status-counts" id="status-counts"></div>
+            
             <div class="table-container">
                 <table class="data-table" id="orders-table">
                     <thead>
@@ -1421,11 +1782,12 @@ html_content = '''
                             <th>Статус</th>
                             <th>Срочность</th>
                             <th>Дата заказа</th>
+                            <th>Действия</th>
                         </tr>
                     </thead>
                     <tbody id="orders-table-body">
                         <tr>
-                            <td colspan="9" class="loading">
+                            <td colspan="10" class="loading">
                                 <div class="spinner"></div>
                                 <p>Загрузка заказов...</p>
                             </td>
@@ -1443,6 +1805,9 @@ html_content = '''
                     <h2>Производственные данные</h2>
                 </div>
                 <div class="section-actions">
+                    <span class="table-counter" id="production-counter"></span>
+                    <input type="search" id="production-search" class="form-input filter-input"
+                           placeholder="Товар, артикул или цех" oninput="onProductionFilterChange()">
                     <button class="action-btn secondary-btn" onclick="loadProductionData()">
                         <i class="fas fa-sync-alt"></i>
                         Обновить
@@ -1450,6 +1815,8 @@ html_content = '''
                 </div>
             </div>
             
+            <div class="workshop-load" id="workshop-load"></div>
+            
             <div class="table-container">
                 <table class="data-table" id="production-table">
                     <thead>
@@ -1537,129 +1904,339 @@ html_content = '''
             if (sectionId === 'production') loadProductionData();
         }
         
+        // Статусы заказов: допустимые переходы совпадают с STATUS_TRANSITIONS на сервере
+        const ORDER_TRANSITIONS = {
+            'новый': ['в производстве', 'отменён'],
+            'в производстве': ['готов', 'отменён'],
+            'готов': ['доставлен', 'отменён']
+        };
+        const STATUS_ACTIONS = {
+            'в производстве': 'В производство',
+            'готов': 'Готов',
+            'доставлен': 'Доставлен',
+            'отменён': 'Отменить'
+        };
+        const STATUS_BADGES = {
+            'новый': 'badge-new',
+            'в производстве': 'badge-processing',
+            'готов': 'badge-completed',
+            'доставлен': 'badge-completed',
+            'отменён': 'badge-urgent'
+        };
+        
+        // Текущие значения счетчиков, которые обновляются живой лентой
+        const liveStats = { totalOrders: 0, totalRevenue: 0 };
+        
+        function formatRevenue(value) {
+            return value.toLocaleString('ru-RU', {
+                minimumFractionDigits: 0,
+                maximumFractionDigits: 0
+            }) + ' ₽';
+        }
+        
+        // Кэш запросов дашборда: одинаковые одновременные запросы объединяются в один,
+        // ответ в пределах TTL берется из памяти, после TTL перепроверяется по ETag (304 без тела)
+        const FETCH_TTL_MS = {
+            '/api/products': 60000,
+            '/api/products/page': 60000,
+            '/api/production/page': 60000,
+            '/api/stats': 10000,
+            '/api/workshops': 5000,
+            '/api/orders/page': 0
+        };
+        const fetchCache = new Map();
+        const inflightRequests = new Map();
+        
+        async function cachedFetchJson(url) {
+            const ttl = FETCH_TTL_MS[url.split('?')[0]] || 0;
+            const entry = fetchCache.get(url);
+            if (entry && Date.now() - entry.fetchedAt < ttl) return entry.data;
+            if (inflightRequests.has(url)) return inflightRequests.get(url);
+            
+            const request = (async () => {
+                // no-store: 304 приходит в скрипт, а не подменяется HTTP-кэшем браузера
+                const headers = entry && entry.etag ? { 'If-None-Match': entry.etag } : {};
+                const response = await fetch(url, { headers, cache: 'no-store' });
+                if (response.status === 304 && entry) {
+                    entry.fetchedAt = Date.now();
+                    return entry.data;
+                }
+                const data = await response.json();
+                if (!response.ok) throw new Error(data.error || response.statusText);
+                fetchCache.set(url, { data, etag: response.headers.get('ETag'), fetchedAt: Date.now() });
+                return data;
+            })();
+            
+            inflightRequests.set(url, request);
+            try {
+                return await request;
+            } finally {
+                inflightRequests.delete(url);
+            }
+        }
+        
+        // Сбрасывает кэш адресов с указанным префиксом (без префикса - весь)
+        function invalidateCache(prefix = '') {
+            for (const url of [...fetchCache.keys()]) {
+                if (url.startsWith(prefix)) fetchCache.delete(url);
+            }
+        }
+        
         // Update Stats Overview
         async function updateStats() {
             try {
-                // Load orders count
-                const ordersResponse = await fetch('/api/orders');
-                const orders = await ordersResponse.json();
-                document.getElementById('total-orders').textContent = orders.length;
-                
-                // Load products count
-                const productsResponse = await fetch('/api/products');
-                const products = await productsResponse.json();
-                document.getElementById('total-products').textContent = products.length;
-                
-                // Calculate total revenue
-                let totalRevenue = 0;
-                orders.forEach(order => {
-                    if (order.total_price) {
-                        totalRevenue += order.total_price;
-                    }
-                });
-                document.getElementById('total-revenue').textContent = totalRevenue.toLocaleString('ru-RU', {
-                    minimumFractionDigits: 0,
-                    maximumFractionDigits: 0
-                }) + ' ₽';
-                
-                // Load production data for workshop count
-                const productionResponse = await fetch('/api/production');
-                const productionData = await productionResponse.json();
-                const uniqueWorkshops = [...new Set(productionData.map(item => item.workshop_name))];
-                document.getElementById('total-workshops').textContent = uniqueWorkshops.length;
-                
+                // Сводка считается на сервере, заказы целиком не загружаются
+                const stats = await cachedFetchJson('/api/stats');
+                liveStats.totalOrders = stats.total_orders;
+                liveStats.totalRevenue = stats.total_revenue;
+                document.getElementById('total-orders').textContent = stats.total_orders;
+                document.getElementById('total-revenue').textContent = formatRevenue(stats.total_revenue);
+                // Архив не входит в итог и подписывается отдельно
+                const archived = stats.archived_orders > 0;
+                document.getElementById('archived-orders').textContent =
+                    archived ? '+ ' + stats.archived_orders + ' в архиве' : '';
+                document.getElementById('archived-revenue').textContent =
+                    archived ? '+ ' + formatRevenue(stats.archived_revenue) + ' в архиве' : '';
+                document.getElementById('total-products').textContent = stats.total_products;
+                document.getElementById('total-workshops').textContent = stats.total_workshops;
             } catch (error) {
                 console.error('Error loading stats:', error);
             }
         }
         
-        // Load Products with improved UI
-        async function loadProducts() {
-            const tableBody = document.getElementById('products-table-body');
-            tableBody.innerHTML = `
+        // Откладывает вызов до паузы во вводе
+        function debounce(func, delay) {
+            let timer = null;
+            return (...args) => {
+                clearTimeout(timer);
+                timer = setTimeout(() => func(...args), delay);
+            };
+        }
+        
+        function tableMessageRow(colspan, icon, text, color = 'var(--text-secondary)') {
+            return `
                 <tr>
-                    <td colspan="8" class="loading">
-                        <div class="spinner"></div>
-                        <p>Загрузка товаров...</p>
+                    <td colspan="${colspan}" style="text-align: center; padding: 40px; color: ${color};">
+                        <i class="fas ${icon}" style="font-size: 48px; margin-bottom: 20px; opacity: 0.5;"></i>
+                        <p>${text}</p>
                     </td>
                 </tr>
             `;
+        }
+        
+        // Виртуализированная таблица: в DOM только видимые строки,
+        // следующие страницы (/api/<набор>/page) догружаются при прокрутке
+        const VIRTUAL_OVERSCAN = 10;
+        
+        class VirtualTable {
+            constructor({ bodyId, counterId, url, colspan, renderRow, emptyIcon, emptyText, pageSize = 100 }) {
+                this.tbody = document.getElementById(bodyId);
+                this.counter = counterId ? document.getElementById(counterId) : null;
+                this.container = this.tbody.closest('.table-container');
+                this.container.classList.add('virtual-scroll');
+                this.url = url;
+                this.colspan = colspan;
+                this.renderRow = renderRow;
+                this.emptyIcon = emptyIcon;
+                this.emptyText = emptyText;
+                this.pageSize = pageSize;
+                this.filters = {};
+                this.rows = [];
+                this.total = 0;
+                this.nextCursor = null;
+                this.rowHeight = 0;
+                this.generation = 0;
+                this.inflight = null;
+                this.renderedRange = null;
+                this.frame = null;
+                this.container.addEventListener('scroll', () => this.scheduleRender(), { passive: true });
+            }
             
-            try {
-                const response = await fetch('/api/random_products');
-                const products = await response.json();
+            get loaded() {
+                return this.generation > 0;
+            }
+            
+            hasFilters() {
+                return Object.values(this.filters).some(value => value);
+            }
+            
+            // Сброс и загрузка первой страницы (с новыми фильтрами, если переданы)
+            async reload(filters) {
+                if (filters) this.filters = filters;
+                this.generation++;
+                this.rows = [];
+                this.total = 0;
+                this.nextCursor = null;
+                this.inflight = null;
+                this.renderedRange = null;
+                this.container.scrollTop = 0;
+                this.tbody.innerHTML = `
+                    <tr>
+                        <td colspan="${this.colspan}" class="loading">
+                            <div class="spinner"></div>
+                            <p>Загрузка данных...</p>
+                        </td>
+                    </tr>
+                `;
+                await this.loadPage(null);
+            }
+            
+            async loadPage(cursor) {
+                const generation = this.generation;
+                if (this.inflight === generation) return;
+                this.inflight = generation;
                 
-                if (products.length === 0) {
-                    tableBody.innerHTML = `
-                        <tr>
-                            <td colspan="8" style="text-align: center; padding: 40px; color: var(--text-secondary);">
-                                <i class="fas fa-box-open" style="font-size: 48px; margin-bottom: 20px; opacity: 0.5;"></i>
-                                <p>Товары не найдены</p>
-                            </td>
-                        </tr>
-                    `;
+                const params = new URLSearchParams({ limit: this.pageSize });
+                Object.entries(this.filters).forEach(([key, value]) => { if (value) params.set(key, value); });
+                if (cursor) params.set('cursor', cursor);
+                
+                try {
+                    const page = await cachedFetchJson(`${this.url}?${params}`);
+                    // Пока шел запрос, фильтры сменились - ответ устарел
+                    if (generation !== this.generation) return;
+                    if (page.total !== null) this.total = page.total;
+                    this.rows.push(...page.items);
+                    this.nextCursor = page.next_cursor;
+                    this.renderedRange = null;
+                    this.render();
+                } catch (error) {
+                    console.error('Error loading page:', error);
+                    if (generation === this.generation) {
+                        this.tbody.innerHTML = tableMessageRow(this.colspan, 'fa-exclamation-triangle',
+                                                               'Ошибка загрузки данных', 'var(--danger-color)');
+                    }
+                } finally {
+                    if (this.inflight === generation) this.inflight = null;
+                }
+            }
+            
+            // Новая строка сверху (живая лента), позиция прокрутки сохраняется
+            prepend(row) {
+                this.rows.unshift(row);
+                this.total++;
+                if (this.container.scrollTop > 0 && this.rowHeight) {
+                    this.container.scrollTop += this.rowHeight;
+                }
+                this.renderedRange = null;
+                this.render();
+            }
+            
+            // Замена строки с тем же id (например, после смены статуса)
+            replaceRow(row) {
+                const index = this.rows.findIndex(item => item.id === row.id);
+                if (index === -1) return;
+                this.rows[index] = row;
+                this.renderedRange = null;
+                this.render();
+            }
+            
+            scheduleRender() {
+                if (this.frame) return;
+                this.frame = requestAnimationFrame(() => {
+                    this.frame = null;
+                    this.render();
+                });
+            }
+            
+            spacerRow(height) {
+                return height > 0
+                    ? `<tr class="virtual-spacer" style="height: ${height}px;"><td colspan="${this.colspan}"></td></tr>`
+                    : '';
+            }
+            
+            render() {
+                if (this.counter) {
+                    this.counter.textContent = this.rows.length ? `${this.rows.length} из ${this.total}` : '';
+                }
+                if (this.rows.length === 0) {
+                    this.tbody.innerHTML = tableMessageRow(this.colspan, this.emptyIcon, this.emptyText);
                     return;
                 }
+                if (!this.rowHeight) {
+                    // Высота строки измеряется один раз по первой отрисованной строке
+                    this.tbody.innerHTML = this.renderRow(this.rows[0]);
+                    this.rowHeight = this.tbody.firstElementChild.offsetHeight || 60;
+                }
                 
-                let html = '';
-                products.forEach(product => {
-                    const price = product.minimum_partner_price || 0;
-                    const hours = product.total_production_hours || 0;
-                    const workshops = product.workshop_count || 1;
-                    
-                    html += `
-                        <tr>
-                            <td><strong>${product.article}</strong></td>
-                            <td>
-                                <div style="font-weight: 600; color: var(--text-primary);">${product.product_name}</div>
-                                <div style="font-size: 12px; color: var(--text-muted);">${product.product_type}</div>
-                            </td>
-                            <td>${product.product_type}</td>
-                            <td>${product.main_material || '—'}</td>
-                            <td style="font-weight: 700; color: var(--accent-color);">
-                                ${price.toLocaleString('ru-RU', {minimumFractionDigits: 2, maximumFractionDigits: 2})} ₽
-                            </td>
-                            <td>${hours.toFixed(1)} ч</td>
-                            <td>
-                                <span class="badge badge-normal">${workshops} цех${workshops > 1 ? 'а' : ''}</span>
-                            </td>
-                            <td>
-                                <button class="secondary-btn" style="padding: 8px 16px; font-size: 12px;" 
-                                        onclick="selectProductForOrder(${product.article})">
-                                    <i class="fas fa-cart-plus"></i> Заказать
-                                </button>
-                            </td>
-                        </tr>
-                    `;
-                });
+                const scrollTop = this.container.scrollTop;
+                const viewport = this.container.clientHeight || 600;
+                const start = Math.max(0, Math.floor(scrollTop / this.rowHeight) - VIRTUAL_OVERSCAN);
+                const end = Math.min(this.rows.length, Math.ceil((scrollTop + viewport) / this.rowHeight) + VIRTUAL_OVERSCAN);
                 
-                tableBody.innerHTML = html;
+                if (!this.renderedRange || this.renderedRange[0] !== start || this.renderedRange[1] !== end) {
+                    this.renderedRange = [start, end];
+                    this.tbody.innerHTML = this.spacerRow(start * this.rowHeight)
+                        + this.rows.slice(start, end).map(this.renderRow).join('')
+                        + this.spacerRow((this.rows.length - end) * this.rowHeight);
+                }
                 
-            } catch (error) {
-                console.error('Error loading products:', error);
-                tableBody.innerHTML = `
-                    <tr>
-                        <td colspan="8" style="text-align: center; padding: 40px; color: var(--danger-color);">
-                            <i class="fas fa-exclamation-triangle" style="font-size: 48px; margin-bottom: 20px;"></i>
-                            <p>Ошибка загрузки данных</p>
-                            <button class="secondary-btn" onclick="loadProducts()" style="margin-top: 20px;">
-                                <i class="fas fa-redo"></i> Попробовать снова
-                            </button>
-                        </td>
-                    </tr>
-                `;
+                // Близко к концу загруженных строк - догружаем следующую страницу
+                if (this.nextCursor && end >= this.rows.length - VIRTUAL_OVERSCAN) {
+                    this.loadPage(this.nextCursor);
+                }
             }
         }
         
+        let productsTable = null;
+        let ordersTable = null;
+        let productionTable = null;
+        
+        function renderProductRow(product) {
+            const price = product.minimum_partner_price || 0;
+            const hours = product.total_production_hours || 0;
+            const workshops = product.workshop_count || 1;
+            
+            return `
+                <tr>
+                    <td><strong>${product.article}</strong></td>
+                    <td>
+                        <div style="font-weight: 600; color: var(--text-primary);">${product.product_name}</div>
+                        <div style="font-size: 12px; color: var(--text-muted);">${product.product_type}</div>
+                    </td>
+                    <td>${product.product_type}</td>
+                    <td>${product.main_material || '—'}</td>
+                    <td style="font-weight: 700; color: var(--accent-color);">
+                        ${price.toLocaleString('ru-RU', {minimumFractionDigits: 2, maximumFractionDigits: 2})} ₽
+                    </td>
+                    <td>${hours.toFixed(1)} ч</td>
+                    <td>
+                        <span class="badge badge-normal">${workshops} цех${workshops > 1 ? 'а' : ''}</span>
+                    </td>
+                    <td>
+                        <button class="secondary-btn" style="padding: 8px 16px; font-size: 12px;" 
+                                onclick="selectProductForOrder(${product.article})">
+                            <i class="fas fa-cart-plus"></i> Заказать
+                        </button>
+                    </td>
+                </tr>
+            `;
+        }
+        
+        // Load Products (каталог постранично, с фильтрами)
+        async function loadProducts() {
+            await productsTable.reload({
+                q: document.getElementById('products-search').value.trim(),
+                product_type: document.getElementById('products-type-filter').value
+            });
+        }
+        
+        const onProductsFilterChange = debounce(loadProducts, 300);
+        
         // Load all products for dropdown
         async function loadAllProductsForDropdown() {
             try {
-                const response = await fetch('/api/products');
-                const products = await response.json();
+                const products = await cachedFetchJson('/api/products');
                 
                 const select = document.getElementById('productSelect');
                 select.innerHTML = '<option value="">Выберите товар из списка</option>';
                 
+                // Типы товаров для фильтра каталога
+                const typeFilter = document.getElementById('products-type-filter');
+                typeFilter.length = 1;
+                [...new Set(products.map(product => product.product_type))].sort().forEach(type => {
+                    typeFilter.add(new Option(type, type));
+                });
+                
                 products.forEach(product => {
                     const option = document.createElement('option');
                     option.value = product.article;
@@ -1738,7 +2315,7 @@ html_content = '''
             
             if (selectedProduct && selectedProduct.price) {
                 const unitPrice = selectedProduct.price;
-                const totalPrice = unitPrice * quantity;
+                const totalPrice = unitPrice * quantity + cartTotal();
                 
                 document.getElementById('unit-price-display').textContent = 
                     unitPrice.toLocaleString('ru-RU', {minimumFractionDigits: 2, maximumFractionDigits: 2}) + ' ₽';
@@ -1746,161 +2323,308 @@ html_content = '''
                     totalPrice.toLocaleString('ru-RU', {minimumFractionDigits: 2, maximumFractionDigits: 2}) + ' ₽';
             } else {
                 document.getElementById('unit-price-display').textContent = '0.00 ₽';
-                document.getElementById('total-price-display').textContent = '0.00 ₽';
+                document.getElementById('total-price-display').textContent =
+                    cartTotal().toLocaleString('ru-RU', {minimumFractionDigits: 2, maximumFractionDigits: 2}) + ' ₽';
             }
+            estimateShipDate();
         }
         
-        // Load production data
-        async function loadProductionData() {
-            const tableBody = document.getElementById('production-table-body');
-            tableBody.innerHTML = `
-                <tr>
-                    <td colspan="7" class="loading">
-                        <div class="spinner"></div>
-                        <p>Загрузка данных...</p>
-                    </td>
-                </tr>
-            `;
-            
-            try {
-                const response = await fetch('/api/production');
-                const productionData = await response.json();
-                
-                if (productionData.length === 0) {
-                    tableBody.innerHTML = `
-                        <tr>
-                            <td colspan="7" style="text-align: center; padding: 40px; color: var(--text-secondary);">
-                                <i class="fas fa-industry" style="font-size: 48px; margin-bottom: 20px; opacity: 0.5;"></i>
-                                <p>Производственные данные отсутствуют</p>
-                            </td>
-                        </tr>
-                    `;
+        // Ориентировочная отгрузка по очереди цехов для корзины и выбранного товара
+        let shipEstimateSeq = 0;
+        
+        async function estimateShipDate() {
+            const hint = document.getElementById('shipHint');
+            const params = new URLSearchParams();
+            cart.forEach(item => {
+                params.append('article', item.article);
+                params.append('quantity', item.quantity);
+            });
+            if (selectedProduct) {
+                params.append('article', selectedProduct.article);
+                params.append('quantity', parseInt(document.getElementById('quantity').value) || 1);
+            }
+            const seq = ++shipEstimateSeq;
+            if (!params.has('article')) {
+                hint.textContent = '';
+                return;
+            }
+            
+            try {
+                const response = await fetch('/api/lead_time?' + params.toString());
+                if (seq !== shipEstimateSeq) return;
+                if (!response.ok) {
+                    hint.textContent = '';
                     return;
                 }
-                
-                let html = '';
-                productionData.slice(0, 50).forEach(item => {
-                    html += `
-                        <tr>
-                            <td>${item.id}</td>
-                            <td>
-                                <div style="font-weight: 600; color: var(--text-primary);">${item.product_name}</div>
-                                <div style="font-size: 12px; color: var(--text-muted);">Арт. ${item.article}</div>
-                            </td>
-                            <td>${item.workshop_name}</td>
-                            <td>
-                                <span class="badge ${item.workshop_type === 'основной' ? 'badge-normal' : 'badge-processing'}">
-                                    ${item.workshop_type}
-                                </span>
-                            </td>
-                            <td>${item.number_of_people_for_production}</td>
-                            <td>${item.manufacturing_time_hours}</td>
-                            <td>
-                                <span style="font-weight: 600; color: var(--accent-color);">
-                                    ${item.total_labor_hours}
-                                </span>
-                            </td>
-                        </tr>
-                    `;
-                });
-                
-                tableBody.innerHTML = html;
-                
+                const estimate = await response.json();
+                const shipDate = new Date(estimate.ship_date).toLocaleDateString('ru-RU');
+                hint.textContent = `Ориентировочная отгрузка: ${shipDate} (${estimate.work_days} раб. дн.)`;
             } catch (error) {
-                console.error('Error loading production data:', error);
-                tableBody.innerHTML = `
-                    <tr>
-                        <td colspan="7" style="text-align: center; padding: 40px; color: var(--danger-color);">
-                            <i class="fas fa-exclamation-triangle" style="font-size: 48px; margin-bottom: 20px;"></i>
-                            <p>Ошибка загрузки данных</p>
-                        </td>
-                    </tr>
-                `;
+                console.error('Error estimating ship date:', error);
             }
         }
         
-        // Load orders
-        async function loadOrders() {
-            const tableBody = document.getElementById('orders-table-body');
-            tableBody.innerHTML = `
+        // Load production data
+        function renderProductionRow(item) {
+            return `
                 <tr>
-                    <td colspan="9" class="loading">
-                        <div class="spinner"></div>
-                        <p>Загрузка заказов...</p>
+                    <td>${item.id}</td>
+                    <td>
+                        <div style="font-weight: 600; color: var(--text-primary);">${item.product_name}</div>
+                        <div style="font-size: 12px; color: var(--text-muted);">Арт. ${item.article}</div>
+                    </td>
+                    <td>${item.workshop_name}</td>
+                    <td>
+                        <span class="badge ${item.workshop_type === 'основной' ? 'badge-normal' : 'badge-processing'}">
+                            ${item.workshop_type}
+                        </span>
+                    </td>
+                    <td>${item.number_of_people_for_production}</td>
+                    <td>${item.manufacturing_time_hours}</td>
+                    <td>
+                        <span style="font-weight: 600; color: var(--accent-color);">
+                            ${item.total_labor_hours}
+                        </span>
                     </td>
                 </tr>
             `;
-            
+        }
+        
+        // Что изменилось при последней перезагрузке каталога (первая загрузка не показывается)
+        async function loadCatalogueChanges() {
             try {
-                const response = await fetch('/api/orders');
-                const orders = await response.json();
-                
-                if (orders.length === 0) {
-                    tableBody.innerHTML = `
-                        <tr>
-                            <td colspan="9" style="text-align: center; padding: 40px; color: var(--text-secondary);">
-                                <i class="fas fa-clipboard-list" style="font-size: 48px; margin-bottom: 20px; opacity: 0.5;"></i>
-                                <p>Заказы отсутствуют</p>
-                            </td>
-                        </tr>
-                    `;
+                const report = await cachedFetchJson('/api/catalogue/changes?limit=5');
+                const reload = report.reload;
+                const banner = document.getElementById('catalogue-banner');
+                if (!reload || reload.initial || !(reload.rows_added || reload.rows_updated || reload.rows_removed)) {
+                    banner.hidden = true;
                     return;
                 }
-                
-                let html = '';
-                orders.forEach(order => {
-                    const date = new Date(order.order_date);
-                    const formattedDate = date.toLocaleDateString('ru-RU');
-                    const formattedTime = date.toLocaleTimeString('ru-RU', {hour: '2-digit', minute:'2-digit'});
-                    
-                    const statusBadge = order.status === 'новый' ? 'badge-new' : 
-                                      order.status === 'в обработке' ? 'badge-processing' : 'badge-completed';
-                    
-                    const urgencyBadge = order.urgency === 'очень срочно' ? 'badge-urgent' : 
-                                       order.urgency === 'срочный' ? 'badge-processing' : 'badge-normal';
-                    
-                    html += `
-                        <tr>
-                            <td><strong>#${order.id}</strong></td>
-                            <td>
-                                <div style="font-weight: 600; color: var(--text-primary);">${order.product_name}</div>
-                                <div style="font-size: 12px; color: var(--text-muted);">${order.quantity} шт.</div>
-                            </td>
-                            <td>
-                                <div>${order.customer_name}</div>
-                                <div style="font-size: 12px; color: var(--text-muted);">${order.customer_email || ''}</div>
-                            </td>
-                            <td>${order.customer_phone}</td>
-                            <td>${order.quantity}</td>
-                            <td style="font-weight: 700; color: var(--accent-color);">
-                                ${order.total_price ? order.total_price.toLocaleString('ru-RU', {minimumFractionDigits: 2, maximumFractionDigits: 2}) + ' ₽' : '—'}
-                            </td>
-                            <td><span class="badge ${statusBadge}">${order.status}</span></td>
-                            <td><span class="badge ${urgencyBadge}">${order.urgency || 'обычный'}</span></td>
-                            <td>
-                                <div>${formattedDate}</div>
-                                <div style="font-size: 12px; color: var(--text-muted);">${formattedTime}</div>
-                            </td>
-                        </tr>
+                const loadedAt = new Date(reload.loaded_at.replace(' ', 'T') + 'Z').toLocaleString('ru-RU');
+                const prices = report.price_changes.map(change => `
+                    <li>${change.product_name} (${change.article}): ${formatRevenue(change.old_price)} → ${formatRevenue(change.new_price)}</li>
+                `).join('');
+                banner.innerHTML = `
+                    <strong>Каталог обновлён ${loadedAt}:</strong>
+                    новых товаров ${reload.products_added}, снято ${reload.products_removed},
+                    цена изменилась у ${reload.price_changes}; строк маршрутов изменено ${reload.rows_updated}
+                    ${prices ? `<ul>${prices}</ul>` : ''}
+                `;
+                banner.hidden = false;
+            } catch (error) {
+                console.error('Error loading catalogue changes:', error);
+            }
+        }
+        
+        // Загрузка цехов: чел.-ч открытых заказов против мощности бригады
+        async function loadWorkshopLoad() {
+            try {
+                const rows = await cachedFetchJson('/api/workshops');
+                document.getElementById('workshop-load').innerHTML = rows.map(row => {
+                    const level = row.load_percent > 100 ? 'load-over' : row.load_percent > 80 ? 'load-high' : '';
+                    return `
+                        <div class="workshop-card">
+                            <div class="workshop-card-title">${row.workshop_name}</div>
+                            <div class="load-bar"><div class="load-bar-fill ${level}" style="width: ${Math.min(row.load_percent, 100)}%"></div></div>
+                            <div class="workshop-card-meta">
+                                ${row.booked_hours.toLocaleString('ru-RU')} чел.-ч · ${row.load_percent}% · очередь ${row.queue_days} дн.
+                            </div>
+                            <div class="workshop-card-meta">
+                                ${row.open_lines} поз. в работе · бригада ${row.people} чел. (${row.capacity_hours} чел.-ч за смену)
+                            </div>
+                        </div>
                     `;
+                }).join('');
+            } catch (error) {
+                console.error('Error loading workshop load:', error);
+            }
+        }
+        
+        async function loadProductionData() {
+            loadWorkshopLoad();
+            await productionTable.reload({
+                q: document.getElementById('production-search').value.trim()
+            });
+        }
+        
+        const onProductionFilterChange = debounce(loadProductionData, 300);
+        
+        // Render a single order row
+        function renderOrderRow(order) {
+            const date = new Date(order.order_date);
+            const formattedDate = date.toLocaleDateString('ru-RU');
+            const formattedTime = date.toLocaleTimeString('ru-RU', {hour: '2-digit', minute:'2-digit'});
+            
+            const statusBadge = STATUS_BADGES[order.status] || 'badge-normal';
+            const actions = (ORDER_TRANSITIONS[order.status] || []).map(status => `
+                <button class="secondary-btn status-btn" onclick="changeOrderStatus(${order.id}, '${status}')">
+                    ${STATUS_ACTIONS[status]}
+                </button>
+            `).join('');
+            
+            const urgencyBadge = order.urgency === 'очень срочно' ? 'badge-urgent' : 
+                               order.urgency === 'срочный' ? 'badge-processing' : 'badge-normal';
+            
+            return `
+                <tr>
+                    <td><strong>#${order.id}</strong></td>
+                    <td>
+                        <div style="font-weight: 600; color: var(--text-primary);">${order.product_name}</div>
+                        <div style="font-size: 12px; color: var(--text-muted);">${order.quantity} шт.</div>
+                    </td>
+                    <td>
+                        <div>${order.customer_name}</div>
+                        <div style="font-size: 12px; color: var(--text-muted);">${order.customer_email || ''}</div>
+                    </td>
+                    <td>${order.customer_phone}</td>
+                    <td>${order.quantity}</td>
+                    <td style="font-weight: 700; color: var(--accent-color);">
+                        ${order.total_price ? order.total_price.toLocaleString('ru-RU', {minimumFractionDigits: 2, maximumFractionDigits: 2}) + ' ₽' : '—'}
+                    </td>
+                    <td><span class="badge ${statusBadge}">${order.status}</span></td>
+                    <td><span class="badge ${urgencyBadge}">${order.urgency || 'обычный'}</span></td>
+                    <td>
+                        <div>${formattedDate}</div>
+                        <div style="font-size: 12px; color: var(--text-muted);">${formattedTime}</div>
+                    </td>
+                    <td>${actions}</td>
+                </tr>
+            `;
+        }
+        
+        // Смена статуса (проверяется сервером, строку обновит ответ или живая лента)
+        async function changeOrderStatus(orderId, status) {
+            if (status === 'отменён' && !confirm(`Отменить заказ №${orderId}?`)) return;
+            try {
+                const response = await fetch(`/api/orders/${orderId}/status`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ status })
                 });
-                
-                tableBody.innerHTML = html;
-                
+                const result = await response.json();
+                if (!response.ok) {
+                    showNotification(result.error || 'Не удалось сменить статус', 'error');
+                    return;
+                }
+                applyOrderStatus(result.order);
+                showNotification(`Заказ №${orderId}: ${status}`, 'success');
             } catch (error) {
-                console.error('Error loading orders:', error);
-                tableBody.innerHTML = `
-                    <tr>
-                        <td colspan="9" style="text-align: center; padding: 40px; color: var(--danger-color);">
-                            <i class="fas fa-exclamation-triangle" style="font-size: 48px; margin-bottom: 20px;"></i>
-                            <p>Ошибка загрузки заказов</p>
-                        </td>
-                    </tr>
-                `;
+                console.error('Error changing status:', error);
+                showNotification('Ошибка соединения с сервером', 'error');
             }
         }
         
+        function applyOrderStatus(order) {
+            invalidateCache('/api/orders');
+            invalidateCache('/api/workshops');
+            if (document.getElementById('production').classList.contains('active')) loadWorkshopLoad();
+            ordersTable.replaceRow(order);
+            if (document.getElementById('orders').classList.contains('active')) loadStatusCounts();
+        }
+        
+        async function loadStatusCounts() {
+            try {
+                const summary = await cachedFetchJson('/api/orders/status_counts');
+                document.getElementById('status-counts').innerHTML = Object.entries(summary.counts).map(
+                    ([status, count]) => `<span class="badge ${STATUS_BADGES[status] || 'badge-normal'}">${status}: ${count}</span>`
+                ).join('');
+            } catch (error) {
+                console.error('Error loading status counts:', error);
+            }
+        }
+        
+        // Load orders
+        function ordersFilters() {
+            return {
+                q: document.getElementById('orders-search').value.trim(),
+                status: document.getElementById('orders-status-filter').value,
+                urgency: document.getElementById('orders-urgency-filter').value
+            };
+        }
+        
+        async function loadOrders() {
+            loadStatusCounts();
+            await ordersTable.reload(ordersFilters());
+        }
+        
+        const onOrdersFilterChange = debounce(loadOrders, 300);
+        
         // Create order
+        // Ключ идемпотентности текущей отправки формы: повторные нажатия и повтор после
+        // сетевой ошибки идут с тем же ключом, изменение формы начинает новый заказ
+        let pendingOrderKey = null;
+        
+        function newIdempotencyKey() {
+            if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+            return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2) + Math.random().toString(36).slice(2);
+        }
+        
+        // Поля ответа об ошибках проверки -> элементы формы
+        const ORDER_FIELD_INPUTS = {
+            product_article: 'productSelect', customer_name: 'customerName', customer_phone: 'customerPhone',
+            customer_email: 'customerEmail', delivery_address: 'deliveryAddress', order_notes: 'orderNotes',
+            urgency: 'urgency', payment_method: 'paymentMethod', quantity: 'quantity', delivery_date: 'deliveryDate'
+        };
+        
+        function showFieldErrors(errors) {
+            document.querySelectorAll('#orderForm .field-invalid').forEach(el => el.classList.remove('field-invalid'));
+            errors.forEach(item => {
+                const input = document.getElementById(ORDER_FIELD_INPUTS[item.field]);
+                if (input) {
+                    input.classList.add('field-invalid');
+                    input.title = item.message;
+                }
+            });
+        }
+        
+        // Корзина: позиции заказа из нескольких товаров
+        let cart = [];
+        
+        function cartTotal() {
+            return cart.reduce((sum, item) => sum + item.price * item.quantity, 0);
+        }
+        
+        function addToCart() {
+            if (!selectedProduct) {
+                showNotification('Выберите товар', 'error');
+                return;
+            }
+            const quantity = parseInt(document.getElementById('quantity').value) || 1;
+            const existing = cart.find(item => item.article === selectedProduct.article);
+            if (existing) {
+                existing.quantity += quantity;
+            } else {
+                cart.push({ article: selectedProduct.article, name: selectedProduct.name, price: selectedProduct.price, quantity: quantity });
+            }
+            document.getElementById('productSelect').value = '';
+            document.getElementById('quantity').value = 1;
+            updateProductInfo();
+            renderCart();
+        }
+        
+        function removeFromCart(index) {
+            cart.splice(index, 1);
+            renderCart();
+        }
+        
+        function renderCart() {
+            const formatMoney = value => value.toLocaleString('ru-RU', {minimumFractionDigits: 2, maximumFractionDigits: 2}) + ' ₽';
+            document.getElementById('cart-container').style.display = cart.length ? 'block' : 'none';
+            document.getElementById('cart-body').innerHTML = cart.map((item, index) => `
+                <tr>
+                    <td>${item.name}</td>
+                    <td>${item.quantity}</td>
+                    <td>${formatMoney(item.price)}</td>
+                    <td>${formatMoney(item.price * item.quantity)}</td>
+                    <td><button type="button" class="secondary-btn status-btn" onclick="removeFromCart(${index})" title="Убрать">✕</button></td>
+                </tr>
+            `).join('');
+            // С непустой корзиной выбирать еще один товар не обязательно
+            document.getElementById('productSelect').required = cart.length === 0;
+            pendingOrderKey = null;
+            updatePrice();
+        }
+        
         async function createOrder(event) {
             event.preventDefault();
             
@@ -1916,7 +2640,7 @@ html_content = '''
             const deliveryDate = document.getElementById('deliveryDate').value;
             
             // Validation
-            if (!productArticle || !customerName || !customerPhone) {
+            if ((!productArticle && cart.length === 0) || !customerName || !customerPhone) {
                 showNotification('Пожалуйста, заполните обязательные поля', 'error');
                 return;
             }
@@ -1926,8 +2650,9 @@ html_content = '''
                 return;
             }
             
+            // Оценка суммы для уведомления; цену заказа считает сервер
             const unitPrice = selectedProduct ? selectedProduct.price : 0;
-            const totalPrice = unitPrice * quantity;
+            const totalPrice = (productArticle ? unitPrice * quantity : 0) + cartTotal();
             
             const formData = new FormData();
             formData.append('product_article', productArticle);
@@ -1939,36 +2664,55 @@ html_content = '''
             formData.append('urgency', urgency);
             formData.append('payment_method', paymentMethod);
             formData.append('quantity', quantity);
-            formData.append('unit_price', unitPrice);
-            formData.append('total_price', totalPrice);
             formData.append('delivery_date', deliveryDate);
             
+            if (!pendingOrderKey) pendingOrderKey = newIdempotencyKey();
+            
+            // Корзина уходит одним заказом с несколькими строками (JSON), один товар - формой
+            let request = { method: 'POST', headers: { 'Idempotency-Key': pendingOrderKey }, body: formData };
+            let url = '/api/create_order';
+            if (cart.length > 0) {
+                const payload = Object.fromEntries(formData.entries());
+                payload.items = cart.map(item => ({ product_article: item.article, quantity: item.quantity }));
+                if (productArticle) payload.items.push({ product_article: productArticle, quantity: quantity });
+                url = '/api/orders';
+                request.headers['Content-Type'] = 'application/json';
+                request.body = JSON.stringify(payload);
+            }
+            
             try {
-                const response = await fetch('/api/create_order', {
-                    method: 'POST',
-                    body: formData
-                });
+                const response = await fetch(url, request);
                 
                 const result = await response.json();
                 
                 if (result.success) {
-                    showNotification(`Заказ №${result.order_id} успешно создан! Сумма: ${totalPrice.toLocaleString('ru-RU', {minimumFractionDigits: 2, maximumFractionDigits: 2})} ₽`, 'success');
+                    // Живая лента может прийти позже перехода к списку заказов
+                    invalidateCache('/api/stats');
+                    invalidateCache('/api/orders');
+                    const shipNote = result.estimated_ship_date
+                        ? `, отгрузка ${new Date(result.estimated_ship_date).toLocaleDateString('ru-RU')}` : '';
+                    showNotification(`Заказ №${result.order_id} успешно создан! Сумма: ${(result.total_price ?? totalPrice).toLocaleString('ru-RU', {minimumFractionDigits: 2, maximumFractionDigits: 2})} ₽${shipNote}`, 'success');
                     
                     // Reset form
                     document.getElementById('orderForm').reset();
+                    pendingOrderKey = null;
+                    showFieldErrors([]);
+                    document.getElementById('customerHint').textContent = '';
+                    document.getElementById('shipHint').textContent = '';
                     document.getElementById('product-info-container').style.display = 'none';
                     selectedProduct = null;
-                    updatePrice();
+                    cart = [];
+                    renderCart();
                     
-                    // Update stats and show orders section
-                    updateStats();
+                    // Статистика и таблица заказов обновятся через живую ленту
                     setTimeout(() => {
                         showSection('orders');
-                        loadOrders();
                     }, 1500);
                     
                 } else {
-                    showNotification(`Ошибка: ${result.error}`, 'error');
+                    showFieldErrors(result.errors || []);
+                    const details = (result.errors || []).map(item => item.message).join('; ');
+                    showNotification(`Ошибка: ${result.error}` + (details ? `: ${details}` : ''), 'error');
                 }
             } catch (error) {
                 console.error('Error creating order:', error);
@@ -1976,6 +2720,30 @@ html_content = '''
             }
         }
         
+        // Постоянный клиент: по телефону находим покупателя и заполняем пустые поля
+        async function lookupCustomer() {
+            const hint = document.getElementById('customerHint');
+            const phone = document.getElementById('customerPhone').value.trim();
+            hint.textContent = '';
+            if (phone.replace(/[^0-9]/g, '').length < 10) return;
+            
+            try {
+                const response = await fetch('/api/customers/lookup?phone=' + encodeURIComponent(phone));
+                if (!response.ok) return;
+                const customer = await response.json();
+                if (document.getElementById('customerPhone').value.trim() !== phone) return;
+                
+                const fields = { customerName: customer.name, customerEmail: customer.email, deliveryAddress: customer.address };
+                Object.entries(fields).forEach(([id, value]) => {
+                    const input = document.getElementById(id);
+                    if (!input.value && value) input.value = value;
+                });
+                hint.textContent = `Постоянный клиент: ${customer.orders_count} заказ(ов) на ${formatRevenue(customer.lifetime_value)}`;
+            } catch (error) {
+                console.error('Error looking up customer:', error);
+            }
+        }
+        
         // Show notification
         function showNotification(message, type = 'info') {
             // Remove existing notification
@@ -2023,9 +2791,44 @@ html_content = '''
             }
         }
         
+        // Run a background job and download its result when ready
+        async function runJob(kind, title) {
+            try {
+                const formData = new FormData();
+                formData.append('kind', kind);
+                const response = await fetch('/api/jobs', { method: 'POST', body: formData });
+                let job = await response.json();
+                if (!response.ok) {
+                    showNotification(`Ошибка: ${job.error}`, 'error');
+                    return;
+                }
+                showNotification(`${title}: задача поставлена в очередь`, 'success');
+                
+                while (job.status === 'queued' || job.status === 'running') {
+                    await new Promise(resolve => setTimeout(resolve, 1000));
+                    job = await (await fetch(`/api/jobs/${job.job_id}`)).json();
+                }
+                
+                if (job.status === 'done') {
+                    window.location.href = `/api/jobs/${job.job_id}/result`;
+                } else {
+                    showNotification(`${title}: ${job.error || 'задача отменена'}`, 'error');
+                }
+            } catch (error) {
+                console.error('Error running job:', error);
+                showNotification('Произошла ошибка при выполнении задачи', 'error');
+            }
+        }
+        
         // Export products
         function exportProducts() {
-            showNotification('Функция экспорта в разработке', 'info');
+            runJob('export', 'Экспорт базы данных');
+        }
+        
+        // Download PDF dashboard report
+        function downloadPdfReport() {
+            showNotification('Формирование PDF-отчета...', 'success');
+            window.location.href = '/api/reports/pdf';
         }
         
         // Load random products (for backward compatibility)
@@ -2034,11 +2837,73 @@ html_content = '''
             showNotification('Список товаров обновлен', 'success');
         }
         
+        // Live order feed (Server-Sent Events)
+        function connectLiveFeed() {
+            if (!window.EventSource) return;
+            
+            // Браузер сам переподключается и передает Last-Event-ID
+            const source = new EventSource('/api/events');
+            
+            source.addEventListener('order_created', (event) => {
+                const payload = JSON.parse(event.data);
+                invalidateCache('/api/stats');
+                invalidateCache('/api/orders');
+                invalidateCache('/api/workshops');
+                if (document.getElementById('production').classList.contains('active')) loadWorkshopLoad();
+                liveStats.totalOrders += payload.stats_delta.total_orders;
+                liveStats.totalRevenue += payload.stats_delta.total_revenue;
+                document.getElementById('total-orders').textContent = liveStats.totalOrders;
+                document.getElementById('total-revenue').textContent = formatRevenue(liveStats.totalRevenue);
+                
+                // В отфильтрованный список новый заказ может не подходить - он появится при обновлении
+                if (ordersTable.loaded && !ordersTable.hasFilters()) {
+                    ordersTable.prepend(payload.order);
+                }
+                if (document.getElementById('orders').classList.contains('active')) loadStatusCounts();
+            });
+            
+            source.addEventListener('order_status_changed', (event) => {
+                applyOrderStatus(JSON.parse(event.data).order);
+            });
+            
+            // Часть ленты пропущена (долгий разрыв или перезапуск сервера)
+            source.addEventListener('reset', () => {
+                invalidateCache();
+                updateStats();
+                if (document.getElementById('orders').classList.contains('active')) loadOrders();
+            });
+        }
+        
+        function initTables() {
+            productsTable = new VirtualTable({
+                bodyId: 'products-table-body', counterId: 'products-counter', url: '/api/products/page',
+                colspan: 8, renderRow: renderProductRow, emptyIcon: 'fa-box-open', emptyText: 'Товары не найдены'
+            });
+            ordersTable = new VirtualTable({
+                bodyId: 'orders-table-body', counterId: 'orders-counter', url: '/api/orders/page',
+                colspan: 10, renderRow: renderOrderRow, emptyIcon: 'fa-clipboard-list', emptyText: 'Заказы отсутствуют'
+            });
+            productionTable = new VirtualTable({
+                bodyId: 'production-table-body', counterId: 'production-counter', url: '/api/production/page',
+                colspan: 7, renderRow: renderProductionRow, emptyIcon: 'fa-industry',
+                emptyText: 'Производственные данные отсутствуют'
+            });
+        }
+        
         // Initialize on load
         document.addEventListener('DOMContentLoaded', () => {
             loadTheme();
+            initTables();
             loadAllProductsForDropdown();
             updateStats();
+            loadProducts();
+            loadCatalogueChanges();
+            connectLiveFeed();
+            document.getElementById('customerPhone').addEventListener('change', lookupCustomer);
+            document.getElementById('orderForm').addEventListener('input', event => {
+                pendingOrderKey = null;
+                event.target.classList.remove('field-invalid');
+            });
             
             // Add CSS for table row hover effect
             const style = document.createElement('style');
@@ -2059,32 +2924,17 @@ html_content = '''
 </html>
 '''
 
-# ========== Маршруты Flask ==========
-@app.route('/')
-def index():
-    return html_content
+# ========== Запросы к данным ==========
+# Функции возвращают обычные структуры Python и не зависят от Flask,
+# поэтому используются как синхронными маршрутами, так и ASGI-режимом (asgi.py)
+def query_products():
+    """Все агрегированные товары, отсортированные по названию"""
+    return storage_backend.products()
 
-@app.route('/api/products')
-def get_products():
-    """Получение всех товаров (для выпадающего списка)"""
-    conn = sqlite3.connect('furniture_production.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM aggregated_products ORDER BY product_name")
-    rows = cursor.fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in rows])
-
-@app.route('/api/random_products')
-def get_random_products():
-    """Получение случайных товаров (для отображения в таблице)"""
-    conn = sqlite3.connect('furniture_production.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
+def query_random_products():
+    """Случайная выборка товаров (от 5 до 15 штук)"""
     # Получаем все товары
-    cursor.execute("SELECT * FROM aggregated_products")
-    all_products = cursor.fetchall()
+    all_products = storage_backend.products()
     
     # Выбираем случайные товары (от 5 до 15 штук)
     if all_products:
@@ -2093,102 +2943,776 @@ def get_random_products():
     else:
         random_products = []
     
+    return random_products
+
+def query_production_data():
+    """Первые записи производственных данных"""
+    return storage_backend.production(50)  # Ограничиваем для производительности
+
+def query_orders():
+    """Все заказы (кроме выгруженных в архив), новые сверху"""
+    return storage_backend.orders()
+
+# ========== Постраничная выдача ==========
+PAGE_SIZE_DEFAULT = 100
+PAGE_SIZE_MAX = 500
+
+def parse_page_params(args):
+    """Параметры страницы и фильтров из строки запроса (request.args или dict)"""
+    try:
+        limit = int(args.get('limit') or PAGE_SIZE_DEFAULT)
+    except ValueError:
+        limit = PAGE_SIZE_DEFAULT
+    return {
+        'limit': min(max(limit, 1), PAGE_SIZE_MAX),
+        'cursor': args.get('cursor') or None,
+        'q': (args.get('q') or '').strip(),
+        'status': args.get('status') or None,
+        'urgency': args.get('urgency') or None,
+        'product_type': args.get('product_type') or None,
+        'date_from': args.get('date_from') or None,
+        'date_to': args.get('date_to') or None,
+    }
+
+def split_cursor(cursor_value, parts):
+    """Курсор вида 'значение|id' -> список значений"""
+    values = cursor_value.rsplit('|', parts - 1)
+    if len(values) != parts:
+        raise ValueError("Неверный курсор страницы")
+    return values
+
+def fetch_page(sql, filters, keyset, order_by, limit):
+    """
+    Страница строк: filters - (условия, значения) фильтров, keyset - условие
+    курсора (условие, значения) или None для первой страницы.
+    Общее количество считается только для первой страницы.
+    """
+    where, values = filters
+    conn = get_db_connection()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    total = None
+    if keyset is None:
+        where_sql = (" WHERE " + " AND ".join(where)) if where else ""
+        cursor.execute(f"SELECT COUNT(*) FROM ({sql}{where_sql})", values)
+        total = cursor.fetchone()[0]
+    else:
+        where, values = where + [keyset[0]], values + keyset[1]
+    where_sql = (" WHERE " + " AND ".join(where)) if where else ""
+    cursor.execute(f"{sql}{where_sql} ORDER BY {order_by} LIMIT ?", values + [limit + 1])
+    rows = [dict(row) for row in cursor.fetchall()]
     conn.close()
-    return jsonify([dict(row) for row in random_products])
+    return rows[:limit], total, len(rows) > limit
 
-@app.route('/api/production')
-def get_production_data():
-    conn = sqlite3.connect('furniture_production.db')
+def fetch_orders_page(params, where, values, hot_only=False):
+    """
+    Страница заказов (новые сверху) по горячей таблице и секциям старых месяцев,
+    которые пересекаются с date_from/date_to и лежат не позже курсора.
+    """
+    for key, condition in (('date_from', "order_date >= ?"), ('date_to', "order_date < ?")):
+        if params[key]:
+            try:
+                day = datetime.strptime(params[key], '%Y-%m-%d').date()
+            except ValueError:
+                raise ValueError(f"Дата {key} в формате ГГГГ-ММ-ДД") from None
+            if key == 'date_to':
+                # Конец диапазона включительно: заказы до начала следующего дня
+                day = date.fromordinal(day.toordinal() + 1)
+            where.append(condition)
+            values.append(day.isoformat())
+    keyset = None
+    if params['cursor']:
+        order_date, order_id = split_cursor(params['cursor'], 2)
+        keyset = ("(order_date < ? OR (order_date = ? AND id < ?))", [order_date, order_date, int(order_id)], order_date)
+    
+    rows, total = storage_backend.orders_page(where, values, keyset, params['limit'] + 1,
+                                              params['date_from'], params['date_to'], hot_only)
+    has_more = len(rows) > params['limit']
+    rows = rows[:params['limit']]
+    next_cursor = f"{rows[-1]['order_date']}|{rows[-1]['id']}" if has_more else None
+    return {"items": rows, "total": total, "next_cursor": next_cursor}
+
+def query_orders_page(params):
+    """Страница заказов (новые сверху) с фильтрами по тексту, статусу и срочности"""
+    where, values = [], []
+    if params['q']:
+        like = f"%{params['q']}%"
+        where.append("(customer_name LIKE ? OR customer_phone LIKE ? OR product_name LIKE ? OR CAST(id AS TEXT) = ?)")
+        values += [like, like, like, params['q'].lstrip('#')]
+    if params['status']:
+        if params['status'] not in ORDER_STATUSES:
+            raise ValueError("Неизвестный статус заказа")
+        # Литерал (из списка статусов), чтобы SQLite выбрал частичный индекс открытых заказов
+        where.append(f"status = '{params['status']}'")
+    if params['urgency']:
+        where.append("urgency = ?")
+        values.append(params['urgency'])
+    # Открытые заказы в секции не переносятся - их ищем только в горячей таблице
+    hot_only = params['status'] in ACTIVE_STATUSES
+    return fetch_orders_page(params, where, values, hot_only)
+
+def query_products_page(params):
+    """Страница каталога по названию с фильтрами по тексту и типу"""
+    where, values = [], []
+    if params['q']:
+        like = f"%{params['q']}%"
+        where.append("(product_name LIKE ? OR CAST(article AS TEXT) LIKE ?)")
+        values += [like, like]
+    if params['product_type']:
+        where.append("product_type = ?")
+        values.append(params['product_type'])
+    keyset = None
+    if params['cursor']:
+        product_name, article = split_cursor(params['cursor'], 2)
+        keyset = ("(product_name > ? OR (product_name = ? AND article > ?))", [product_name, product_name, int(article)])
+    
+    rows, total, has_more = fetch_page("SELECT * FROM aggregated_products", (where, values), keyset,
+                                       "product_name, article", params['limit'])
+    next_cursor = f"{rows[-1]['product_name']}|{rows[-1]['article']}" if has_more else None
+    return {"items": rows, "total": total, "next_cursor": next_cursor}
+
+def query_production_page(params):
+    """Страница производственных данных по id с фильтром по товару, артикулу и цеху"""
+    where, values = [], []
+    if params['q']:
+        like = f"%{params['q']}%"
+        where.append("(product_name LIKE ? OR workshop_name LIKE ? OR CAST(article AS TEXT) LIKE ?)")
+        values += [like, like, like]
+    keyset = ("id > ?", [int(params['cursor'])]) if params['cursor'] else None
+    
+    rows, total, has_more = fetch_page("SELECT * FROM products", (where, values), keyset, "id", params['limit'])
+    next_cursor = str(rows[-1]['id']) if has_more else None
+    return {"items": rows, "total": total, "next_cursor": next_cursor}
+
+def query_stats():
+    """Сводка для карточек дашборда без выгрузки всех заказов"""
+    return storage_backend.stats()
+
+def query_report_snapshot():
+    """
+    Ключ актуальности отчетов: (версия каталога, число заказов, последний id заказа,
+    последнее изменение статуса). Для копии вместо изменения статуса - номер
+    последней примененной записи журнала.
+    """
+    conn = get_analytics_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT value FROM catalogue_meta WHERE key = 'version'")
+    row = cursor.fetchone()
+    # Заказы в базе: горячая таблица и секции (архивация уменьшает число)
+    cursor.execute("SELECT COUNT(*) + (SELECT COALESCE(SUM(rows), 0) FROM order_partitions), "
+                   "COALESCE(MAX(id), 0) FROM orders")
+    orders_count, last_order_id = cursor.fetchone()
+    if analytics_db_path() != DB_PATH:
+        cursor.execute("SELECT COALESCE(MAX(CAST(value AS INTEGER)), 0) FROM replication_state "
+                       "WHERE key = 'applied_seq'")
+    else:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM order_events")
+    last_event_id = cursor.fetchone()[0]
+    conn.close()
+    return (row[0] if row else 'none', orders_count, last_order_id, last_event_id)
+
+def query_status_counts():
+    """Количество заказов по статусам (в SQLite - из счетчиков, без просмотра заказов)"""
+    counts = dict.fromkeys(ORDER_STATUSES, 0)
+    counts.update(storage_backend.status_counts())
+    return {
+        "counts": counts,
+        "open": sum(counts[status] for status in ACTIVE_STATUSES),
+    }
+
+def query_order_events(order_id):
+    """История статусов заказа, от старых к новым"""
+    conn = get_db_connection()
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM products ORDER BY id LIMIT 50")  # Ограничиваем для производительности
+    cursor.execute("SELECT * FROM order_events WHERE order_id = ? ORDER BY id", (order_id,))
     rows = cursor.fetchall()
     conn.close()
-    return jsonify([dict(row) for row in rows])
+    return [dict(row) for row in rows]
 
-@app.route('/api/orders')
-def get_orders():
-    conn = sqlite3.connect('furniture_production.db')
+# ========== Покупатели ==========
+def query_customer(customer_id=None, phone=None, email=None):
+    """Покупатель по id или по телефону/email (None - не найден)"""
+    conn = get_db_connection()
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM orders ORDER BY order_date DESC
-    ''')
+    if customer_id is not None:
+        customer = customers.get_customer(cursor, customer_id)
+    else:
+        customer = customers.find_customer(cursor, phone, email)
+    conn.close()
+    return customer
+
+def query_customer_orders(customer_id, params):
+    """История заказов покупателя (новые сверху) по индексу (customer_id, order_date, id)"""
+    return fetch_orders_page(params, ["customer_id = ?"], [customer_id])
+
+def query_top_customers(limit=20):
+    conn = get_db_connection()
+    conn.row_factory = sqlite3.Row
+    rows = customers.top_customers(conn.cursor(), limit)
+    conn.close()
+    return rows
+
+def query_order_items(order_id):
+    """Строки заказа (для заказа с одним товаром - одна строка из шапки)"""
+    conn = get_db_connection()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM order_lines WHERE order_id = ? ORDER BY line_no", (order_id,))
     rows = cursor.fetchall()
     conn.close()
-    return jsonify([dict(row) for row in rows])
+    return [dict(row) for row in rows]
 
-@app.route('/api/create_order', methods=['POST'])
-def create_order_api():
+class InvalidTransition(Exception):
+    def __init__(self, current, requested):
+        super().__init__(f"Нельзя перевести заказ из статуса '{current}' в '{requested}'")
+        self.current = current
+        self.allowed = STATUS_TRANSITIONS.get(current, ())
+
+def change_order_status(order_id, new_status, comment=''):
+    """
+    Переводит заказ в новый статус и пишет событие в историю (одна транзакция).
+    Возвращает (заказ, событие); KeyError - заказа нет, InvalidTransition - переход запрещен.
+    """
+    conn = get_db_connection()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
     try:
-        product_article = request.form.get('product_article', type=int)
-        customer_name = request.form.get('customer_name', '')
-        customer_phone = request.form.get('customer_phone', '')
-        customer_email = request.form.get('customer_email', '')
-        delivery_address = request.form.get('delivery_address', '')
-        order_notes = request.form.get('order_notes', '')
-        urgency = request.form.get('urgency', 'обычный')
-        payment_method = request.form.get('payment_method', 'наличные')
-        quantity = request.form.get('quantity', type=int)
-        unit_price = request.form.get('unit_price', type=float, default=0.0)
-        total_price = request.form.get('total_price', type=float, default=0.0)
-        delivery_date = request.form.get('delivery_date', '')
-        
-        conn = sqlite3.connect('furniture_production.db')
-        cursor = conn.cursor()
-        
-        # Получаем информацию о продукте
-        cursor.execute("SELECT product_name FROM aggregated_products WHERE article = ?", (product_article,))
-        product = cursor.fetchone()
-        
-        if not product:
-            return jsonify({"error": "Товар не найден"}), 404
-        
-        product_name = product[0]
-        
+        # Блокировка записи: два одновременных перехода не пройдут оба
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT status FROM orders WHERE id = ?", (order_id,))
+        row = cursor.fetchone()
+        if row is None:
+            # Заказ из секции старого месяца: он завершен, переходов нет
+            cursor.execute("SELECT status FROM orders_all WHERE id = ?", (order_id,))
+            row = cursor.fetchone()
+        if row is None:
+            raise KeyError(order_id)
+        current = row['status']
+        if new_status not in STATUS_TRANSITIONS.get(current, ()):
+            raise InvalidTransition(current, new_status)
+        
+        changed_at = datetime.now().isoformat()
+        cursor.execute("UPDATE orders SET status = ? WHERE id = ?", (new_status, order_id))
+        if new_status == 'отменён':
+            customers.on_order_cancelled(cursor, order_id)
         cursor.execute('''
-            INSERT INTO orders (
-                product_id, product_name, customer_name, customer_phone,
-                customer_email, delivery_address, order_notes, urgency,
-                payment_method, quantity, unit_price, total_price,
-                order_date, delivery_date, status
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            product_article, product_name, customer_name, customer_phone,
-            customer_email, delivery_address, order_notes, urgency,
-            payment_method, quantity, unit_price, total_price,
-            datetime.now().isoformat(), delivery_date, 'новый'
-        ))
-        
+            INSERT INTO order_events (order_id, from_status, to_status, comment, changed_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (order_id, current, new_status, comment, changed_at))
+        event = {"id": cursor.lastrowid, "order_id": order_id, "from_status": current,
+                 "to_status": new_status, "comment": comment, "changed_at": changed_at}
         conn.commit()
-        order_id = cursor.lastrowid
-        conn.close()
         
-        return jsonify({"success": True, "order_id": order_id})
+        cursor.execute("SELECT * FROM orders WHERE id = ?", (order_id,))
+        return dict(cursor.fetchone()), event
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def query_reports():
+    """Данные для диаграмм отчетов"""
+    # Средняя цена по категориям товаров и распределение по основным материалам
+    category_data, material_data = storage_backend.charts()
+    
+    return {
+        "category_chart": category_data,
+        "material_chart": material_data
+    }
+
+def publish_order_created(order):
+    """Публикует событие о новом заказе вместе с приращением статистики"""
+    broker.publish('order_created', {
+        "order": order,
+        "stats_delta": {
+            "total_orders": 1,
+            "total_revenue": order.get('total_price') or 0,
+        },
+    })
+
+def publish_status_changed(order, event):
+    """Публикует смену статуса заказа"""
+    broker.publish('order_status_changed', {"order": order, "event": event})
+
+# ========== Условные запросы (ETag) ==========
+# Ответы этих маршрутов не кэшируются: случайная выборка и поток событий
+NO_ETAG_PATHS = ('/api/random_products', '/api/events')
+
+@app.after_request
+def add_etag(response):
+    """ETag для JSON-ответов GET /api/*: повторный запрос с If-None-Match получает 304 без тела"""
+    if (request.method in ('GET', 'HEAD') and request.path.startswith('/api/')
+            and request.path not in NO_ETAG_PATHS and response.status_code == 200
+            and not response.is_streamed and response.mimetype == 'application/json'):
+        response.add_etag()
+        response.headers['Cache-Control'] = 'no-cache'
+        response = response.make_conditional(request)
+    return response
+
+# ========== Маршруты Flask ==========
+@functools.lru_cache(maxsize=None)
+def index_html():
+    """Главная страница собирается один раз на процесс"""
+    return html_content.replace('__LOGO_SRC__', create_logo())
+
+@app.route('/')
+def index():
+    return index_html()
+
+@app.route('/api/products')
+def get_products():
+    """Получение всех товаров (для выпадающего списка)"""
+    return jsonify(query_products())
+
+@app.route('/api/random_products')
+def get_random_products():
+    """Получение случайных товаров (для отображения в таблице)"""
+    return jsonify(query_random_products())
+
+@app.route('/api/production')
+def get_production_data():
+    return jsonify(query_production_data())
+
+@app.route('/api/orders')
+def get_orders():
+    return jsonify(query_orders())
+
+# Постраничные варианты: ?limit=&cursor=&q=&status=&urgency=&product_type=
+# Ответ: {"items": [...], "total": N (только на первой странице), "next_cursor": "..." | null}
+PAGED_QUERIES = {
+    'orders': query_orders_page,
+    'products': query_products_page,
+    'production': query_production_page,
+}
+
+@app.route('/api/<dataset>/page')
+def get_page(dataset):
+    query = PAGED_QUERIES.get(dataset)
+    if query is None:
+        return jsonify({"error": "Неизвестный набор данных"}), 404
+    try:
+        return jsonify(query(parse_page_params(request.args)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/stats')
+def get_stats():
+    return jsonify(query_stats())
+
+def idempotent_replay(order_id, customer_id):
+    """Ответ на повторную отправку: исходный заказ без новой записи"""
+    response = jsonify({"success": True, "order_id": order_id, "customer_id": customer_id, "replayed": True})
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def submit_order(order_data, lines, data):
+    """Общая часть создания заказа из формы и из корзины: идемпотентность, запись, рассылка"""
+    try:
+        idempotency_key = idempotency.request_key(request.headers, data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if idempotency_key is not None:
+        replay = idempotency.recent_orders.get(idempotency_key)
+        if replay is not None:
+            return idempotent_replay(*replay)
+    
+    # Дата отгрузки - по очереди цехов до этого заказа
+    estimate = None
+    if storage_backend.name == 'sqlite':
+        try:
+            estimate = lead_times.estimate([(line['product_article'], line['quantity']) for line in lines])
+        except KeyError:
+            pass  # неизвестный товар - ответ 404 от save_order
+    
+    try:
+        order_id, customer_id, order = storage_backend.save_order(
+            order_data, lines, datetime.now().isoformat(), idempotency_key)
+    except storage.UnknownProducts as e:
+        return jsonify({"error": str(e), "articles": e.articles}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    if order is None:
+        return idempotent_replay(order_id, customer_id)
+    
+    # Рассылаем новый заказ и изменение статистики открытым дашбордам
+    publish_order_created(order)
+    result = {"success": True, "order_id": order_id, "customer_id": customer_id,
+              "items_count": order['items_count'], "total_price": order['total_price']}
+    if estimate is not None:
+        result.update(estimated_ship_date=estimate['ship_date'], estimated_work_days=estimate['work_days'])
+    return jsonify(result)
 
-@app.route('/api/reports')
-def get_reports():
-    conn = sqlite3.connect('furniture_production.db')
+@app.route('/api/create_order', methods=['POST'])
+def create_order_api():
+    """Заказ одного товара из формы"""
+    # Проверка данных до обращения к базе: все ошибки полей одним ответом
+    try:
+        order_data = validation.ORDER_SCHEMA.validate(request.form)
+    except validation.ValidationError as e:
+        return jsonify({"error": "Проверьте данные заказа", "errors": e.errors}), 400
+    
+    # Цена - по истории цен на момент заказа, а не та, что прислала форма
+    line = {key: order_data[key] for key in ('product_article', 'quantity')}
+    return submit_order(order_data, [line], request.form)
+
+@app.route('/api/orders', methods=['POST'])
+def create_cart_order():
+    """
+    Заказ из корзины (JSON): поля покупателя и "items": [{"product_article", "quantity"}].
+    Цены берутся из каталога, все строки пишутся одной транзакцией.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Ожидается JSON-объект"}), 400
+    try:
+        order_data, lines = validation.validate_cart(data)
+    except validation.ValidationError as e:
+        return jsonify({"error": "Проверьте данные заказа", "errors": e.errors}), 400
+    return submit_order(order_data, lines, data)
+
+@app.route('/api/workshops')
+def get_workshops():
+    """Загрузка цехов открытыми заказами (из счетчиков, без просмотра заказов)"""
+    conn = get_db_connection()
+    rows = workshops.utilization(conn.cursor())
+    conn.close()
+    return jsonify(rows)
+
+@app.route('/api/catalogue/changes')
+def get_catalogue_changes():
+    """Что изменилось при последней перезагрузке каталога: цены, новые и удаленные товары"""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    conn = get_db_connection()
+    report = catalogue.latest_changes(conn.cursor(), limit)
+    conn.close()
+    return jsonify(report)
+
+@app.route('/api/prices/<int:article>')
+def get_price_history(article):
+    """Цена артикула на дату (?at=ГГГГ-ММ-ДД[ЧЧ:ММ:СС], по умолчанию - сейчас) и все интервалы цены"""
+    history = price_book.history(article)
+    if not history:
+        return jsonify({"error": f"Товар не найден: {article}"}), 404
+    at = request.args.get('at') or datetime.now().isoformat()
+    return jsonify({"article": article, "at": at, "price": price_book.price_at(article, at), "history": history})
+
+# Последняя задача пересчета прогноза, поставленная этим воркером
+_forecast_job = None
+_forecast_lock = threading.Lock()
+
+def schedule_forecast_refresh(conn):
+    """
+    Прогноз не считался сегодня: ставит пересчет и возвращает задачу. Пересчет
+    заявляется в базе, поэтому из нескольких воркеров задачу ставит один;
+    остальные (и этот процесс, пока задача идет у другого) получают None.
+    """
+    global _forecast_job
+    if not forecasting.is_stale(conn.cursor()):
+        return None
+    with _forecast_lock:
+        job = _forecast_job
+        if job is not None and job.status not in ('done', 'failed', 'cancelled'):
+            return job
+        if not forecasting.claim_refresh(conn):
+            return None
+        try:
+            job = _forecast_job = job_manager.submit('forecast', *JOB_KINDS['forecast'][1]())
+        except Exception:
+            forecasting.release_claim(conn)
+            raise
+        return job
+
+@app.route('/api/forecast')
+def get_forecast():
+    """
+    Прогноз недельного спроса: артикулы с наибольшим спросом на горизонт
+    (?limit=, ?q= - название или артикул). Устаревший прогноз отдается, пока
+    идет пересчет (refresh_job - если задачу поставил этот воркер,
+    refreshing_since - в любом).
+    """
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 1000)
+    conn = get_db_connection()
     cursor = conn.cursor()
+    job = schedule_forecast_refresh(conn)
+    meta = forecasting.metadata(cursor)
+    items = forecasting.top(cursor, limit, request.args.get('q', '').strip() or None)
+    conn.close()
+    return jsonify({
+        "week_start": meta.get('week_start'),
+        "computed_at": meta.get('computed_at'),
+        "weeks": forecasting.forecast_weeks(meta),
+        "refresh_job": job.id if job is not None else None,
+        "refreshing_since": meta.get('refreshing_since'),
+        "items": items,
+    })
+
+@app.route('/api/forecast/<int:article>')
+def get_article_forecast(article):
+    """Спрос артикула по неделям за историю и прогноз на горизонт"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    schedule_forecast_refresh(conn)
+    result = forecasting.article_forecast(cursor, article)
+    conn.close()
+    if result is None:
+        return jsonify({"error": f"Прогноз для артикула {article} еще не рассчитан"}), 404
+    return jsonify(result)
+
+@app.route('/api/lead_time')
+def get_lead_time():
+    """Оценка даты отгрузки: ?article=&quantity= (для корзины - несколько пар)"""
+    articles = request.args.getlist('article', type=int)
+    quantities = request.args.getlist('quantity', type=int)
+    if not articles or len(quantities) not in (0, len(articles)):
+        return jsonify({"error": "Нужны article и quantity (по одному на каждый article)"}), 400
+    lines = list(zip(articles, quantities or [1] * len(articles)))
+    if any(quantity < 1 or quantity > validation.MAX_QUANTITY for _, quantity in lines):
+        return jsonify({"error": f"Количество от 1 до {validation.MAX_QUANTITY}"}), 400
+    try:
+        return jsonify(lead_times.estimate(lines))
+    except KeyError as e:
+        return jsonify({"error": f"Товар не найден: {e.args[0]}"}), 404
+
+@app.route('/api/orders/partitions')
+def get_order_partitions():
+    """Секции заказов по месяцам: строк в базе, в архиве, файлы архива"""
+    conn = get_db_connection()
+    rows = partitions.list_partitions(conn.cursor())
+    conn.close()
+    return jsonify(rows)
+
+@app.route('/api/orders/<int:order_id>/items')
+def get_order_items(order_id):
+    return jsonify(query_order_items(order_id))
+
+@app.route('/api/orders/<int:order_id>/status', methods=['POST'])
+def change_order_status_api(order_id):
+    """Смена статуса заказа: status (и необязательный comment) в форме или JSON"""
+    data = request.get_json(silent=True) or request.form
+    status = data.get('status')
+    if status not in ORDER_STATUSES:
+        return jsonify({"error": f"Неизвестный статус. Доступны: {', '.join(ORDER_STATUSES)}"}), 400
     
-    # Средняя цена по категориям товаров
-    cursor.execute("SELECT product_type, AVG(minimum_partner_price) FROM aggregated_products GROUP BY product_type")
-    category_data = cursor.fetchall()
+    try:
+        order, event = change_order_status(order_id, status, data.get('comment', ''))
+    except KeyError:
+        return jsonify({"error": "Заказ не найден"}), 404
+    except InvalidTransition as e:
+        return jsonify({"error": str(e), "status": e.current, "allowed": list(e.allowed)}), 409
     
-    # Распределение по основным материалам
-    cursor.execute("SELECT main_material, COUNT(*) FROM aggregated_products GROUP BY main_material")
-    material_data = cursor.fetchall()
+    publish_status_changed(order, event)
+    return jsonify({"success": True, "order": order, "event": event})
+
+@app.route('/api/orders/<int:order_id>/events')
+def get_order_events(order_id):
+    return jsonify(query_order_events(order_id))
+
+@app.route('/api/orders/status_counts')
+def get_status_counts():
+    return jsonify(query_status_counts())
+
+@app.route('/api/customers/lookup')
+def lookup_customer():
+    """Поиск покупателя по ?phone= или ?email= (в любом формате записи)"""
+    phone, email = request.args.get('phone'), request.args.get('email')
+    if not customers.customer_keys(phone, email):
+        return jsonify({"error": "Укажите телефон или email"}), 400
+    customer = query_customer(phone=phone, email=email)
+    if customer is None:
+        return jsonify({"error": "Покупатель не найден"}), 404
+    return jsonify(customer)
+
+@app.route('/api/customers/top')
+def get_top_customers():
+    limit = min(max(request.args.get('limit', 20, type=int), 1), PAGE_SIZE_MAX)
+    return jsonify(query_top_customers(limit))
+
+@app.route('/api/customers/<int:customer_id>')
+def get_customer(customer_id):
+    customer = query_customer(customer_id)
+    if customer is None:
+        return jsonify({"error": "Покупатель не найден"}), 404
+    return jsonify(customer)
+
+@app.route('/api/customers/<int:customer_id>/orders')
+def get_customer_orders(customer_id):
+    """Постранично: ?limit=&cursor=, как /api/orders/page"""
+    try:
+        return jsonify(query_customer_orders(customer_id, parse_page_params(request.args)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/events')
+def order_events():
+    """Живая лента заказов (Server-Sent Events) с возобновлением по Last-Event-ID"""
+    last_id = parse_last_event_id(
+        request.headers.get('Last-Event-ID', request.args.get('last_event_id')), broker.epoch
+    )
+    return Response(
+        stream_events(broker, last_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.route('/api/reports')
+def get_reports():
+    return jsonify(query_reports())
+
+# Сколько секунд запрос ждет отрисовки PDF, прежде чем ответить 202
+PDF_WAIT_SECONDS = float(os.environ.get('FURNITURE_PDF_WAIT', 60))
+
+@app.route('/api/reports/pdf')
+def get_reports_pdf():
+    """PDF-дашборд по текущим данным; повторные запросы отдаются из кэша"""
+    snapshot = query_report_snapshot()
+    download_name = f"furniture_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
     
-    conn.close()
+    path = pdf_report.get_cached_report(snapshot)
+    if path is None:
+        future = pdf_report.submit_report(analytics_db_path(), snapshot)
+        wait = request.args.get('wait', type=float, default=PDF_WAIT_SECONDS)
+        try:
+            path = future.result(timeout=wait)
+        except TimeoutError:
+            response = jsonify({"status": "rendering"})
+            response.headers['Retry-After'] = '2'
+            return response, 202
+        except Exception as e:
+            return jsonify({"error": f"Ошибка построения отчета: {e}"}), 500
     
+    return send_file(os.path.abspath(path), mimetype='application/pdf',
+                     as_attachment=True, download_name=download_name)
+
+@app.route('/api/replication')
+def get_replication():
+    """Состояние аналитической копии и ее отставание от основной базы"""
+    if replication.replicator is None:
+        return jsonify({"enabled": False})
+    return jsonify(replication.replicator.status())
+
+@app.route('/metrics')
+def get_metrics():
+    """Метрики в текстовом формате Prometheus"""
+    if not metrics.ENABLED:
+        return Response("# метрики выключены, включите FURNITURE_METRICS=1\n", mimetype='text/plain'), 404
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+# ========== Профили медленных запросов ==========
+# Админские маршруты требуют заголовок X-Admin-Token; без токена в окружении
+# их нет (404) - профили содержат параметры запросов и SQL
+ADMIN_TOKEN = os.environ.get('FURNITURE_ADMIN_TOKEN')
+
+def admin_forbidden():
+    """Ответ 404 без настроенного токена, 403 - если токен не передан или неверен"""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Не найдено"}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), ADMIN_TOKEN.encode()):
+        return jsonify({"error": "Нужен токен администратора"}), 403
+    return None
+
+@app.route('/admin/profiles', methods=['GET', 'DELETE'])
+def admin_profiles():
+    """Список профилей медленных запросов (DELETE - очистить буфер)"""
+    forbidden = admin_forbidden()
+    if forbidden:
+        return forbidden
+    if request.method == 'DELETE':
+        profiler.slow_requests.clear()
+        return jsonify({"success": True})
     return jsonify({
-        "category_chart": category_data,
-        "material_chart": material_data
+        "enabled": profiler.ENABLED,
+        "threshold_ms": profiler.slow_requests.threshold_ms,
+        "profiles": profiler.slow_requests.list(),
     })
 
+@app.route('/admin/profiles/<int:profile_id>')
+def admin_profile(profile_id):
+    """Полный профиль: стеки, горячие функции и SQL (?format=collapsed - для flamegraph)"""
+    forbidden = admin_forbidden()
+    if forbidden:
+        return forbidden
+    profile = profiler.slow_requests.get(profile_id)
+    if profile is None:
+        return jsonify({"error": "Профиль не найден (буфер хранит только последние)"}), 404
+    if request.args.get('format') == 'collapsed':
+        return Response(profiler.collapsed_stacks(profile), mimetype='text/plain')
+    return jsonify(profile)
+
+# ========== Фоновые задачи ==========
+# Тип задачи -> (функция задачи, построитель аргументов на момент постановки)
+JOB_KINDS = {
+    'export': (exports.export_csv_zip_job, lambda: (DB_PATH,)),
+    'pdf': (pdf_report.pdf_report_job, lambda: (analytics_db_path(), query_report_snapshot())),
+    'excel': (exports.excel_report_job, lambda: (analytics_db_path(),)),
+    'partitions': (partitions.maintenance_job, lambda: (DB_PATH,)),
+    'forecast': (forecasting.forecast_job, lambda: (DB_PATH,)),
+}
+for kind, (func, _) in JOB_KINDS.items():
+    # Одинаковые PDF (тот же снимок данных) рисуются один раз
+    job_manager.register(kind, func, shared=kind == 'pdf')
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Ставит тяжелую операцию в фоновую очередь и сразу возвращает id задачи"""
+    kind = request.form.get('kind') or (request.get_json(silent=True) or {}).get('kind')
+    if kind not in JOB_KINDS:
+        return jsonify({"error": f"Неизвестный тип задачи. Доступны: {', '.join(JOB_KINDS)}"}), 400
+    
+    job = job_manager.submit(kind, *JOB_KINDS[kind][1]())
+    return jsonify(job_manager.status(job)), 202
+
+@app.route('/api/jobs')
+def list_jobs():
+    return jsonify(job_manager.list())
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Задача не найдена"}), 404
+    return jsonify(job_manager.status(job))
+
+@app.route('/api/jobs/<job_id>/result')
+def get_job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Задача не найдена"}), 404
+    if job.status != 'done':
+        return jsonify(job_manager.status(job)), 409
+    if not os.path.exists(job.result):
+        return jsonify({"error": "Результат задачи удален"}), 410
+    # Файлы задач называются "<id задачи>_<имя>", в загрузку отдаем только имя
+    filename = os.path.basename(job.result)
+    if filename.startswith(job.id + '_'):
+        filename = filename[len(job.id) + 1:]
+    return send_file(os.path.abspath(job.result), as_attachment=True, download_name=filename)
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    if not job_manager.cancel(job_id):
+        return jsonify({"error": "Задача не найдена или уже завершена"}), 404
+    return jsonify({"success": True})
+
+# ========== Запуск ==========
+def create_app(db_path=None, bootstrap=True):
+    """
+    Фабрика приложения для WSGI-серверов: gunicorn --preload 'app:create_app()'.
+    С --preload база готовится один раз в мастер-процессе до запуска воркеров,
+    без него - в каждом воркере при первом запросе.
+    """
+    global DB_PATH, _db_ready
+    if db_path is not None and db_path != DB_PATH:
+        DB_PATH = db_path
+        _db_ready = False
+    if bootstrap:
+        ensure_db()
+    return app
+
 if __name__ == "__main__":
+    create_app()
     print("="*60)
     print("Furniture Pro - Система управления производством")
     print("Сервер доступен по адресу: http://localhost:5000")
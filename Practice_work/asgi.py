@@ -0,0 +1,242 @@
+# asgi.py
+"""
+Асинхронный режим сервера (ASGI).
+
+Маршруты чтения /api/* обслуживаются напрямую в цикле событий, а блокирующие
+запросы к SQLite выполняются в отдельном пуле потоков. Поэтому один процесс
+держит тысячи одновременных подключений дашбордов: ожидающее соединение не
+занимает поток, поток занят только на время самого SQL-запроса.
+Все остальные маршруты (главная страница, создание заказа) передаются
+Flask-приложению через адаптер WSGI -> ASGI.
+
+Запуск в production:
+    python asgi.py --host 0.0.0.0 --port 8000 --workers 4
+или напрямую через uvicorn:
+    uvicorn asgi:application --workers 4
+"""
+import argparse
+import asyncio
+import functools
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from app import (
+    app,
+    db_ready,
+    ensure_db,
+    query_products,
+    query_random_products,
+    query_production_data,
+    query_orders,
+    query_reports,
+    query_stats,
+    query_status_counts,
+    sqlite_only_route,
+    query_orders_page,
+    query_products_page,
+    query_production_page,
+    parse_page_params,
+    NO_ETAG_PATHS,
+)
+from events import broker, stream_events_async, parse_last_event_id
+import metrics
+import profiler
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:  # asgiref нужен только для маршрутов, не переписанных на async
+    WsgiToAsgi = None
+
+# ========== Настройки ==========
+# Количество потоков для запросов к SQLite в одном процессе
+DB_THREADS = int(os.environ.get('FURNITURE_DB_THREADS', min(32, (os.cpu_count() or 1) + 4)))
+# Количество процессов-воркеров сервера
+WORKERS = int(os.environ.get('FURNITURE_WORKERS', 1))
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='sqlite')
+
+# ========== Асинхронный доступ к SQLite ==========
+async def run_query(func, *args):
+    """Выполняет блокирующую функцию запроса в пуле потоков БД"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, func, *args)
+
+# Маршруты, которые обслуживаются без Flask
+ASYNC_ROUTES = {
+    '/api/products': query_products,
+    '/api/random_products': query_random_products,
+    '/api/production': query_production_data,
+    '/api/orders': query_orders,
+    '/api/reports': query_reports,
+    '/api/stats': query_stats,
+    '/api/orders/status_counts': query_status_counts,
+}
+# Постраничные маршруты: функции принимают параметры страницы и фильтров
+ASYNC_PAGED_ROUTES = {
+    '/api/orders/page': query_orders_page,
+    '/api/products/page': query_products_page,
+    '/api/production/page': query_production_page,
+}
+
+# ========== ASGI приложение ==========
+def etag_matches(if_none_match, etag):
+    """Есть ли etag в заголовке If-None-Match (слабые ETag сравниваются как сильные)"""
+    if if_none_match is None:
+        return False
+    candidates = [value.strip().removeprefix('W/') for value in if_none_match.decode('latin-1').split(',')]
+    return '*' in candidates or etag in candidates
+
+async def send_json(send, data, status=200, if_none_match=False):
+    """
+    JSON-ответ. Если передан if_none_match (заголовок запроса или None),
+    ответ получает ETag, а совпадающий запрос - 304 без тела.
+    """
+    # Тело как у jsonify во Flask, чтобы ETag совпадал в обоих режимах
+    body = (app.json.dumps(data, separators=(',', ':')) + '\n').encode('utf-8')
+    headers = [(b'content-type', b'application/json')]
+    if status == 200 and if_none_match is not False:
+        # Тот же формат, что у Flask (response.add_etag): sha1 тела в кавычках
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        headers += [(b'etag', etag.encode('ascii')), (b'cache-control', b'no-cache')]
+        if etag_matches(if_none_match, etag):
+            status, body = 304, b''
+    headers.append((b'content-length', str(len(body)).encode('ascii')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+    return len(body)
+
+async def send_json_measured(send, scope, func, if_none_match=False):
+    """То же, что обычный ответ, но с записью метрик маршрута"""
+    started = time.perf_counter()
+    status, rows = 200, None
+    try:
+        data, rows = await run_query(metrics.count_rows, func)
+    except ValueError as e:
+        status, data = 400, {"error": str(e)}
+    except Exception as e:
+        status, data = 500, {"error": str(e)}
+    size = await send_json(send, data, status=status, if_none_match=if_none_match)
+    metrics.record_request(scope['path'], scope['method'], status,
+                           time.perf_counter() - started, size, rows)
+
+async def send_event_stream(scope, receive, send):
+    """Живая лента заказов: соединение ждет в цикле событий, не занимая поток"""
+    headers = dict(scope.get('headers') or [])
+    last_id = headers.get(b'last-event-id')
+    if last_id is None:
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        last_id = query.get('last_event_id', [None])[0]
+    if isinstance(last_id, bytes):
+        last_id = last_id.decode('latin-1')
+    last_id = parse_last_event_id(last_id, broker.epoch)
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+
+    async def stream():
+        async for chunk in stream_events_async(broker, last_id):
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+
+    async def wait_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    # Поток событий идет до отключения клиента
+    tasks = [asyncio.ensure_future(stream()), asyncio.ensure_future(wait_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def lifespan(receive, send):
+    """Обработка событий запуска и остановки сервера"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # База готовится при старте воркера, а не при импорте модуля
+            await run_query(ensure_db)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _db_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+_wsgi_app = WsgiToAsgi(app) if WsgiToAsgi is not None else None
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http':
+        if scope['path'] == '/api/events':
+            await send_event_stream(scope, receive, send)
+            return
+        func = ASYNC_ROUTES.get(scope['path'])
+        paged = ASYNC_PAGED_ROUTES.get(scope['path'])
+        if ((func is not None or paged is not None) and scope['method'] in ('GET', 'HEAD')
+                and not sqlite_only_route(scope['path'])):
+            if not db_ready():
+                # Сервер запущен без lifespan-событий
+                await run_query(ensure_db)
+            params = {key: values[-1] for key, values in
+                      parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+            if paged is not None:
+                func = functools.partial(paged, parse_page_params(params))
+            if profiler.ENABLED:
+                # Профилируется часть запроса, выполняемая в потоке БД
+                func = functools.partial(profiler.slow_requests.call, scope['path'], scope['method'], params, func)
+            # Случайная выборка каждый раз разная - ETag ей не нужен
+            if_none_match = False
+            if scope['path'] not in NO_ETAG_PATHS:
+                if_none_match = dict(scope.get('headers') or []).get(b'if-none-match')
+            if metrics.ENABLED:
+                await send_json_measured(send, scope, func, if_none_match)
+                return
+            try:
+                data = await run_query(func)
+            except ValueError as e:
+                await send_json(send, {"error": str(e)}, status=400)
+                return
+            except Exception as e:
+                await send_json(send, {"error": str(e)}, status=500)
+                return
+            await send_json(send, data, if_none_match=if_none_match)
+            return
+
+    if _wsgi_app is None:
+        await send_json(send, {"error": "Для этого маршрута требуется пакет asgiref"}, status=501)
+        return
+    await _wsgi_app(scope, receive, send)
+
+# ========== Точка входа для production ==========
+def main():
+    parser = argparse.ArgumentParser(description='Furniture Pro - ASGI сервер')
+    parser.add_argument('--host', default=os.environ.get('FURNITURE_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('FURNITURE_PORT', 8000)))
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='Количество процессов (по умолчанию FURNITURE_WORKERS или 1)')
+    args = parser.parse_args()
+
+    import uvicorn
+    print("=" * 60)
+    print(f"Furniture Pro - ASGI сервер: http://{args.host}:{args.port}")
+    print(f"Воркеров: {args.workers}, потоков SQLite на воркер: {DB_THREADS}")
+    if args.workers > 1:
+        print("Живая лента (/api/events) видит только заказы своего воркера: для нее нужен --workers 1")
+    print("=" * 60)
+    uvicorn.run('asgi:application', host=args.host, port=args.port, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
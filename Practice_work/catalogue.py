@@ -0,0 +1,308 @@
+# catalogue.py
+"""
+Загрузка каталога из combined_data.csv с учетом изменений.
+
+Строка каталога - маршрут изделия через цех, ключ - (article, workshop_name).
+Вместо удаления и повторной загрузки всех товаров загрузчик за один проход
+по CSV сравнивает хэши строк с текущей таблицей products и применяет только
+вставки, изменения и удаления. Агрегаты (aggregated_products) пересчитываются
+только для затронутых артикулов.
+
+Каждая перезагрузка оставляет отчет:
+    catalogue_reloads  - версия, предыдущая версия, счетчики строк и товаров
+    catalogue_changes  - что именно изменилось: добавленные/удаленные строки и
+                         по изменённым - поле, старое и новое значение
+
+Отчет читают экран товаров (баннер "каталог обновлён") и кэши: маршруты оценки
+сроков сбрасываются только для изменённых артикулов. Хранится последних
+FURNITURE_CATALOGUE_HISTORY перезагрузок.
+"""
+import csv
+import hashlib
+import os
+
+HISTORY = int(os.environ.get('FURNITURE_CATALOGUE_HISTORY', 20))
+BATCH_SIZE = 1000
+
+# Колонки products, кроме id; порядок - как в CSV
+FIELDS = (
+    'product_name', 'article', 'product_type', 'product_type_coefficient',
+    'minimum_partner_price', 'main_material', 'raw_material_loss_percentage',
+    'workshop_name', 'workshop_type', 'number_of_people_for_production',
+    'manufacturing_time_hours', 'total_labor_hours',
+)
+_ARTICLE = FIELDS.index('article')
+_WORKSHOP = FIELDS.index('workshop_name')
+_NAME = FIELDS.index('product_name')
+_PRICE = FIELDS.index('minimum_partner_price')
+_FLOAT_FIELDS = ('product_type_coefficient', 'minimum_partner_price', 'raw_material_loss_percentage',
+                 'manufacturing_time_hours', 'total_labor_hours')
+_INT_FIELDS = ('number_of_people_for_production',)
+
+_INSERT_SQL = (f"INSERT INTO products (id, {', '.join(FIELDS)}) "
+               f"VALUES ({', '.join('?' * (len(FIELDS) + 1))})")
+_UPDATE_SQL = f"UPDATE products SET {', '.join(f'{field} = ?' for field in FIELDS)} WHERE id = ?"
+
+
+def create_catalogue_schema(cursor):
+    """Таблицы отчета о перезагрузках и индекс по ключу строки каталога"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS catalogue_reloads (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        version TEXT,
+        previous_version TEXT,
+        loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        rows_added INTEGER NOT NULL DEFAULT 0,
+        rows_updated INTEGER NOT NULL DEFAULT 0,
+        rows_removed INTEGER NOT NULL DEFAULT 0,
+        rows_unchanged INTEGER NOT NULL DEFAULT 0,
+        products_added INTEGER NOT NULL DEFAULT 0,
+        products_removed INTEGER NOT NULL DEFAULT 0,
+        price_changes INTEGER NOT NULL DEFAULT 0,
+        initial INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS catalogue_changes (
+        reload_id INTEGER NOT NULL,
+        article INTEGER,
+        workshop_name TEXT,
+        product_name TEXT,
+        change TEXT NOT NULL,
+        field TEXT,
+        old_value TEXT,
+        new_value TEXT
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_catalogue_changes_reload ON catalogue_changes (reload_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_article_workshop ON products (article, workshop_name)")
+
+
+def parse_row(row):
+    """Строка CSV -> кортеж значений в порядке FIELDS (типы как в products)"""
+    values = []
+    for field in FIELDS:
+        raw = row[field]
+        if field == 'article':
+            values.append(int(raw) if raw and raw.isdigit() else 0)
+        elif field in _FLOAT_FIELDS:
+            values.append(float(raw) if raw else 0.0)
+        elif field in _INT_FIELDS:
+            values.append(int(raw) if raw else 0)
+        else:
+            values.append(raw)
+    return tuple(values)
+
+
+def row_hash(values):
+    return hashlib.blake2b(repr(values).encode('utf-8'), digest_size=16).digest()
+
+
+def _current_rows(cursor):
+    """Ключ -> (id, хэш) для текущих строк products (значения в памяти не держим)"""
+    cursor.execute(f"SELECT id, {', '.join(FIELDS)} FROM products")
+    current = {}
+    while True:
+        rows = cursor.fetchmany(BATCH_SIZE)
+        if not rows:
+            return current
+        for row in rows:
+            values = tuple(row[1:])
+            current[(values[_ARTICLE], values[_WORKSHOP])] = (row[0], row_hash(values))
+
+
+def reload_catalogue(cursor, csv_path, version):
+    """
+    Синхронизирует products с CSV за один проход и пишет отчет о перезагрузке.
+    Возвращает отчет: счетчики и множество затронутых артикулов (articles).
+    Вызывается внутри транзакции init_db.
+    """
+    row = cursor.execute("SELECT value FROM catalogue_meta WHERE key = 'version'").fetchone()
+    previous_version = row[0] if row else None
+
+    current = _current_rows(cursor)
+    initial = not current
+    old_articles = {article for article, _ in current}
+    # id строк, которые остаются в products (совпали по ключу)
+    kept_ids = set()
+    new_articles = set()
+    touched = set()
+    seen = set()
+    inserts, updates, changes = [], [], []
+    unchanged = updated = 0
+    # артикул -> (название, старая цена, новая цена); цена повторяется в строках всех цехов
+    price_changes = {}
+    # названия новых и удаленных товаров (артикулов) для отчета
+    added_names, removed_names = {}, {}
+
+    with open(csv_path, 'r', encoding='utf-8-sig') as file:
+        for i, csv_row in enumerate(csv.DictReader(file), 1):
+            try:
+                values = parse_row(csv_row)
+                csv_id = int(csv_row['id'])
+            except Exception as e:
+                print(f"Ошибка при обработке строки {i}: {e}")
+                print(f"Данные строки: {csv_row}")
+                continue
+            key = (values[_ARTICLE], values[_WORKSHOP])
+            if key in seen:
+                print(f"Строка {i}: повтор артикула {key[0]} в цехе {key[1]}, пропущена")
+                continue
+            seen.add(key)
+            new_articles.add(key[0])
+            if key[0] not in old_articles:
+                added_names[key[0]] = values[_NAME]
+
+            existing = current.pop(key, None)
+            if existing is None:
+                inserts.append((csv_id,) + values)
+                touched.add(key[0])
+                if not initial:
+                    changes.append((key[0], key[1], values[_NAME], 'added', None, None, None))
+                continue
+            kept_ids.add(existing[0])
+            if existing[1] == row_hash(values):
+                unchanged += 1
+            else:
+                product_id = existing[0]
+                old = cursor.execute(f"SELECT {', '.join(FIELDS)} FROM products WHERE id = ?",
+                                     (product_id,)).fetchone()
+                for field, old_value, new_value in zip(FIELDS, old, values):
+                    if old_value != new_value:
+                        changes.append((key[0], key[1], values[_NAME], 'updated', field,
+                                        str(old_value), str(new_value)))
+                if old[_PRICE] != values[_PRICE]:
+                    price_changes[key[0]] = (values[_NAME], old[_PRICE], values[_PRICE])
+                updates.append(values + (product_id,))
+                updated += 1
+                touched.add(key[0])
+
+            if len(updates) >= BATCH_SIZE:
+                cursor.executemany(_UPDATE_SQL, updates)
+                updates = []
+
+    # Строки, которых больше нет в CSV; удаляем до вставок, чтобы освободить id
+    removed = list(current.values())
+    for start in range(0, len(removed), BATCH_SIZE):
+        chunk = [product_id for product_id, _ in removed[start:start + BATCH_SIZE]]
+        cursor.execute(f"SELECT article, workshop_name, product_name FROM products "
+                       f"WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+        for article, workshop, name in cursor.fetchall():
+            touched.add(article)
+            removed_names[article] = name
+            changes.append((article, workshop, name, 'removed', None, None, None))
+        cursor.executemany("DELETE FROM products WHERE id = ?", [(product_id,) for product_id in chunk])
+    if updates:
+        cursor.executemany(_UPDATE_SQL, updates)
+    # id из CSV, если его не занимает оставшаяся строка или предыдущая вставка;
+    # остальным id назначает SQLite (max + 1) - после всех явных, иначе
+    # назначенный id может совпасть с id строки ниже по CSV
+    explicit, automatic = [], []
+    for row in inserts:
+        if row[0] in kept_ids:
+            automatic.append((None,) + row[1:])
+        else:
+            kept_ids.add(row[0])
+            explicit.append(row)
+    rows = explicit + automatic
+    for start in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(_INSERT_SQL, rows[start:start + BATCH_SIZE])
+
+    report = {
+        "version": version,
+        "previous_version": previous_version,
+        "rows_added": len(inserts),
+        "rows_updated": updated,
+        "rows_removed": len(removed),
+        "rows_unchanged": unchanged,
+        "products_added": 0 if initial else len(added_names),
+        "products_removed": len(old_articles - new_articles),
+        "price_changes": len(price_changes),
+        "initial": initial,
+    }
+    cursor.execute("INSERT OR REPLACE INTO catalogue_meta (key, value) VALUES ('version', ?)", (version,))
+    if not touched:
+        # Ничего не изменилось (пересохраненный CSV): отчет прошлой перезагрузки остается последним
+        report["id"] = None
+        report["articles"] = touched
+        return report
+
+    cursor.execute(f"INSERT INTO catalogue_reloads ({', '.join(report)}) "
+                   f"VALUES ({', '.join('?' * len(report))})", tuple(report.values()))
+    reload_id = cursor.lastrowid
+    # Итоги по товарам - отдельными записями на артикул
+    changes.extend((article, None, name, 'price', 'minimum_partner_price', str(old), str(new))
+                   for article, (name, old, new) in price_changes.items())
+    if not initial:
+        changes.extend((article, None, name, 'product_added', None, None, None)
+                       for article, name in added_names.items())
+    changes.extend((article, None, removed_names.get(article), 'product_removed', None, None, None)
+                   for article in old_articles - new_articles)
+    cursor.executemany("INSERT INTO catalogue_changes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                       [(reload_id,) + change for change in changes])
+    cursor.execute("DELETE FROM catalogue_changes WHERE reload_id <= ?", (reload_id - HISTORY,))
+    cursor.execute("DELETE FROM catalogue_reloads WHERE id <= ?", (reload_id - HISTORY,))
+
+    report["id"] = reload_id
+    report["articles"] = touched
+    return report
+
+
+def refresh_aggregated(cursor, articles=None):
+    """Пересчет aggregated_products: целиком или только для указанных артикулов"""
+    select = '''
+        INSERT INTO aggregated_products (
+            article, product_name, product_type, product_type_coefficient,
+            minimum_partner_price, main_material, raw_material_loss_percentage,
+            total_production_hours, avg_manufacturing_time, workshop_count
+        )
+        SELECT
+            article, product_name, product_type,
+            AVG(product_type_coefficient), MIN(minimum_partner_price), main_material,
+            AVG(raw_material_loss_percentage), SUM(total_labor_hours),
+            AVG(manufacturing_time_hours), COUNT(*)
+        FROM products
+        {where}
+        GROUP BY article, product_name, product_type, main_material
+        ORDER BY product_name
+    '''
+    if articles is None:
+        cursor.execute("DELETE FROM aggregated_products")
+        cursor.execute(select.format(where=''))
+        return
+    articles = list(articles)
+    for start in range(0, len(articles), BATCH_SIZE // 2):
+        chunk = articles[start:start + BATCH_SIZE // 2]
+        marks = ', '.join('?' * len(chunk))
+        cursor.execute(f"DELETE FROM aggregated_products WHERE article IN ({marks})", chunk)
+        cursor.execute(select.format(where=f"WHERE article IN ({marks})"), chunk)
+
+
+def latest_changes(cursor, limit=50):
+    """Отчет о последней перезагрузке каталога: счетчики, смены цен, новые и удаленные товары"""
+    cursor.execute("SELECT * FROM catalogue_reloads ORDER BY id DESC LIMIT 1")
+    row = cursor.fetchone()
+    if row is None:
+        return {"reload": None, "price_changes": [], "added_products": [],
+                "removed_products": [], "changes": []}
+    reload = dict(zip([column[0] for column in cursor.description], row))
+    reload['initial'] = bool(reload['initial'])
+
+    def fetch(where):
+        cursor.execute(f"SELECT article, workshop_name, product_name, change, field, old_value, new_value "
+                       f"FROM catalogue_changes WHERE reload_id = ? AND {where} "
+                       f"ORDER BY product_name, article, workshop_name LIMIT ?", (reload['id'], limit))
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, values)) for values in cursor.fetchall()]
+
+    return {
+        "reload": reload,
+        "price_changes": [{"article": change["article"], "product_name": change["product_name"],
+                           "old_price": float(change["old_value"]), "new_price": float(change["new_value"])}
+                          for change in fetch("change = 'price'")],
+        "added_products": [{"article": change["article"], "product_name": change["product_name"]}
+                           for change in fetch("change = 'product_added'")],
+        "removed_products": [{"article": change["article"], "product_name": change["product_name"]}
+                             for change in fetch("change = 'product_removed'")],
+        "changes": fetch("change IN ('added', 'updated', 'removed')"),
+    }
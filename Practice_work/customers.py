@@ -0,0 +1,190 @@
+# customers.py
+"""
+Покупатели: одна запись на человека вместо свободного текста в каждом заказе.
+
+Телефон и email приводятся к ключам (только цифры с кодом 7, email в нижнем
+регистре) и хранятся в таблице customer_keys, поэтому у покупателя может быть
+несколько телефонов и адресов почты. Новый заказ связывается с покупателем по
+любому совпавшему ключу (сначала телефон, затем email), новые ключи
+добавляются к найденному покупателю. Количество заказов, сумма покупок (без
+отмененных) и даты первого/последнего заказа обновляются приращениями в той
+же транзакции, что и сам заказ.
+
+Функции принимают курсор открытой транзакции, фиксация - на вызывающем коде.
+"""
+import re
+
+_NON_DIGITS = re.compile(r'\D')
+
+# Поля заказа, нужные для привязки (в этом порядке)
+ORDER_FIELDS = ('id', 'customer_name', 'customer_phone', 'customer_email',
+                'delivery_address', 'total_price', 'status', 'order_date')
+
+
+def normalize_phone(phone):
+    """'8 (916) 123-45-67', '+7 916 1234567' -> '79161234567'"""
+    digits = _NON_DIGITS.sub('', phone or '')
+    if len(digits) == 11 and digits[0] == '8':
+        digits = '7' + digits[1:]
+    elif len(digits) == 10 and digits[0] == '9':
+        digits = '7' + digits
+    return digits
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+def customer_keys(phone, email):
+    """Ключи поиска покупателя: телефон раньше email"""
+    keys = []
+    phone_key = normalize_phone(phone)
+    if len(phone_key) >= 5:
+        keys.append('phone:' + phone_key)
+    email_key = normalize_email(email)
+    if '@' in email_key:
+        keys.append('email:' + email_key)
+    return keys
+
+
+def create_customer_schema(cursor):
+    """Таблицы покупателей и колонка orders.customer_id (для старых баз - миграция)"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS customers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        phone TEXT,
+        email TEXT,
+        address TEXT,
+        orders_count INTEGER NOT NULL DEFAULT 0,
+        cancelled_count INTEGER NOT NULL DEFAULT 0,
+        lifetime_value REAL NOT NULL DEFAULT 0,
+        first_order_at TIMESTAMP,
+        last_order_at TIMESTAMP
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS customer_keys (
+        key TEXT PRIMARY KEY,
+        customer_id INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customer_keys_customer ON customer_keys (customer_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customers_value ON customers (lifetime_value)")
+
+    cursor.execute("PRAGMA table_info(orders)")
+    if 'customer_id' not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE orders ADD COLUMN customer_id INTEGER")
+    # История покупателя: заказы по дате; заодно быстрый поиск непривязанных (NULL)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders (customer_id, order_date, id)")
+
+
+def _find_customer(cursor, keys, cache):
+    for key in keys:
+        customer_id = cache.get(key) if cache is not None else None
+        if customer_id is None:
+            cursor.execute("SELECT customer_id FROM customer_keys WHERE key = ?", (key,))
+            row = cursor.fetchone()
+            customer_id = row[0] if row else None
+        if customer_id is not None:
+            return customer_id
+    return None
+
+def link_orders(cursor, orders, cache=None):
+    """
+    Привязывает заказы (кортежи полей ORDER_FIELDS, по возрастанию даты) к покупателям,
+    создавая новых при необходимости. Возвращает список customer_id в том же порядке.
+    cache - словарь ключ -> customer_id для пакетной привязки.
+    """
+    deltas = {}
+    links = []
+    for order_id, name, phone, email, address, total_price, status, order_date in orders:
+        keys = customer_keys(phone, email)
+        customer_id = _find_customer(cursor, keys, cache)
+        if customer_id is None:
+            cursor.execute("INSERT INTO customers (name, phone, email, address) VALUES (?, ?, ?, ?)",
+                           (name, phone, email, address))
+            customer_id = cursor.lastrowid
+        # Новый телефон или email известного покупателя запоминаем как его ключ
+        for key in keys:
+            if cache is None or key not in cache:
+                cursor.execute("INSERT OR IGNORE INTO customer_keys (key, customer_id) VALUES (?, ?)",
+                               (key, customer_id))
+                if cache is not None:
+                    cache[key] = customer_id
+
+        delta = deltas.setdefault(customer_id, [0, 0, 0.0, order_date, order_date, name, phone, email, address])
+        delta[0] += 1
+        if status == 'отменён':
+            delta[1] += 1
+        else:
+            delta[2] += total_price or 0
+        delta[3] = min(delta[3] or order_date, order_date or delta[3])
+        if (order_date or '') >= (delta[4] or ''):
+            # Контакты берутся из самого свежего заказа
+            delta[4:] = [order_date, name, phone or delta[6], email or delta[7], address or delta[8]]
+        links.append((customer_id, order_id))
+
+    cursor.executemany('''
+        UPDATE customers SET
+            orders_count = orders_count + ?,
+            cancelled_count = cancelled_count + ?,
+            lifetime_value = lifetime_value + ?,
+            first_order_at = MIN(COALESCE(first_order_at, ?), ?),
+            last_order_at = MAX(COALESCE(last_order_at, ?), ?),
+            name = ?, phone = ?, email = ?, address = ?
+        WHERE id = ?
+    ''', [(count, cancelled, value, first, first, last, last, name, phone, email, address, customer_id)
+          for customer_id, (count, cancelled, value, first, last, name, phone, email, address) in deltas.items()])
+    cursor.executemany("UPDATE orders SET customer_id = ? WHERE id = ?", links)
+    return [customer_id for customer_id, _ in links]
+
+def link_unassigned_orders(cursor, batch_size=10000):
+    """
+    Привязывает заказы без customer_id (созданные до появления покупателей или
+    загруженные напрямую в таблицу) пачками. Возвращает число привязанных заказов.
+    """
+    cursor.execute("SELECT 1 FROM orders WHERE customer_id IS NULL LIMIT 1")
+    if cursor.fetchone() is None:
+        return 0
+    cursor.execute("SELECT key, customer_id FROM customer_keys")
+    cache = dict(cursor.fetchall())
+    columns = ', '.join(ORDER_FIELDS)
+    linked = 0
+    while True:
+        cursor.execute(f"SELECT {columns} FROM orders WHERE customer_id IS NULL ORDER BY order_date, id LIMIT ?",
+                       (batch_size,))
+        orders = cursor.fetchall()
+        if not orders:
+            return linked
+        link_orders(cursor, orders, cache)
+        linked += len(orders)
+
+def on_order_cancelled(cursor, order_id):
+    """Отмененный заказ больше не входит в сумму покупок"""
+    cursor.execute('''
+        UPDATE customers SET
+            cancelled_count = cancelled_count + 1,
+            lifetime_value = lifetime_value - COALESCE((SELECT total_price FROM orders WHERE id = ?), 0)
+        WHERE id = (SELECT customer_id FROM orders WHERE id = ?)
+    ''', (order_id, order_id))
+
+
+# ========== Запросы ==========
+def get_customer(cursor, customer_id):
+    cursor.execute("SELECT * FROM customers WHERE id = ?", (customer_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    customer = dict(row)
+    cursor.execute("SELECT key FROM customer_keys WHERE customer_id = ? ORDER BY key", (customer_id,))
+    customer['keys'] = [key for (key,) in cursor.fetchall()]
+    return customer
+
+def find_customer(cursor, phone=None, email=None):
+    """Покупатель по телефону или email в любом формате записи"""
+    customer_id = _find_customer(cursor, customer_keys(phone, email), None)
+    return get_customer(cursor, customer_id) if customer_id is not None else None
+
+def top_customers(cursor, limit):
+    """Покупатели с наибольшей суммой покупок (по индексу lifetime_value)"""
+    cursor.execute("SELECT * FROM customers ORDER BY lifetime_value DESC LIMIT ?", (limit,))
+    return [dict(row) for row in cursor.fetchall()]
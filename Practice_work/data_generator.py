@@ -0,0 +1,371 @@
+# data_generator.py
+"""
+Генератор синтетических данных производственного масштаба.
+
+Каталог повторяет схему combined_data.csv: типы продуктов с коэффициентами,
+материалы с процентом потерь, маршруты по цехам с численностью персонала и
+временем изготовления. Если рядом лежит настоящий combined_data.csv, все
+распределения (маршруты по типам, цены, время по цехам) берутся из него.
+
+Поток заказов соответствует таблице orders: срочность и способы оплаты как
+в форме заказа, популярность товаров и повторные покупатели по закону Ципфа,
+рост продаж и недельная сезонность, срок доставки по срочности. Заказы
+генерируются в хронологическом порядке и пишутся потоком (CSV или SQLite),
+в памяти не копятся.
+
+    python data_generator.py catalogue --articles 10000 --csv big_catalogue.csv
+    python data_generator.py orders --count 1000000 --db furniture_production.db
+    python data_generator.py orders --count 100000 --csv orders.csv --catalogue-db furniture_production.db
+"""
+import argparse
+import bisect
+import csv
+import itertools
+import os
+import random
+import sqlite3
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+CATALOGUE_COLUMNS = [
+    'id', 'product_name', 'article', 'product_type', 'product_type_coefficient',
+    'minimum_partner_price', 'main_material', 'raw_material_loss_percentage',
+    'workshop_name', 'workshop_type', 'number_of_people_for_production',
+    'manufacturing_time_hours', 'total_labor_hours',
+]
+
+ORDER_COLUMNS = [
+    'product_id', 'product_name', 'customer_name', 'customer_phone',
+    'customer_email', 'delivery_address', 'order_notes', 'urgency',
+    'payment_method', 'quantity', 'unit_price', 'total_price',
+    'order_date', 'delivery_date', 'status',
+]
+
+TEMPLATE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'combined_data.csv')
+
+# ========== Справочники (используются, если нет combined_data.csv) ==========
+PRODUCT_TYPES = {
+    'Мягкая мебель': 3.0, 'Шкафы': 1.5, 'Комоды': 2.3,
+    'Кровати': 4.7, 'Гостиные': 3.5, 'Прихожие': 5.6,
+}
+MATERIALS = [
+    ('Мебельный щит из массива дерева', 0.008, 60),
+    ('Ламинированное ДСП', 0.007, 17),
+    ('Фанера', 0.0055, 16),
+    ('МДФ', 0.003, 7),
+]
+WORKSHOPS = {
+    # цех: (тип цеха, человек, типичное время, ч)
+    'Проектный': ('Проектирование', 4, 1.0),
+    'Расчетный': ('Проектирование', 5, 0.5),
+    'Раскроя': ('Обработка', 5, 0.8),
+    'Обработки': ('Обработка', 6, 1.2),
+    'Столярный': ('Обработка', 7, 1.5),
+    'Сушильный': ('Сушка', 3, 2.0),
+    'Покраски': ('Обработка', 5, 1.5),
+    'Изготовления мягкой мебели': ('Обработка', 5, 4.0),
+    'Изготовления изделий из искусственного камня и композитных материалов': ('Обработка', 3, 3.0),
+    'Монтажа стеклянных, зеркальных вставок и других изделий': ('Сборка', 2, 1.0),
+    'Сборки': ('Сборка', 6, 1.5),
+    'Упаковки': ('Сборка', 4, 0.3),
+}
+BASE_ROUTING = ['Проектный', 'Раскроя', 'Обработки', 'Покраски', 'Сборки', 'Упаковки']
+PRICE_RANGES = {
+    'Мягкая мебель': (15000, 120000), 'Шкафы': (8000, 90000), 'Комоды': (6000, 40000),
+    'Кровати': (12000, 110000), 'Гостиные': (25000, 160000), 'Прихожие': (9000, 70000),
+}
+PRODUCT_NAMES = {
+    'Мягкая мебель': ['Диван-кровать', 'Диван модульный', 'Детский диван', 'Кресло', 'Диван угловой', 'Пуф'],
+    'Шкафы': ['Шкаф-купе', 'Шкаф-пенал', 'Шкаф 2-х дверный', 'Шкаф 4 дверный с ящиками', 'Стеллаж'],
+    'Комоды': ['Комод 4 ящика', 'Комод 6 ящиков', 'Тумба под ТВ', 'Тумба прикроватная'],
+    'Кровати': ['Кровать с подъемным механизмом', 'Кровать с ящиками', 'Кровать универсальная', 'Кровать двухъярусная'],
+    'Гостиные': ['Стенка для гостиной', 'Комплект мебели для гостиной', 'Горка для гостиной'],
+    'Прихожие': ['Прихожая', 'Прихожая-комплект', 'Тумба с вешалкой', 'Шкаф для обуви'],
+}
+FINISHES = ['Венге', 'Дуб натуральный', 'Дуб темный', 'Ясень белый', 'Ясень серый', 'Вишня светлая',
+            'Вишня темная', 'Ольха горная', 'Бук натуральный', 'Береза белый', 'Сосна белая', 'Орех']
+MODELS = ['Соло', 'Телескоп', 'Книжка', 'Винтаж', 'Модерн', 'Классика', 'Лофт', 'Сканди', 'Прованс', 'Нова']
+
+# Заказы: значения как в форме заказа
+URGENCY = [('обычный', 70, (7, 10)), ('срочный', 22, (3, 5)), ('очень срочно', 8, (1, 2))]
+PAYMENT_METHODS = [('наличные', 45), ('карта', 40), ('перевод', 15)]
+QUANTITIES = [(1, 60), (2, 20), (3, 8), (4, 5), (5, 3), (10, 2), (20, 2)]
+FIRST_NAMES = ['Александр', 'Мария', 'Дмитрий', 'Анна', 'Сергей', 'Елена', 'Андрей', 'Ольга',
+               'Алексей', 'Наталья', 'Михаил', 'Татьяна', 'Иван', 'Ирина', 'Павел', 'Светлана']
+LAST_NAMES = ['Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов',
+              'Новиков', 'Федоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семенов', 'Егоров']
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's',
+    'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ы': 'y',
+    'э': 'e', 'ю': 'yu', 'я': 'ya', 'ь': '', 'ъ': '',
+})
+CITIES = ['Москва', 'Санкт-Петербург', 'Казань', 'Екатеринбург', 'Новосибирск', 'Нижний Новгород',
+          'Самара', 'Ростов-на-Дону', 'Краснодар', 'Воронеж']
+STREETS = ['Ленина', 'Мира', 'Советская', 'Садовая', 'Лесная', 'Центральная', 'Молодежная', 'Школьная']
+NOTES = ['', '', '', '', 'Позвонить за час до доставки', 'Подъем на этаж', 'Нужна сборка', 'Домофон не работает']
+EMAIL_DOMAINS = ['mail.ru', 'yandex.ru', 'gmail.com', 'bk.ru']
+
+
+def _weighted(items):
+    """(значения, накопленные веса) для быстрого rng.choices(..., cum_weights=...)"""
+    values = [item[0] for item in items]
+    return values, list(itertools.accumulate(item[1] for item in items))
+
+def _zipf_cum_weights(n, exponent=1.1):
+    return list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+# ========== Каталог ==========
+def load_template(path=TEMPLATE_CSV):
+    """Распределения из настоящего combined_data.csv (или None, если файла нет)"""
+    if not os.path.exists(path):
+        return None
+    routings = defaultdict(list)
+    prices = defaultdict(list)
+    coefficients = {}
+    materials = defaultdict(int)
+    loss = {}
+    workshops = {}
+    hours = defaultdict(list)
+    with open(path, encoding='utf-8-sig') as file:
+        per_article = defaultdict(list)
+        for row in csv.DictReader(file):
+            per_article[(row['article'], row['product_type'])].append(row['workshop_name'])
+            prices[row['product_type']].append(float(row['minimum_partner_price'] or 0))
+            coefficients[row['product_type']] = float(row['product_type_coefficient'] or 0)
+            materials[row['main_material']] += 1
+            loss[row['main_material']] = float(row['raw_material_loss_percentage'] or 0)
+            workshops[row['workshop_name']] = (row['workshop_type'], int(row['number_of_people_for_production'] or 1))
+            hours[row['workshop_name']].append(float(row['manufacturing_time_hours'] or 0))
+    for (_, product_type), routing in per_article.items():
+        routings[product_type].append(routing)
+    return {
+        'routings': dict(routings),
+        'price_ranges': {t: (min(p), max(p)) for t, p in prices.items()},
+        'coefficients': coefficients,
+        'materials': [(name, loss[name], count) for name, count in materials.items()],
+        'workshops': {name: (kind, people, sum(hours[name]) / len(hours[name]))
+                      for name, (kind, people) in workshops.items()},
+    }
+
+def generate_catalogue(articles, seed=0, template=None):
+    """
+    Генератор строк каталога в порядке столбцов combined_data.csv.
+    На каждый артикул - несколько строк, по одной на цех маршрута.
+    """
+    rng = random.Random(seed)
+    if template is None:
+        template = load_template() or {}
+    coefficients = template.get('coefficients') or PRODUCT_TYPES
+    price_ranges = template.get('price_ranges') or PRICE_RANGES
+    workshops = template.get('workshops') or WORKSHOPS
+    routings = template.get('routings') or {}
+    material_values, material_weights = _weighted(
+        [((name, loss), weight) for name, loss, weight in (template.get('materials') or MATERIALS)])
+    product_types = sorted(coefficients)
+    optional_workshops = sorted(workshops)
+
+    used_articles = set()
+    row_id = 0
+    for n in range(articles):
+        product_type = product_types[n % len(product_types)] if n < len(product_types) else rng.choice(product_types)
+        material, loss = rng.choices(material_values, cum_weights=material_weights)[0]
+        article = rng.randrange(1000000, 9999999)
+        while article in used_articles:
+            article = rng.randrange(1000000, 9999999)
+        used_articles.add(article)
+
+        names = PRODUCT_NAMES.get(product_type) or [product_type]
+        product_name = f"{rng.choice(names)} {rng.choice(MODELS)} {rng.choice(FINISHES)}"
+        low, high = price_ranges.get(product_type, (5000, 100000))
+        # Цена: логарифмически равномерно в диапазоне типа, округление до 10 руб.
+        price = round(low * (high / max(low, 1)) ** rng.random(), -1) if low > 0 else rng.randrange(5000, 100000, 10)
+
+        # Маршрут: реальный маршрут того же типа с небольшими изменениями
+        routing = list(rng.choice(routings[product_type])) if product_type in routings else list(BASE_ROUTING)
+        if rng.random() < 0.3 and len(routing) > 3:
+            routing.pop(rng.randrange(1, len(routing) - 1))
+        if rng.random() < 0.3:
+            extra = rng.choice(optional_workshops)
+            if extra not in routing:
+                routing.insert(rng.randrange(1, len(routing)), extra)
+
+        for workshop_name in routing:
+            workshop_type, people, typical_hours = workshops.get(workshop_name, ('Обработка', 5, 1.0))
+            hours = round(max(0.1, rng.gauss(typical_hours, typical_hours * 0.25)), 1)
+            row_id += 1
+            yield (row_id, product_name, article, product_type, coefficients[product_type],
+                   price, material, loss, workshop_name, workshop_type, people, hours, round(people * hours, 2))
+
+def write_catalogue_csv(path, articles, seed=0):
+    """Пишет каталог в CSV со схемой combined_data.csv, возвращает число строк"""
+    rows = 0
+    with open(path, 'w', encoding='utf-8-sig', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(CATALOGUE_COLUMNS)
+        for row in generate_catalogue(articles, seed):
+            writer.writerow(row)
+            rows += 1
+    return rows
+
+
+# ========== Заказы ==========
+def _customer(index):
+    """Данные покупателя вычисляются из его номера, поэтому не хранятся в памяти"""
+    first = FIRST_NAMES[index % len(FIRST_NAMES)]
+    last = LAST_NAMES[(index // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    if first.endswith('а') or first.endswith('я'):
+        last += 'а'
+    number = (index * 7919 + 12345678) % 10 ** 9
+    phone = f"9{number:09d}"[:10]
+    email = f"{first.lower().translate(TRANSLIT)}.{last.lower().translate(TRANSLIT)}{index}@{EMAIL_DOMAINS[index % len(EMAIL_DOMAINS)]}"
+    city = CITIES[index % len(CITIES)]
+    address = f"г. {city}, ул. {STREETS[index % len(STREETS)]}, д. {index % 150 + 1}, кв. {index % 300 + 1}"
+    return f"{last} {first}", phone, email, address
+
+def _format_phone(digits, style):
+    # Одни и те же покупатели вводят телефон по-разному
+    if style == 0:
+        return f"+7{digits}"
+    if style == 1:
+        return f"8 ({digits[:3]}) {digits[3:6]}-{digits[6:8]}-{digits[8:]}"
+    return f"+7 {digits[:3]} {digits[3:6]} {digits[6:]}"
+
+def load_catalogue_from_db(conn):
+    """(артикул, название, цена) всех товаров каталога"""
+    return conn.execute(
+        "SELECT article, product_name, minimum_partner_price FROM aggregated_products ORDER BY article"
+    ).fetchall()
+
+def generate_orders(catalogue, count, start=None, end=None, seed=0, customers=None, growth=0.5):
+    """
+    Генератор строк заказов (столбцы ORDER_COLUMNS) в хронологическом порядке.
+    catalogue - список (артикул, название, цена); customers - размер базы
+    покупателей (по умолчанию count // 3, часть покупателей возвращается).
+    growth - во сколько раз к концу периода продаж больше, чем в начале, минус 1.
+    """
+    if not catalogue:
+        raise ValueError("Каталог пуст: сначала загрузите товары")
+    rng = random.Random(seed)
+    end = end or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = start or end - timedelta(days=365)
+    days = max(1, (end - start).days)
+    customers = customers or max(1, count // 3)
+
+    # Популярность товаров и покупателей - по Ципфу, порядок товаров перемешан
+    products = list(catalogue)
+    rng.shuffle(products)
+    product_weights = _zipf_cum_weights(len(products))
+    customer_weights = _zipf_cum_weights(min(customers, 100000), exponent=0.8)
+    urgency_values, urgency_weights = _weighted([(u[0], u[1]) for u in URGENCY])
+    lead_days = {u[0]: u[2] for u in URGENCY}
+    payment_values, payment_weights = _weighted(PAYMENT_METHODS)
+    quantity_values, quantity_weights = _weighted(QUANTITIES)
+
+    # Заказы по дням: линейный рост и меньше заказов в выходные
+    day_weights = []
+    for day in range(days):
+        weekday = (start + timedelta(days=day)).weekday()
+        day_weights.append((1 + growth * day / days) * (0.6 if weekday >= 5 else 1.0))
+    scale = count / sum(day_weights)
+
+    produced = 0
+    carry = 0.0
+    for day in range(days):
+        expected = day_weights[day] * scale + carry
+        today = int(expected) if day < days - 1 else count - produced
+        carry = expected - int(expected)
+        day_start = start + timedelta(days=day)
+        # Время заказов внутри дня: с 9 до 21 часа, по возрастанию
+        for seconds in sorted(rng.randrange(9 * 3600, 21 * 3600) for _ in range(today)):
+            order_date = day_start + timedelta(seconds=seconds)
+            article, product_name, price = products[bisect.bisect_left(
+                product_weights, rng.random() * product_weights[-1])]
+            # Топ-100000 покупателей по Ципфу, остальные равномерно
+            if customers > len(customer_weights) and rng.random() < 0.3:
+                customer_index = rng.randrange(customers)
+            else:
+                customer_index = bisect.bisect_left(customer_weights, rng.random() * customer_weights[-1])
+            name, phone, email, address = _customer(customer_index)
+            urgency = rng.choices(urgency_values, cum_weights=urgency_weights)[0]
+            quantity = rng.choices(quantity_values, cum_weights=quantity_weights)[0]
+            low, high = lead_days[urgency]
+            delivery_date = (order_date + timedelta(days=rng.randint(low, high))).date().isoformat()
+            unit_price = price or 0.0
+            yield (article, product_name, name, _format_phone(phone, rng.randrange(3)),
+                   email if rng.random() < 0.8 else '', address, rng.choice(NOTES), urgency,
+                   rng.choices(payment_values, cum_weights=payment_weights)[0], quantity,
+                   unit_price, unit_price * quantity, order_date.isoformat(), delivery_date, 'новый')
+        produced += today
+
+def write_orders_csv(path, catalogue, count, **kwargs):
+    """Пишет поток заказов в CSV, возвращает число строк"""
+    rows = 0
+    with open(path, 'w', encoding='utf-8-sig', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(ORDER_COLUMNS)
+        for row in generate_orders(catalogue, count, **kwargs):
+            writer.writerow(row)
+            rows += 1
+    return rows
+
+def insert_orders(conn, count, batch_size=50000, **kwargs):
+    """Вставляет поток заказов в таблицу orders пачками, возвращает число строк"""
+    catalogue = load_catalogue_from_db(conn)
+    orders = generate_orders(catalogue, count, **kwargs)
+    columns = ', '.join(ORDER_COLUMNS)
+    placeholders = ', '.join('?' * len(ORDER_COLUMNS))
+    inserted = 0
+    while True:
+        batch = list(itertools.islice(orders, batch_size))
+        if not batch:
+            break
+        conn.executemany(f"INSERT INTO orders ({columns}) VALUES ({placeholders})", batch)
+        conn.commit()
+        inserted += len(batch)
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генератор синтетического каталога и заказов')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    cat = sub.add_parser('catalogue', help='Каталог в формате combined_data.csv')
+    cat.add_argument('--articles', type=int, default=1000)
+    cat.add_argument('--csv', required=True)
+    cat.add_argument('--seed', type=int, default=0)
+
+    orders = sub.add_parser('orders', help='Поток заказов')
+    orders.add_argument('--count', type=int, default=100000)
+    orders.add_argument('--db', help='Вставить в таблицу orders этой базы')
+    orders.add_argument('--csv', help='Записать в CSV')
+    orders.add_argument('--catalogue-db', default='furniture_production.db',
+                        help='База, из которой берется каталог для --csv')
+    orders.add_argument('--days', type=int, default=365, help='Период заказов до сегодняшнего дня')
+    orders.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'catalogue':
+        rows = write_catalogue_csv(args.csv, args.articles, args.seed)
+        print(f"Каталог: {args.articles} товаров, {rows} строк -> {args.csv}")
+        return
+
+    end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    options = dict(start=end - timedelta(days=args.days), end=end, seed=args.seed)
+    if args.db:
+        conn = sqlite3.connect(args.db)
+        rows = insert_orders(conn, args.count, **options)
+        conn.close()
+        print(f"Добавлено {rows} заказов в {args.db}")
+    elif args.csv:
+        conn = sqlite3.connect(args.catalogue_db)
+        catalogue = load_catalogue_from_db(conn)
+        conn.close()
+        rows = write_orders_csv(args.csv, catalogue, args.count, **options)
+        print(f"Записано {rows} заказов -> {args.csv}")
+    else:
+        parser.error('укажите --db или --csv')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# events.py
+"""
+Внутрипроцессная шина событий для живой ленты заказов (Server-Sent Events).
+
+Опубликованные события хранятся в кольцевом буфере с возрастающими id,
+поэтому все подписчики читают один и тот же буфер (без очереди на каждого
+клиента), а переподключившийся клиент продолжает с Last-Event-ID.
+Синхронные подписчики (Flask) ждут на threading.Condition, асинхронные
+(asgi.py) - на одном asyncio.Event на цикл событий.
+
+Шина своя в каждом процессе, поэтому id события - "<эпоха процесса>-<номер>".
+Last-Event-ID чужого процесса (другой воркер, перезапуск сервера) не
+читается как позиция в этом буфере: клиент получает reset и перечитывает
+данные. Заказы, созданные в другом воркере, в ленту не попадают - для живой
+ленты нужен один воркер (FURNITURE_WORKERS=1).
+"""
+import asyncio
+import json
+import os
+import threading
+import uuid
+from collections import deque
+
+# Сколько последних событий хранится для возобновления по Last-Event-ID
+HISTORY_SIZE = 1000
+# Интервал отправки комментария-пинга, чтобы прокси не закрывали соединение
+HEARTBEAT_SECONDS = 15
+
+
+class EventBroker:
+    def __init__(self, history_size=HISTORY_SIZE):
+        self._events = deque(maxlen=history_size)
+        self._last_id = 0
+        self._condition = threading.Condition()
+        # asyncio.Event для каждого цикла событий с ожидающими подписчиками
+        self._loop_events = {}
+        self._pid = None
+        self._epoch = None
+
+    @property
+    def epoch(self):
+        """Метка процесса в id событий; после fork - новая"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._epoch = uuid.uuid4().hex[:8]
+        return self._epoch
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, event_type, data):
+        """Публикует событие и будит всех подписчиков, возвращает id события"""
+        with self._condition:
+            self._last_id += 1
+            self._events.append((self._last_id, event_type, data))
+            event_id = self._last_id
+            self._condition.notify_all()
+            loops = list(self._loop_events)
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._wake_loop, loop)
+            except RuntimeError:
+                # Цикл событий уже закрыт
+                self._loop_events.pop(loop, None)
+        return event_id
+
+    def since(self, last_id):
+        """События после last_id; None, если часть событий уже вытеснена из буфера"""
+        with self._condition:
+            if last_id > self._last_id:
+                # id из предыдущего запуска сервера
+                return None
+            if self._events and last_id < self._events[0][0] - 1:
+                return None
+            return [event for event in self._events if event[0] > last_id]
+
+    def wait(self, last_id, timeout=HEARTBEAT_SECONDS):
+        """Блокирующее ожидание новых событий после last_id"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._last_id != last_id, timeout=timeout)
+        return self.since(last_id)
+
+    async def wait_async(self, last_id, timeout=HEARTBEAT_SECONDS):
+        """Асинхронное ожидание новых событий после last_id"""
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            event = self._loop_events.get(loop)
+            if event is None:
+                event = self._loop_events[loop] = asyncio.Event()
+            changed = self._last_id != last_id
+        if not changed:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.since(last_id)
+
+    def _wake_loop(self, loop):
+        # Выполняется внутри цикла событий: будим ждущих и ставим новое событие
+        with self._condition:
+            event = self._loop_events.get(loop)
+            self._loop_events[loop] = asyncio.Event()
+        if event is not None:
+            event.set()
+
+
+def format_sse(event, epoch):
+    """Сериализует событие (id, тип, данные) в формат text/event-stream"""
+    event_id, event_type, data = event
+    return f"id: {epoch}-{event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+def format_reset(epoch, last_id):
+    """Событие для клиента, пропустившего часть ленты: нужно перечитать данные"""
+    return f"id: {epoch}-{last_id}\nevent: reset\ndata: {{}}\n\n"
+
+HEARTBEAT = ": ping\n\n"
+# Last-Event-ID выдан другим процессом: позиция в этом буфере неизвестна
+FOREIGN_ID = -1
+
+def parse_last_event_id(value, epoch):
+    """Номер события этого процесса; FOREIGN_ID - id другого процесса; None - id нет"""
+    if not value:
+        return None
+    value_epoch, _, number = str(value).rpartition('-')
+    if value_epoch != epoch or not number.isdigit():
+        return FOREIGN_ID
+    return int(number)
+
+def stream_events(broker, last_id=None):
+    """Генератор text/event-stream для синхронного сервера (Flask)"""
+    yield "retry: 3000\n\n"
+    if last_id == FOREIGN_ID:
+        last_id = None
+        yield format_reset(broker.epoch, broker.last_id)
+    if last_id is None:
+        last_id = broker.last_id
+    while True:
+        events = broker.wait(last_id)
+        if events is None:
+            last_id = broker.last_id
+            yield format_reset(broker.epoch, last_id)
+        elif not events:
+            yield HEARTBEAT
+        for event in events or ():
+            last_id = event[0]
+            yield format_sse(event, broker.epoch)
+
+async def stream_events_async(broker, last_id=None):
+    """Асинхронный генератор text/event-stream для ASGI-режима"""
+    yield "retry: 3000\n\n"
+    if last_id == FOREIGN_ID:
+        last_id = None
+        yield format_reset(broker.epoch, broker.last_id)
+    if last_id is None:
+        last_id = broker.last_id
+    while True:
+        events = await broker.wait_async(last_id)
+        if events is None:
+            last_id = broker.last_id
+            yield format_reset(broker.epoch, last_id)
+        elif not events:
+            yield HEARTBEAT
+        for event in events or ():
+            last_id = event[0]
+            yield format_sse(event, broker.epoch)
+
+
+# Общая шина событий процесса
+broker = EventBroker()
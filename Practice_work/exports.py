@@ -0,0 +1,394 @@
+# exports.py
+"""
+Полные выгрузки базы данных. Функции с суффиксом _job выполняются
+в фоновых задачах (см. jobs.py) и сообщают о прогрессе через JobContext.
+
+Детализированный Excel-отчет (аналог create_detailed_report из
+Files_work.ipynb) пишется потоковым XLSX-писателем: строки идут из курсора
+SQLite пачками прямо в сжатый XML листа внутри архива, а сводки считаются
+запросами GROUP BY. Память не зависит от количества заказов, а сторонние
+библиотеки (pandas, openpyxl) не нужны.
+
+Замер на синтетической базе:
+    python exports.py --benchmark 1000000
+"""
+import argparse
+import csv
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+try:
+    import resource
+except ImportError:  # только Unix: в Windows замер не показывает память
+    resource = None
+
+import prices
+
+# Размер пачки строк при чтении из курсора
+FETCH_SIZE = 1000
+# Максимум строк данных на листе Excel (1 048 576 минус заголовок)
+MAX_SHEET_ROWS = 1048575
+
+
+def list_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+    return [row[0] for row in cursor.fetchall()]
+
+def export_csv_zip_job(ctx, db_path):
+    """Выгружает все таблицы в ZIP-архив с CSV-файлом на таблицу"""
+    conn = sqlite3.connect(db_path)
+    tables = list_tables(conn)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_path = ctx.result_path(f"database_export_{timestamp}.zip")
+
+    with zipfile.ZipFile(output_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for i, table_name in enumerate(tables):
+            ctx.progress(100 * i / len(tables), f"Таблица {table_name}")
+            cursor = conn.execute(f'SELECT * FROM "{table_name}"')
+            # Пишем построчно прямо в архив, не собирая таблицу в памяти
+            with archive.open(f"{table_name}.csv", 'w') as raw:
+                text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+                writer = csv.writer(text)
+                writer.writerow([column[0] for column in cursor.description])
+                while True:
+                    rows = cursor.fetchmany(FETCH_SIZE)
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+                text.flush()
+                text.detach()
+
+    conn.close()
+    return output_path
+
+
+# ========== Потоковый XLSX-писатель ==========
+_SHEET_HEADER = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                 '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                 '<sheetData>')
+_SHEET_FOOTER = '</sheetData></worksheet>'
+# Управляющие символы, запрещенные в XML
+_XML_ILLEGAL = dict.fromkeys(c for c in range(32) if c not in (9, 10, 13))
+_SHEET_NAME_ILLEGAL = str.maketrans('', '', '[]:*?/\\')
+
+
+def _cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value!r}</v></c>'
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    text = escape(str(value).translate(_XML_ILLEGAL))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+class StreamingXlsxSheet:
+    def __init__(self, stream):
+        self._stream = stream
+
+    def append(self, row):
+        self._stream.write(('<row>' + ''.join(map(_cell, row)) + '</row>').encode('utf-8'))
+
+    def append_rows(self, rows):
+        """Пишет пачку строк одним вызовом"""
+        self._stream.write(''.join(
+            '<row>' + ''.join(map(_cell, row)) + '</row>' for row in rows
+        ).encode('utf-8'))
+
+
+class StreamingXlsxWriter:
+    """
+    Минимальный XLSX-писатель: листы пишутся по очереди прямо в ZIP-архив,
+    в памяти хранится только список имен листов.
+    """
+
+    def __init__(self, path):
+        self._zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1)
+        self._titles = []
+        self._stream = None
+
+    def create_sheet(self, title):
+        self._close_sheet()
+        title = title.translate(_SHEET_NAME_ILLEGAL)[:31] or 'Sheet'
+        base, n = title, 1
+        while title in self._titles:
+            n += 1
+            title = f"{base[:31 - len(str(n)) - 1]}_{n}"
+        self._titles.append(title)
+        self._stream = self._zip.open(f'xl/worksheets/sheet{len(self._titles)}.xml', 'w', force_zip64=True)
+        self._stream.write(_SHEET_HEADER.encode('utf-8'))
+        return StreamingXlsxSheet(self._stream)
+
+    def _close_sheet(self):
+        if self._stream is not None:
+            self._stream.write(_SHEET_FOOTER.encode('utf-8'))
+            self._stream.close()
+            self._stream = None
+
+    def close(self):
+        self._close_sheet()
+        sheets = range(1, len(self._titles) + 1)
+        self._zip.writestr('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + ''.join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+                      'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                      for i in sheets)
+            + '</Types>'))
+        self._zip.writestr('_rels/.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="xl/workbook.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+            '</Relationships>'))
+        self._zip.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + ''.join(f'<sheet name="{escape(title, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>'
+                      for i, title in zip(sheets, self._titles))
+            + '</sheets></workbook>'))
+        self._zip.writestr('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + ''.join(f'<Relationship Id="rId{i}" Target="worksheets/sheet{i}.xml" '
+                      'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+                      for i in sheets)
+            + '</Relationships>'))
+        self._zip.close()
+
+
+# ========== Детализированный Excel-отчет ==========
+def _write_rows(workbook, title, cursor, on_rows=None):
+    """
+    Пишет результат курсора на лист (или несколько листов, если строк больше
+    лимита Excel) пачками по FETCH_SIZE строк. Возвращает число строк.
+    """
+    header = [column[0] for column in cursor.description]
+    sheet = workbook.create_sheet(title)
+    sheet.append(header)
+    in_sheet = 0
+    total = 0
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        while rows:
+            if in_sheet == MAX_SHEET_ROWS:
+                # Продолжение таблицы на следующем листе (имя получит суффикс _2, _3...)
+                sheet = workbook.create_sheet(title)
+                sheet.append(header)
+                in_sheet = 0
+            part, rows = rows[:MAX_SHEET_ROWS - in_sheet], rows[MAX_SHEET_ROWS - in_sheet:]
+            sheet.append_rows(part)
+            in_sheet += len(part)
+            total += len(part)
+        if on_rows is not None:
+            on_rows(total)
+    return total
+
+def _write_product_workshop_matrix(workbook, conn):
+    """Матрица продукт × цех без сводной таблицы в памяти: строка за строкой"""
+    workshops = [row[0] for row in conn.execute(
+        "SELECT DISTINCT workshop_name FROM products ORDER BY workshop_name")]
+    column_index = {name: i for i, name in enumerate(workshops)}
+    sheet = workbook.create_sheet('Матрица_продукт_цех')
+    sheet.append(['product_name'] + workshops)
+
+    current_product, values = None, None
+    for product_name, workshop_name, hours in conn.execute('''
+        SELECT product_name, workshop_name, SUM(manufacturing_time_hours)
+        FROM products GROUP BY product_name, workshop_name ORDER BY product_name
+    '''):
+        if product_name != current_product:
+            if current_product is not None:
+                sheet.append([current_product] + values)
+            current_product, values = product_name, [0] * len(workshops)
+        values[column_index[workshop_name]] = hours
+    if current_product is not None:
+        sheet.append([current_product] + values)
+
+def write_detailed_report_xlsx(db_path, output_path, progress=None):
+    """
+    Детализированный отчет: сводные листы как в ноутбуке, сводки по заказам
+    и по листу на каждую таблицу базы. progress(percent, message) - необязательно.
+    """
+    def report(percent, message):
+        if progress is not None:
+            progress(percent, message)
+
+    conn = sqlite3.connect(db_path)
+    workbook = StreamingXlsxWriter(output_path)
+
+    report(0, 'Сводные листы')
+    stats = conn.execute('''
+        SELECT COUNT(*), COUNT(DISTINCT product_name), COUNT(DISTINCT workshop_name),
+               SUM(manufacturing_time_hours), SUM(total_labor_hours), AVG(minimum_partner_price)
+        FROM products
+    ''').fetchone()
+    avg_time = conn.execute('''
+        SELECT AVG(hours) FROM (SELECT SUM(manufacturing_time_hours) AS hours FROM products GROUP BY product_name)
+    ''').fetchone()[0]
+    orders_count, orders_revenue = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(total_price), 0) FROM orders_all").fetchone()
+    sheet = workbook.create_sheet('Общая_статистика')
+    sheet.append(['Метрика', 'Значение'])
+    for row in [
+        ('Общее количество записей', stats[0]),
+        ('Уникальных продуктов', stats[1]),
+        ('Уникальных цехов', stats[2]),
+        ('Общее время производства (часы)', stats[3]),
+        ('Общие трудозатраты (человеко-часы)', stats[4]),
+        ('Среднее время на продукт (часы)', avg_time),
+        ('Средняя цена продукта', stats[5]),
+        ('Количество заказов', orders_count),
+        ('Выручка по заказам', orders_revenue),
+        ('Дата генерации отчета', datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+    ]:
+        sheet.append(row)
+
+    _write_rows(workbook, 'Продукты_детально', conn.execute('''
+        SELECT product_name, MIN(article) AS article, MIN(product_type) AS product_type,
+               MIN(product_type_coefficient) AS product_type_coefficient,
+               MIN(minimum_partner_price) AS minimum_partner_price, MIN(main_material) AS main_material,
+               MIN(raw_material_loss_percentage) AS raw_material_loss_percentage,
+               SUM(manufacturing_time_hours) AS manufacturing_time_hours,
+               SUM(total_labor_hours) AS total_labor_hours
+        FROM products GROUP BY product_name ORDER BY manufacturing_time_hours DESC
+    '''))
+    _write_rows(workbook, 'Анализ_цехов', conn.execute('''
+        SELECT workshop_name, workshop_type, MIN(number_of_people_for_production) AS number_of_people,
+               SUM(manufacturing_time_hours) AS total_time_sum,
+               AVG(manufacturing_time_hours) AS avg_time_per_record,
+               COUNT(*) AS record_count, SUM(total_labor_hours) AS total_labor_hours
+        FROM products GROUP BY workshop_name, workshop_type ORDER BY total_labor_hours DESC
+    '''))
+    _write_rows(workbook, 'Топ10_продуктов', conn.execute('''
+        SELECT product_name, MIN(product_type) AS product_type,
+               SUM(total_labor_hours) AS total_labor_hours,
+               SUM(manufacturing_time_hours) AS manufacturing_time_hours
+        FROM products GROUP BY product_name ORDER BY total_labor_hours DESC LIMIT 10
+    '''))
+    _write_rows(workbook, 'Время_по_типам_цехов', conn.execute('''
+        SELECT workshop_type, SUM(manufacturing_time_hours) AS manufacturing_time_hours,
+               SUM(total_labor_hours) AS total_labor_hours,
+               COUNT(DISTINCT workshop_name) AS number_of_workshops
+        FROM products GROUP BY workshop_type ORDER BY total_labor_hours DESC
+    '''))
+    _write_product_workshop_matrix(workbook, conn)
+    _write_rows(workbook, 'Сводка_по_материалам', conn.execute('''
+        SELECT main_material, COUNT(DISTINCT product_name) AS number_of_products,
+               SUM(manufacturing_time_hours) AS manufacturing_time_hours,
+               SUM(total_labor_hours) AS total_labor_hours,
+               MIN(raw_material_loss_percentage) AS raw_material_loss_percentage
+        FROM products GROUP BY main_material ORDER BY number_of_products DESC
+    '''))
+
+    report(10, 'Сводки по заказам')
+    _write_rows(workbook, 'Заказы_по_статусам', conn.execute('''
+        SELECT status, COUNT(*) AS orders, SUM(quantity) AS quantity, SUM(total_price) AS revenue
+        FROM orders_all GROUP BY status ORDER BY orders DESC
+    '''))
+    _write_rows(workbook, 'Заказы_по_месяцам', conn.execute('''
+        SELECT substr(order_date, 1, 7) AS month, COUNT(*) AS orders,
+               SUM(quantity) AS quantity, SUM(total_price) AS revenue
+        FROM orders_all GROUP BY month ORDER BY month
+    '''))
+    _write_rows(workbook, 'Выручка_по_товарам', conn.execute('''
+        SELECT product_id AS article, product_name, COUNT(DISTINCT order_id) AS orders,
+               SUM(quantity) AS quantity, SUM(line_total) AS revenue
+        FROM order_lines GROUP BY product_id, product_name ORDER BY revenue DESC
+    '''))
+    # Выручка против прайса на дату заказа (история цен, см. prices.py)
+    sheet = workbook.create_sheet('Выручка_по_прайсу')
+    sheet.append(['month', 'lines', 'revenue', 'list_revenue', 'difference'])
+    for row in prices.revenue_by_month(conn, prices.PriceBook(lambda: sqlite3.connect(db_path))):
+        sheet.append(row)
+
+    # Исходные таблицы: прогресс считается по строкам
+    tables = list_tables(conn)
+    counts = {name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0] for name in tables}
+    total_rows = sum(counts.values()) or 1
+    written = 0
+    for table_name in tables:
+        def on_rows(done, base=written, name=table_name):
+            if done % (FETCH_SIZE * 50) == 0:
+                report(20 + 75 * (base + done) / total_rows, f"Таблица {name}")
+        report(20 + 75 * written / total_rows, f"Таблица {table_name}")
+        _write_rows(workbook, table_name, conn.execute(f'SELECT * FROM "{table_name}"'), on_rows)
+        written += counts[table_name]
+
+    conn.close()
+    report(95, 'Сохранение файла')
+    workbook.close()
+    return output_path
+
+def excel_report_job(ctx, db_path):
+    """Фоновая задача: детализированный Excel-отчет"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_path = ctx.result_path(f"furniture_detailed_report_{timestamp}.xlsx")
+    return write_detailed_report_xlsx(db_path, output_path, progress=ctx.progress)
+
+
+# ========== Замер на синтетических заказах ==========
+def run_benchmark(source_db, orders_count):
+    """Пишет отчет по копии базы с orders_count заказами, печатает время и память"""
+    from data_generator import insert_orders
+    workdir = tempfile.mkdtemp(prefix='xlsx_bench_')
+    try:
+        db_path = os.path.join(workdir, 'bench.db')
+        shutil.copyfile(source_db, db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute("DELETE FROM orders")
+        started = time.perf_counter()
+        insert_orders(conn, orders_count)
+        conn.close()
+        print(f"Сгенерировано {orders_count} заказов за {time.perf_counter() - started:.1f} с")
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+        output_path = os.path.join(workdir, 'report.xlsx')
+        started = time.perf_counter()
+        write_detailed_report_xlsx(db_path, output_path)
+        elapsed = time.perf_counter() - started
+
+        print(f"Отчет: {elapsed:.1f} с, {orders_count / elapsed:,.0f} заказов/с")
+        print(f"Размер файла: {os.path.getsize(output_path) / 1024 / 1024:.1f} MB")
+        if resource is None:
+            print("Пиковая память процесса: недоступно (нет модуля resource)")
+        else:
+            # ru_maxrss в Linux - в килобайтах
+            rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            print(f"Пиковая память процесса: {rss_after / 1024:.0f} MB "
+                  f"(прирост {(rss_after - rss_before) / 1024:.0f} MB)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Выгрузки базы данных')
+    parser.add_argument('--db', default='furniture_production.db')
+    parser.add_argument('--output', help='Путь к Excel-отчету')
+    parser.add_argument('--benchmark', type=int, metavar='ORDERS',
+                        help='Замер отчета на копии базы с указанным количеством заказов')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_benchmark(args.db, args.benchmark)
+    else:
+        output = args.output or f"furniture_detailed_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        write_detailed_report_xlsx(args.db, output)
+        print(f"Детализированный отчет создан: {output}")
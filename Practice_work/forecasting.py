@@ -0,0 +1,322 @@
+# forecasting.py
+"""
+Прогноз недельного спроса по артикулам.
+
+Спрос недели - сумма количества в строках заказов (кроме отменённых) за
+неделю с понедельника. История - FURNITURE_FORECAST_WEEKS полных недель до
+текущей; она собирается одним GROUP BY по горячей таблице и только тем
+секциям, что пересекаются с периодом (partitions.partition_tables).
+
+Модель - экспоненциальное сглаживание с трендом (Холт): уровень и тренд
+пересчитываются неделя за неделей, прогноз на h недель вперед - уровень +
+h × тренд (не меньше нуля). С numpy весь каталог считается одной матрицей
+артикулы × недели: цикл идет по неделям, а не по артикулам, поэтому 100 тыс.
+артикулов - секунды. Без numpy - тот же расчет построчно.
+
+Результат хранится в demand_forecast (все воркеры читают одну таблицу) и
+пересчитывается раз в сутки: при первом запросе нового дня ставится фоновая
+задача kind=forecast, до ее завершения отдается вчерашний прогноз. Пересчет
+заявляется в базе (refreshing_since в forecast_meta, claim_refresh), поэтому
+из нескольких воркеров его запускает один. Для ночного запуска по cron:
+    python forecasting.py refresh --db furniture_production.db
+"""
+import argparse
+import json
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # без numpy прогноз считается построчно (медленнее на больших каталогах)
+    np = None
+
+import partitions
+
+HISTORY_WEEKS = int(os.environ.get('FURNITURE_FORECAST_WEEKS', 52))
+HORIZON = int(os.environ.get('FURNITURE_FORECAST_HORIZON', 8))
+ALPHA = float(os.environ.get('FURNITURE_FORECAST_ALPHA', 0.3))
+BETA = float(os.environ.get('FURNITURE_FORECAST_BETA', 0.1))
+# Отменённые заказы не расходуют материалы
+CANCELLED = 'отменён'
+# Заявка на пересчет старше этого считается брошенной (воркер остановлен)
+CLAIM_TIMEOUT = timedelta(hours=1)
+
+
+def create_forecast_schema(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS demand_forecast (
+        article INTEGER PRIMARY KEY,
+        level REAL NOT NULL,
+        trend REAL NOT NULL,
+        last_week REAL NOT NULL,
+        horizon_total REAL NOT NULL,
+        weekly TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS forecast_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    ''')
+
+
+def week_start(day=None):
+    """Понедельник недели day (по умолчанию - текущей)"""
+    day = day or date.today()
+    return day - timedelta(days=day.weekday())
+
+
+def weekly_demand(cursor, origin, weeks, article=None):
+    """
+    Строки (артикул, номер недели от origin, количество) за weeks полных
+    недель; секции вне периода не читаются.
+    """
+    start = origin.isoformat()
+    end = (origin + timedelta(weeks=weeks)).isoformat()
+    tables = ["orders"] + partitions.partition_tables(cursor, start, end)
+    where = "o.order_date >= ? AND o.order_date < ? AND o.status != ?"
+    values = [start, end, CANCELLED]
+    if article is not None:
+        where += " AND {line}.product_id = ?"
+        values.append(article)
+    selects = []
+    for name in tables:
+        selects.append(f"SELECT o.product_id AS product_id, o.order_date AS order_date, o.quantity AS quantity "
+                       f"FROM {name} o WHERE o.items_count = 1 AND " + where.format(line='o'))
+        selects.append(f"SELECT i.product_id, o.order_date, i.quantity FROM order_items i "
+                       f"JOIN {name} o ON o.id = i.order_id WHERE o.items_count > 1 AND " + where.format(line='i'))
+    cursor.execute(f'''
+        SELECT product_id, CAST((julianday(substr(order_date, 1, 10)) - julianday(?)) / 7 AS INTEGER) AS week,
+               SUM(quantity)
+        FROM ({" UNION ALL ".join(selects)})
+        GROUP BY product_id, week
+    ''', [start] + values * len(selects))
+    return cursor.fetchall()
+
+
+def holt(series, alpha=ALPHA, beta=BETA, horizon=HORIZON):
+    """
+    Сглаживание Холта по строкам матрицы (артикулы × недели).
+    Возвращает (уровень, тренд, прогноз артикулы × horizon).
+    """
+    if np is not None:
+        series = np.asarray(series, dtype=np.float64)
+        level = series[:, 0].copy()
+        trend = np.zeros(len(series))
+        for week in range(1, series.shape[1]):
+            previous = level
+            level = alpha * series[:, week] + (1 - alpha) * (level + trend)
+            trend = beta * (level - previous) + (1 - beta) * trend
+        steps = np.arange(1, horizon + 1)
+        forecast = np.maximum(level[:, None] + trend[:, None] * steps, 0.0)
+        return level, trend, forecast
+
+    levels, trends, forecasts = [], [], []
+    for row in series:
+        level, trend = row[0], 0.0
+        for value in row[1:]:
+            previous = level
+            level = alpha * value + (1 - alpha) * (level + trend)
+            trend = beta * (level - previous) + (1 - beta) * trend
+        levels.append(level)
+        trends.append(trend)
+        forecasts.append([max(level + trend * step, 0.0) for step in range(1, horizon + 1)])
+    return levels, trends, forecasts
+
+
+def refresh(conn, today=None, weeks=HISTORY_WEEKS, horizon=HORIZON, progress=None):
+    """Пересчитывает прогноз всех артикулов каталога и сохраняет его; возвращает сводку"""
+    def report(percent, message):
+        if progress is not None:
+            progress(percent, message)
+
+    cursor = conn.cursor()
+    current = week_start(today)
+    origin = current - timedelta(weeks=weeks)
+    articles = [row[0] for row in cursor.execute("SELECT article FROM aggregated_products ORDER BY article")]
+    index = {article: i for i, article in enumerate(articles)}
+
+    report(10, 'Спрос по неделям')
+    rows = weekly_demand(cursor, origin, weeks)
+    if np is not None:
+        series = np.zeros((len(articles), weeks))
+        known = [(index[article], week, quantity) for article, week, quantity in rows if article in index]
+        if known:
+            cells = np.array(known, dtype=np.float64)
+            series[cells[:, 0].astype(np.intp), cells[:, 1].astype(np.intp)] = cells[:, 2]
+    else:
+        series = [[0.0] * weeks for _ in articles]
+        for article, week, quantity in rows:
+            if article in index:
+                series[index[article]][week] = quantity
+
+    report(50, 'Сглаживание')
+    level, trend, forecast = holt(series, horizon=horizon) if articles else ([], [], [])
+
+    report(80, 'Сохранение')
+    if np is not None and articles:
+        # Списки Python: поэлементный доступ к массивам numpy медленный
+        last_week = series[:, weeks - 1].tolist()
+        totals = forecast.sum(axis=1).round(2).tolist()
+        level, trend, forecast = level.tolist(), trend.tolist(), forecast.round(2).tolist()
+    else:
+        last_week = [row[weeks - 1] for row in series]
+        totals = [round(sum(row), 2) for row in forecast]
+        forecast = [[round(value, 2) for value in row] for row in forecast]
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("DELETE FROM demand_forecast")
+        cursor.executemany(
+            "INSERT INTO demand_forecast (article, level, trend, last_week, horizon_total, weekly) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            zip(articles, level, trend, last_week, totals, map(json.dumps, forecast)))
+        meta = {
+            "week_start": current.isoformat(),
+            "computed_at": datetime.now().isoformat(timespec='seconds'),
+            "history_weeks": str(weeks),
+            "horizon": str(horizon),
+        }
+        cursor.executemany("INSERT OR REPLACE INTO forecast_meta (key, value) VALUES (?, ?)", meta.items())
+        cursor.execute("DELETE FROM forecast_meta WHERE key = 'refreshing_since'")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    report(100, 'Готово')
+    return {"articles": len(articles), "demand_rows": len(rows), **meta}
+
+
+def metadata(cursor):
+    cursor.execute("SELECT key, value FROM forecast_meta")
+    return dict(cursor.fetchall())
+
+
+def is_stale(cursor, today=None):
+    """Прогноз не считался сегодня (ночной пересчет) или отсутствует"""
+    computed_at = metadata(cursor).get('computed_at')
+    return computed_at is None or computed_at[:10] < (today or date.today()).isoformat()
+
+
+def claim_refresh(conn, today=None):
+    """
+    Заявляет пересчет устаревшего прогноза: True - пересчет за этим процессом.
+    Проверка и запись - в одной транзакции BEGIN IMMEDIATE, поэтому из
+    одновременно спросивших воркеров заявку получает один.
+    """
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        claimed = is_stale(cursor, today)
+        since = metadata(cursor).get('refreshing_since')
+        if claimed and since is not None and datetime.fromisoformat(since) > datetime.now() - CLAIM_TIMEOUT:
+            claimed = False
+        if claimed:
+            cursor.execute("INSERT OR REPLACE INTO forecast_meta (key, value) VALUES ('refreshing_since', ?)",
+                           (datetime.now().isoformat(timespec='seconds'),))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return claimed
+
+def release_claim(conn):
+    """Пересчет не удался: заявка снимается, следующий запрос поставит его снова"""
+    conn.execute("DELETE FROM forecast_meta WHERE key = 'refreshing_since'")
+    conn.commit()
+
+
+def forecast_weeks(meta):
+    """Понедельники недель прогноза"""
+    if 'week_start' not in meta:
+        return []
+    start = date.fromisoformat(meta['week_start'])
+    return [(start + timedelta(weeks=step)).isoformat() for step in range(int(meta['horizon']))]
+
+
+def top(cursor, limit=50, q=None):
+    """Артикулы с наибольшим прогнозом на горизонт (для подготовки материалов)"""
+    sql = ('''
+        SELECT f.article, p.product_name, p.main_material, f.last_week, f.level, f.trend,
+               f.horizon_total, f.weekly
+        FROM demand_forecast f JOIN aggregated_products p ON p.article = f.article
+    ''')
+    values = []
+    if q:
+        sql += " WHERE p.product_name LIKE ? OR CAST(f.article AS TEXT) LIKE ?"
+        values += [f"%{q}%", f"{q}%"]
+    cursor.execute(sql + " ORDER BY f.horizon_total DESC, f.article LIMIT ?", values + [limit])
+    names = [column[0] for column in cursor.description]
+    items = []
+    for row in cursor.fetchall():
+        item = dict(zip(names, row))
+        item['weekly'] = json.loads(item['weekly'])
+        items.append(item)
+    return items
+
+
+def article_forecast(cursor, article):
+    """История спроса артикула по неделям и его прогноз; None - прогноза нет"""
+    cursor.execute("SELECT level, trend, last_week, horizon_total, weekly FROM demand_forecast WHERE article = ?",
+                   (article,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    meta = metadata(cursor)
+    weeks = int(meta['history_weeks'])
+    origin = date.fromisoformat(meta['week_start']) - timedelta(weeks=weeks)
+    history = [0.0] * weeks
+    for _, week, quantity in weekly_demand(cursor, origin, weeks, article):
+        history[week] = quantity
+    level, trend, last_week, horizon_total, weekly = row
+    return {
+        "article": article,
+        "level": level,
+        "trend": trend,
+        "last_week": last_week,
+        "horizon_total": horizon_total,
+        "history": [{"week": (origin + timedelta(weeks=week)).isoformat(), "quantity": quantity}
+                    for week, quantity in enumerate(history)],
+        "forecast": [{"week": week, "quantity": quantity}
+                     for week, quantity in zip(forecast_weeks(meta), json.loads(weekly))],
+    }
+
+
+def forecast_job(ctx, db_path):
+    """Фоновая задача: пересчет прогноза, результат - JSON со сводкой"""
+    conn = sqlite3.connect(db_path)
+    try:
+        summary = refresh(conn, progress=ctx.progress)
+    except BaseException:
+        release_claim(conn)
+        raise
+    finally:
+        conn.close()
+    output_path = ctx.result_path("forecast.json")
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump(summary, file, ensure_ascii=False, indent=2)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Прогноз недельного спроса по артикулам')
+    parser.add_argument('command', choices=('refresh', 'top'))
+    parser.add_argument('--db', default=os.environ.get('FURNITURE_DB_PATH', 'furniture_production.db'))
+    parser.add_argument('--weeks', type=int, default=HISTORY_WEEKS)
+    parser.add_argument('--horizon', type=int, default=HORIZON)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db)
+    create_forecast_schema(connection.cursor())
+    connection.commit()
+    if args.command == 'refresh':
+        result = refresh(connection, weeks=args.weeks, horizon=args.horizon,
+                         progress=lambda percent, message: print(f"{percent:5.1f}% {message}"))
+        print(f"Прогноз с недели {result['week_start']}: артикулов {result['articles']}")
+    else:
+        for item in top(connection.cursor(), args.limit):
+            print(f"{item['article']} {item['product_name']}: {item['horizon_total']:.1f} шт. "
+                  f"за {len(item['weekly'])} нед.")
+    connection.close()
@@ -0,0 +1,71 @@
+# idempotency.py
+"""
+Ключи идемпотентности для создания заказов.
+
+Клиент передает заголовок Idempotency-Key (или поле формы idempotency_key),
+ключ сохраняется в orders.idempotency_key под уникальным индексом. Повторная
+отправка с тем же ключом возвращает исходный заказ без второй записи.
+Недавние ключи держатся в памяти процесса (LRU ограниченного размера), чтобы
+повтор обычно отвечал без обращения к базе; уникальный индекс защищает от
+повторов, пришедших в другой воркер или после вытеснения ключа из кэша.
+Уникальный индекс есть только у горячей таблицы: ключи заказов, перенесенных в
+секции (partitions.py), проверяются поиском по orders_all до вставки. Заказы,
+выгруженные в архив, защиты от повтора больше не дают.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+# Сколько последних ключей хранится в памяти
+CACHE_SIZE = int(os.environ.get('FURNITURE_IDEMPOTENCY_CACHE', 10000))
+# Максимальная длина ключа (UUID - 36 символов)
+MAX_KEY_LENGTH = 200
+
+
+class RecentKeys:
+    """Потокобезопасный LRU: ключ -> результат (order_id, customer_id)"""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+def request_key(headers, form):
+    """Ключ из заголовка или поля формы; None - ключ не передан. ValueError - не строка или слишком длинный"""
+    key = headers.get('Idempotency-Key') or form.get('idempotency_key')
+    if key is None:
+        return None
+    if not isinstance(key, str):
+        raise ValueError("Ключ идемпотентности должен быть строкой")
+    key = key.strip()
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"Ключ идемпотентности длиннее {MAX_KEY_LENGTH} символов")
+    return key
+
+
+# Общий кэш ключей процесса
+recent_orders = RecentKeys()
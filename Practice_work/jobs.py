@@ -0,0 +1,206 @@
+# jobs.py
+"""
+Фоновые задачи для тяжелых операций (выгрузки, PDF и Excel отчеты).
+
+Задача ставится в очередь пула (потоков или процессов - настраивается),
+веб-воркер сразу отвечает id задачи, а клиент опрашивает статус и прогресс.
+Результаты хранятся ограниченное время (TTL) и затем удаляются вместе
+с файлами. Отмена: задача в очереди снимается сразу, выполняющаяся -
+при ближайшем сообщении о прогрессе.
+
+Функция задачи принимает первым аргументом JobContext:
+    def my_job(ctx, *args):
+        ctx.progress(50, 'Половина готова')   # бросает JobCancelled после отмены
+        return 'путь/к/файлу'
+Для режима процессов функция должна быть объявлена на уровне модуля.
+Тип задачи, зарегистрированный с shared=True, не ставится повторно: пока
+задача с теми же аргументами в очереди или выполняется, submit возвращает ее.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Режим пула: thread или process
+JOB_EXECUTOR = os.environ.get('FURNITURE_JOB_EXECUTOR', 'thread')
+# Количество одновременно выполняемых задач
+JOB_WORKERS = int(os.environ.get('FURNITURE_JOB_WORKERS', 2))
+# Сколько секунд хранится результат завершенной задачи
+JOB_TTL_SECONDS = float(os.environ.get('FURNITURE_JOB_TTL', 3600))
+# Каталог для файлов-результатов
+JOB_RESULTS_DIR = os.environ.get('FURNITURE_JOB_DIR', 'job_results')
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """Передается в функцию задачи: прогресс и проверка отмены"""
+
+    def __init__(self, job_id, state):
+        self.job_id = job_id
+        # state - dict (потоки) или прокси multiprocessing.Manager (процессы)
+        self._state = state
+
+    def progress(self, percent, message=''):
+        if self._state.get(f'{self.job_id}:cancel'):
+            raise JobCancelled()
+        self._state[self.job_id] = (min(max(int(percent), 0), 100), message)
+
+    def result_path(self, filename):
+        """Путь для файла-результата задачи"""
+        os.makedirs(JOB_RESULTS_DIR, exist_ok=True)
+        return os.path.join(JOB_RESULTS_DIR, f'{self.job_id}_{filename}')
+
+
+def _run_job(func, job_id, state, args):
+    # Выполняется в потоке или дочернем процессе пула
+    ctx = JobContext(job_id, state)
+    ctx.progress(0, 'Выполняется')
+    return func(ctx, *args)
+
+
+class Job:
+    def __init__(self, kind, args=()):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.args = args
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.future = None
+
+    def to_dict(self, state):
+        percent, message = state.get(self.id, (0, ''))
+        if self.status == DONE:
+            percent = 100
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": percent,
+            "message": message,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    def __init__(self, executor=JOB_EXECUTOR, workers=JOB_WORKERS, ttl=JOB_TTL_SECONDS):
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"Неизвестный режим пула задач: {executor}")
+        self.executor_kind = executor
+        self.workers = workers
+        self.ttl = ttl
+        self._handlers = {}
+        self._shared = set()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._state = None
+
+    def register(self, kind, func, shared=False):
+        """Регистрирует функцию задачи под именем kind; shared - одинаковые задачи объединяются"""
+        self._handlers[kind] = func
+        if shared:
+            self._shared.add(kind)
+
+    @property
+    def kinds(self):
+        return sorted(self._handlers)
+
+    def _ensure_executor(self):
+        # Пул создается при первой задаче, чтобы импорт модуля ничего не запускал
+        if self._executor is None:
+            if self.executor_kind == 'process':
+                import multiprocessing
+                self._state = multiprocessing.Manager().dict()
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._state = {}
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+
+    def submit(self, kind, *args):
+        if kind not in self._handlers:
+            raise KeyError(kind)
+        self.evict_expired()
+        job = Job(kind, args)
+        with self._lock:
+            if kind in self._shared:
+                # Дедупликация в родительском процессе: в режиме процессов воркеры не видят друг друга
+                for active in self._jobs.values():
+                    if active.kind == kind and active.args == args and active.finished_at is None:
+                        return active
+            self._ensure_executor()
+            self._jobs[job.id] = job
+            job.future = self._executor.submit(_run_job, self._handlers[kind], job.id, self._state, args)
+        job.future.add_done_callback(lambda future: self._finish(job, future))
+        return job
+
+    def _finish(self, job, future):
+        job.finished_at = time.time()
+        if future.cancelled():
+            job.status = CANCELLED
+            return
+        error = future.exception()
+        if error is None:
+            job.status = DONE
+            job.result = future.result()
+        elif isinstance(error, JobCancelled):
+            job.status = CANCELLED
+        else:
+            job.status = FAILED
+            job.error = str(error)
+
+    def get(self, job_id):
+        self.evict_expired()
+        job = self._jobs.get(job_id)
+        if job is not None and job.status == QUEUED and (job.future.running() or job.id in self._state):
+            job.status = RUNNING
+        return job
+
+    def status(self, job):
+        return job.to_dict(self._state)
+
+    def list(self):
+        self.evict_expired()
+        return [self.status(job) for job in list(self._jobs.values())]
+
+    def cancel(self, job_id):
+        """Отменяет задачу; возвращает False, если она уже завершена"""
+        job = self._jobs.get(job_id)
+        if job is None or job.status in (DONE, FAILED, CANCELLED):
+            return False
+        if not job.future.cancel():
+            # Уже выполняется: задача остановится на следующем progress()
+            self._state[f'{job_id}:cancel'] = True
+        return True
+
+    def evict_expired(self):
+        """Удаляет завершенные задачи старше TTL вместе с их файлами"""
+        now = time.time()
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if job.finished_at is not None and now - job.finished_at > self.ttl]
+            for job in expired:
+                del self._jobs[job.id]
+                self._state.pop(job.id, None)
+                self._state.pop(f'{job.id}:cancel', None)
+        for job in expired:
+            # Удаляем только собственные файлы задач (общий кэш отчетов не трогаем)
+            if isinstance(job.result, str) and os.path.basename(job.result).startswith(job.id):
+                try:
+                    os.remove(job.result)
+                except OSError:
+                    pass
+
+
+# Общий менеджер задач процесса
+job_manager = JobManager()
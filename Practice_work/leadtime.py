@@ -0,0 +1,121 @@
+# leadtime.py
+"""
+Оценка даты отгрузки заказа.
+
+Маршрут изделия - строки products с тем же артикулом: цех, трудоемкость
+единицы (total_labor_hours, чел.-ч) и бригада (number_of_people_for_production).
+Цех за смену выполняет бригада × FURNITURE_SHIFT_HOURS чел.-ч. Заказ проходит
+цеха по очереди и в каждом ждет, пока цех выполнит уже принятые открытые
+заказы (новые и в производстве), поэтому
+
+    рабочих дней = Σ по цехам (очередь цеха + количество × трудоемкость) / мощность цеха
+
+Маршрут артикула запоминается при первом обращении и сбрасывается, когда
+перезагрузка каталога затронула этот артикул; очередь цехов - счетчики workshop_load (workshops.py),
+их снимок обновляется не чаще раза в FURNITURE_BACKLOG_TTL секунд. Оценка
+для известного артикула - это проход по нескольким цехам в памяти, без
+обращения к базе.
+"""
+import math
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+import workshops
+from workshops import SHIFT_HOURS
+
+BACKLOG_TTL = float(os.environ.get('FURNITURE_BACKLOG_TTL', 1))
+
+
+def add_workdays(start, days):
+    """Дата через days рабочих дней (пн-пт) после start"""
+    if days <= 0:
+        return start
+    # С выходного считаем от пятницы; полная неделя - ровно 5 рабочих дней, остаток - по дням
+    current = start - timedelta(days=max(0, start.weekday() - 4))
+    weeks, days = divmod(days, 5)
+    current += timedelta(weeks=weeks)
+    while days > 0:
+        current += timedelta(days=1)
+        if current.weekday() < 5:
+            days -= 1
+    return current
+
+
+class LeadTimeEstimator:
+    def __init__(self, connect, shift_hours=SHIFT_HOURS, backlog_ttl=BACKLOG_TTL):
+        self.connect = connect
+        self.shift_hours = shift_hours
+        self.backlog_ttl = backlog_ttl
+        # артикул -> ((цех, чел.-ч на единицу, мощность цеха за смену), ...)
+        self._routes = {}
+        self._backlog = None
+        self._backlog_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self, articles=None):
+        """Каталог перезагружен: маршруты (все или изменённых артикулов) и очередь читаются заново"""
+        with self._lock:
+            if articles is None:
+                self._routes = {}
+            else:
+                self._routes = {article: route for article, route in self._routes.items()
+                                if article not in articles}
+            self._backlog = None
+
+    def route(self, article):
+        """
+        Маршрут артикула (запоминается); пустой кортеж - артикула нет в каталоге.
+        Промахи не запоминаются: кэш не растет от запросов несуществующих артикулов.
+        """
+        route = self._routes.get(article)
+        if route is None:
+            conn = self.connect()
+            rows = conn.execute(
+                "SELECT workshop_name, total_labor_hours, number_of_people_for_production "
+                "FROM products WHERE article = ? ORDER BY id", (article,)).fetchall()
+            conn.close()
+            route = tuple((workshop, labor_hours or 0.0, max(people or 1, 1) * self.shift_hours)
+                          for workshop, labor_hours, people in rows)
+            if route:
+                self._routes[article] = route
+        return route
+
+    def backlog(self):
+        """Цех -> чел.-ч открытых заказов (снимок не старше backlog_ttl)"""
+        if self._backlog is None or time.monotonic() - self._backlog_at > self.backlog_ttl:
+            with self._lock:
+                if self._backlog is None or time.monotonic() - self._backlog_at > self.backlog_ttl:
+                    conn = self.connect()
+                    self._backlog = workshops.booked_hours(conn.cursor())
+                    conn.close()
+                    self._backlog_at = time.monotonic()
+        return self._backlog
+
+    def estimate(self, lines, today=None):
+        """
+        Оценка для строк [(артикул, количество)]: рабочие дни, дата отгрузки
+        и загрузка цехов маршрута. KeyError - артикула нет в каталоге.
+        """
+        own = {}
+        for article, quantity in lines:
+            route = self.route(article)
+            if not route:
+                raise KeyError(article)
+            for workshop, labor_hours, capacity in route:
+                hours, _ = own.get(workshop, (0.0, capacity))
+                own[workshop] = (hours + labor_hours * quantity, capacity)
+
+        backlog = self.backlog()
+        queue_days = production_days = 0.0
+        for workshop, (hours, capacity) in own.items():
+            queue_days += backlog.get(workshop, 0.0) / capacity
+            production_days += hours / capacity
+        work_days = max(1, math.ceil(queue_days + production_days))
+        return {
+            "work_days": work_days,
+            "queue_days": round(queue_days, 2),
+            "production_days": round(production_days, 2),
+            "ship_date": add_workdays(today or date.today(), work_days).isoformat(),
+        }
@@ -0,0 +1,283 @@
+# metrics.py
+"""
+Метрики производительности в формате Prometheus (эндпоинт /metrics).
+
+Собираются гистограммы задержки по маршрутам, размеров ответов и числа строк,
+а также время выполнения каждого SQL-запроса (через обертку над курсором).
+Включается переменной окружения FURNITURE_METRICS=1. В выключенном
+состоянии хуки запросов не регистрируются и гистограммы не пополняются;
+обертка над курсором остается только ради SQL-трассы профилировщика
+медленных запросов (profiler.py), если он включен.
+"""
+import contextvars
+import os
+import re
+import sqlite3
+import threading
+import time
+
+ENABLED = os.environ.get('FURNITURE_METRICS', '').lower() in ('1', 'true', 'yes')
+
+# Границы корзин гистограмм
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+ROWS_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 100000)
+
+# Число строк, прочитанных из базы в рамках текущего запроса
+_request_rows = contextvars.ContextVar('request_rows', default=None)
+# Список (запрос, мс) для профиля медленного запроса (см. profiler.py)
+_sql_trace = contextvars.ContextVar('sql_trace', default=None)
+# Не больше стольких SQL-запросов в одном профиле
+SQL_TRACE_LIMIT = 200
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (имя метрики, метки) -> Histogram / число
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, labels, value):
+        with self._lock:
+            self._counters[(name, labels)] = value
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        described = set()
+
+        def header(name):
+            if name not in described and name in self._help:
+                kind, text = self._help[name]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+
+        for (name, labels), histogram in histograms:
+            header(name)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+               for key, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+registry = Registry()
+registry.describe('furniture_http_request_duration_seconds', 'histogram', 'Время обработки запроса по маршруту')
+registry.describe('furniture_http_response_size_bytes', 'histogram', 'Размер тела ответа')
+registry.describe('furniture_http_response_rows', 'histogram', 'Строк прочитано из базы за запрос')
+registry.describe('furniture_http_requests_total', 'counter', 'Количество запросов по маршруту и статусу')
+registry.describe('furniture_sql_statement_duration_seconds', 'histogram', 'Время выполнения SQL-запроса')
+registry.describe('furniture_sql_rows_total', 'counter', 'Строк прочитано SQL-запросом')
+
+
+# ========== SQL: обертка над курсором ==========
+_WHITESPACE = re.compile(r'\s+')
+# Литералы: строки в кавычках и числа вне идентификаторов
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+# Секции заказов orders_pYYYYMM (partitions.py) - одна метка на все месяцы
+_PARTITION_TABLE = re.compile(r'\borders_p\d{6}\b')
+# Серии плейсхолдеров (IN-списки) и многострочные VALUES
+_PLACEHOLDER_RUN = re.compile(r'\?(?:\s*,\s*\?)+')
+_VALUES_RUN = re.compile(r'\(\?(?:, \.\.\.)?\)(?:\s*,\s*\(\?(?:, \.\.\.)?\))+')
+
+def normalize_statement(sql):
+    """
+    Отпечаток запроса для метки: литералы заменены на ?, списки плейсхолдеров
+    свернуты, пробелы схлопнуты, не длиннее 200 символов. Запросы, которые
+    отличаются только значениями или длиной IN-списка, попадают в одну метку.
+    """
+    statement = _WHITESPACE.sub(' ', sql).strip()
+    statement = _STRING_LITERAL.sub('?', statement)
+    statement = _NUMBER_LITERAL.sub('?', statement)
+    statement = _PARTITION_TABLE.sub('orders_pYYYYMM', statement)
+    statement = _PLACEHOLDER_RUN.sub('?, ...', statement)
+    statement = _VALUES_RUN.sub('(?, ...), ...', statement)
+    return statement[:200]
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Курсор, который замеряет execute и считает прочитанные строки"""
+    _statement = None
+
+    def execute(self, sql, parameters=()):
+        self._statement = normalize_statement(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observe_statement(self._statement, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._statement = normalize_statement(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observe_statement(self._statement, time.perf_counter() - started)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            _count_rows(self._statement, 1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        _count_rows(self._statement, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        _count_rows(self._statement, len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        _count_rows(self._statement, 1)
+        return row
+
+
+class TimedConnection(sqlite3.Connection):
+    # Connection.execute создает курсор в обход cursor(), поэтому переопределяем и его
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def observe_statement(statement, seconds):
+    trace = _sql_trace.get()
+    if trace is not None and len(trace) < SQL_TRACE_LIMIT:
+        trace.append((statement, seconds * 1000))
+    if ENABLED:
+        registry.observe('furniture_sql_statement_duration_seconds', (('statement', statement),),
+                         seconds, LATENCY_BUCKETS)
+
+def _count_rows(statement, count):
+    if not count:
+        return
+    if ENABLED:
+        registry.inc('furniture_sql_rows_total', (('statement', statement),), count)
+    rows = _request_rows.get()
+    if rows is not None:
+        rows[0] += count
+
+def connect(db_path):
+    """Соединение с замером запросов"""
+    return sqlite3.connect(db_path, factory=TimedConnection)
+
+def start_sql_trace(trace):
+    """Собирать SQL-запросы текущего контекста в список trace"""
+    return _sql_trace.set(trace)
+
+def stop_sql_trace(token):
+    _sql_trace.reset(token)
+
+
+# ========== HTTP: учет запросов ==========
+def start_request():
+    """Начало запроса: возвращает токен для finish_request"""
+    return time.perf_counter(), _request_rows.set([0])
+
+def finish_request(token, route, method, status, size):
+    started, rows_token = token
+    elapsed = time.perf_counter() - started
+    rows = _request_rows.get()[0]
+    _request_rows.reset(rows_token)
+    record_request(route, method, status, elapsed, size, rows)
+
+def record_request(route, method, status, seconds, size, rows):
+    labels = (('route', route), ('method', method))
+    registry.observe('furniture_http_request_duration_seconds', labels, seconds, LATENCY_BUCKETS)
+    if size is not None:
+        registry.observe('furniture_http_response_size_bytes', labels, size, SIZE_BUCKETS)
+    if rows is not None:
+        registry.observe('furniture_http_response_rows', labels, rows, ROWS_BUCKETS)
+    registry.inc('furniture_http_requests_total', labels + (('status', str(status)),))
+
+def count_rows(func, *args):
+    """Вызывает func, возвращает (результат, число прочитанных строк)"""
+    token = _request_rows.set([0])
+    try:
+        result = func(*args)
+        return result, _request_rows.get()[0]
+    finally:
+        _request_rows.reset(token)
+
+def init_app(app):
+    """Регистрирует хуки Flask для учета запросов (только если метрики включены)"""
+    if not ENABLED:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start():
+        g.metrics_token = start_request()
+
+    @app.after_request
+    def _metrics_finish(response):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            # Для потоковых ответов размер заранее неизвестен
+            size = None if response.is_streamed else response.calculate_content_length()
+            finish_request(token, route, request.method, response.status_code, size)
+        return response
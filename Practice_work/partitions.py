@@ -0,0 +1,368 @@
+# partitions.py
+"""
+Помесячное секционирование заказов.
+
+Горячая таблица orders хранит заказы последних месяцев и все открытые заказы,
+поэтому создание заказов, смена статуса, ключи идемпотентности и триггеры
+счетчиков работают только с ней. Завершенные заказы (доставлен/отменён)
+старше FURNITURE_HOT_MONTHS месяцев переносятся в таблицы-секции
+orders_pYYYYMM той же базы - по одной на месяц заказа. Каталог секций
+(order_partitions) хранит число строк и выручку, так что сводка не читает
+старые месяцы. Секции старше FURNITURE_ARCHIVE_AFTER_MONTHS выгружаются в
+сжатые CSV (orders_archive/orders_YYYY-MM.csv.gz, строки корзин этих заказов -
+order_items_YYYY-MM.csv.gz) и удаляются из базы вместе со строками корзин.
+
+Заказы в базе - горячая таблица и секции (orders_all): их считают страницы
+заказов и сводка. Архив в сводке - отдельные числа (archived_rows и
+archived_revenue каталога секций), в общий итог он не входит.
+
+Чтение:
+    orders_all            - представление: горячая таблица + все секции в базе
+    partition_tables()    - секции, пересекающиеся с диапазоном дат (отсечение)
+    fetch_ordered()       - страница "новые сверху" по горячей таблице и нужным
+                            секциям, без сортировки объединения целиком
+
+Обслуживание (перенос и архивация) - фоновая задача kind=partitions или
+    python partitions.py maintain --db furniture_production.db
+"""
+import argparse
+import csv
+import glob
+import gzip
+import json
+import os
+import sqlite3
+from datetime import date, datetime
+
+import replication
+
+HOT_MONTHS = int(os.environ.get('FURNITURE_HOT_MONTHS', 3))
+ARCHIVE_AFTER_MONTHS = int(os.environ.get('FURNITURE_ARCHIVE_AFTER_MONTHS', 24))
+ARCHIVE_DIR = os.environ.get('FURNITURE_ARCHIVE_DIR', 'orders_archive')
+# Только такие заказы покидают горячую таблицу: их статус больше не меняется
+FINAL_STATUSES = ('доставлен', 'отменён')
+_FINAL_SQL = "status IN (" + ", ".join(f"'{status}'" for status in FINAL_STATUSES) + ")"
+FETCH_SIZE = 5000
+
+
+# ========== Месяцы ==========
+def month_of(value):
+    """'2026-03-15T10:00:00' или date -> '2026-03'"""
+    return (value.isoformat() if isinstance(value, date) else value)[:7]
+
+def add_months(month, count):
+    year, number = map(int, month.split('-'))
+    index = year * 12 + number - 1 + count
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+def month_range(month):
+    """Границы месяца для сравнения строк order_date: [начало, начало следующего)"""
+    return f"{month}-01", f"{add_months(month, 1)}-01"
+
+def table_name(month):
+    return 'orders_p' + month.replace('-', '')
+
+
+# ========== Схема ==========
+def create_partition_schema(cursor):
+    """Каталог секций и представления поверх горячей таблицы и секций"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS order_partitions (
+        month TEXT PRIMARY KEY,
+        table_name TEXT,
+        rows INTEGER NOT NULL DEFAULT 0,
+        archived_rows INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        archived_revenue REAL NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP
+    )
+    ''')
+    refresh_views(cursor)
+
+def _order_columns(cursor):
+    cursor.execute("PRAGMA table_info(orders)")
+    return [(row[1], row[2]) for row in cursor.fetchall()]
+
+def _create_partition_table(cursor, month, columns):
+    """Таблица секции с теми же колонками, что у orders (новые колонки добавляются)"""
+    name = table_name(month)
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {name} AS SELECT * FROM orders WHERE 0")
+    cursor.execute(f"PRAGMA table_info({name})")
+    existing = {row[1] for row in cursor.fetchall()}
+    for column, column_type in columns:
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE {name} ADD COLUMN {column} {column_type}")
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{name}_id ON {name} (id)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_date ON {name} (order_date, id)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_customer ON {name} (customer_id, order_date, id)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_idempotency ON {name} (idempotency_key) "
+                   f"WHERE idempotency_key IS NOT NULL")
+    return name
+
+def _create_view(cursor, name, sql):
+    # Пересоздается только при изменении: смена схемы сбрасывает подготовленные запросы
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = ?", (name,))
+    row = cursor.fetchone()
+    statement = f"CREATE VIEW {name} AS {sql}"
+    if row is not None and row[0] == statement:
+        return
+    cursor.execute(f"DROP VIEW IF EXISTS {name}")
+    cursor.execute(statement)
+
+def refresh_views(cursor):
+    """orders_all и order_lines по текущему списку секций"""
+    columns = ", ".join(column for column, _ in _order_columns(cursor))
+    cursor.execute("SELECT table_name FROM order_partitions WHERE table_name IS NOT NULL ORDER BY month")
+    tables = ["orders"] + [row[0] for row in cursor.fetchall()]
+    _create_view(cursor, "orders_all", " UNION ALL ".join(f"SELECT {columns} FROM {name}" for name in tables))
+    # Строки заказов: корзины из order_items, заказы с одним товаром - из шапки
+    _create_view(cursor, "order_lines",
+                 "SELECT order_id, line_no, product_id, product_name, quantity, unit_price, line_total "
+                 "FROM order_items UNION ALL "
+                 "SELECT id, 1, product_id, product_name, quantity, unit_price, total_price "
+                 "FROM orders_all WHERE items_count = 1")
+
+
+# ========== Чтение ==========
+def partition_tables(cursor, date_from=None, date_to=None, before=None):
+    """
+    Таблицы секций (новые месяцы первыми), пересекающиеся с [date_from, date_to].
+    before - дата курсора страницы: более поздние месяцы не нужны.
+    """
+    sql, values = "SELECT month, table_name FROM order_partitions WHERE table_name IS NOT NULL", []
+    if date_from:
+        sql += " AND month >= ?"
+        values.append(month_of(date_from))
+    if date_to:
+        sql += " AND month <= ?"
+        values.append(month_of(date_to))
+    if before:
+        sql += " AND month <= ?"
+        values.append(month_of(before))
+    cursor.execute(sql + " ORDER BY month DESC", values)
+    return [name for _, name in cursor.fetchall()]
+
+def fetch_ordered(cursor, where, values, keyset, limit, date_from=None, date_to=None, hot_only=False):
+    """
+    Первые limit строк по (order_date DESC, id DESC) из горячей таблицы и секций.
+    Секции не пересекаются по месяцам, поэтому они читаются от новых к старым,
+    пока не наберется limit строк; затем результат сливается с горячей таблицей.
+    keyset - (условие, значения, дата курсора) или None.
+    Возвращает (строки, общее количество - только без keyset).
+    """
+    if keyset is not None:
+        where, values = where + [keyset[0]], values + keyset[1]
+    where_sql = (" WHERE " + " AND ".join(where)) if where else ""
+    order_sql = " ORDER BY order_date DESC, id DESC LIMIT ?"
+
+    tables = [] if hot_only else partition_tables(cursor, date_from, date_to, keyset[2] if keyset else None)
+    cursor.execute(f"SELECT * FROM orders{where_sql}{order_sql}", values + [limit])
+    rows = list(cursor.fetchall())
+    cold = []
+    for name in tables:
+        if len(cold) >= limit:
+            break
+        cursor.execute(f"SELECT * FROM {name}{where_sql}{order_sql}", values + [limit - len(cold)])
+        cold += cursor.fetchall()
+    if cold:
+        rows = sorted(rows + cold, key=lambda row: (row['order_date'] or '', row['id']), reverse=True)[:limit]
+
+    total = None
+    if keyset is None:
+        total = 0
+        for name in ["orders"] + tables:
+            cursor.execute(f"SELECT COUNT(*) FROM {name}{where_sql}", values)
+            total += cursor.fetchone()[0]
+    return rows, total
+
+def cold_totals(cursor):
+    """
+    Из каталога секций: (заказов в секциях, их выручка, заказов в архиве,
+    выручка архива)
+    """
+    cursor.execute("SELECT COALESCE(SUM(rows), 0), COALESCE(SUM(revenue), 0), "
+                   "COALESCE(SUM(archived_rows), 0), COALESCE(SUM(archived_revenue), 0) FROM order_partitions")
+    return cursor.fetchone()
+
+def list_partitions(cursor, archive_dir=None):
+    cursor.execute("SELECT month, table_name, rows, archived_rows, revenue, archived_revenue, updated_at "
+                   "FROM order_partitions ORDER BY month DESC")
+    keys = ("month", "table_name", "rows", "archived_rows", "revenue", "archived_revenue", "updated_at")
+    partitions = [dict(zip(keys, row)) for row in cursor.fetchall()]
+    for partition in partitions:
+        partition["archive_files"] = archive_files(partition["month"], archive_dir)
+        partition["archive_item_files"] = archive_files(partition["month"], archive_dir, ITEMS_PREFIX)
+    return partitions
+
+
+# ========== Архив ==========
+# Шапки заказов - orders_YYYY-MM*.csv.gz, строки корзин (order_items) - order_items_YYYY-MM*.csv.gz
+ORDERS_PREFIX = 'orders'
+ITEMS_PREFIX = 'order_items'
+
+def archive_files(month, archive_dir=None, prefix=ORDERS_PREFIX):
+    return sorted(glob.glob(os.path.join(archive_dir or ARCHIVE_DIR, f"{prefix}_{month}*.csv.gz")))
+
+def read_archive(month, archive_dir=None, prefix=ORDERS_PREFIX):
+    """
+    Заказы архивного месяца (или их строки корзин, prefix=ITEMS_PREFIX) из
+    сжатых CSV - словари со строковыми значениями
+    """
+    for path in archive_files(month, archive_dir, prefix):
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as file:
+            yield from csv.DictReader(file)
+
+def _write_csv_gz(cursor, path):
+    """Результат выполненного запроса -> сжатый CSV через временный файл; возвращает число строк"""
+    tmp_path = path + '.tmp'
+    rows = 0
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow([column[0] for column in cursor.description])
+        while True:
+            chunk = cursor.fetchmany(FETCH_SIZE)
+            if not chunk:
+                break
+            writer.writerows(chunk)
+            rows += len(chunk)
+    os.replace(tmp_path, path)
+    return rows
+
+
+# ========== Обслуживание ==========
+def rotate(conn, today=None, hot_months=HOT_MONTHS, progress=None):
+    """
+    Переносит завершенные заказы месяцев старше горячего окна в секции.
+    Каждый месяц - отдельная транзакция. Возвращает {месяц: перенесено строк}.
+    """
+    cursor = conn.cursor()
+    first_hot = add_months(month_of(today or date.today()), -(hot_months - 1))
+    cursor.execute(f"SELECT DISTINCT substr(order_date, 1, 7) FROM orders "
+                   f"WHERE order_date < ? AND {_FINAL_SQL}", (f"{first_hot}-01",))
+    months = sorted(row[0] for row in cursor.fetchall())
+    moved = {}
+    for n, month in enumerate(months):
+        if progress:
+            progress(n * 100 / len(months), f"Перенос {month}")
+        start, end = month_range(month)
+        condition = f"order_date >= ? AND order_date < ? AND {_FINAL_SQL}"
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            columns = _order_columns(cursor)
+            name = _create_partition_table(cursor, month, columns)
+            column_list = ", ".join(column for column, _ in columns)
+            cursor.execute(f"SELECT status, COUNT(*), COALESCE(SUM(total_price), 0) FROM orders "
+                           f"WHERE {condition} GROUP BY status", (start, end))
+            by_status = cursor.fetchall()
+            cursor.execute(f"INSERT INTO {name} ({column_list}) SELECT {column_list} FROM orders WHERE {condition}",
+                           (start, end))
+            cursor.execute(f"DELETE FROM orders WHERE {condition}", (start, end))
+            # Триггер удаления уменьшил счетчики статусов, но заказы никуда не делись
+            cursor.executemany("UPDATE order_status_counts SET count = count + ? WHERE status = ?",
+                               [(count, status) for status, count, _ in by_status])
+            count = sum(row[1] for row in by_status)
+            revenue = sum(row[2] for row in by_status)
+            cursor.execute('''
+                INSERT INTO order_partitions (month, table_name, rows, revenue, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (month) DO UPDATE SET table_name = excluded.table_name, rows = rows + excluded.rows,
+                    revenue = revenue + excluded.revenue, updated_at = excluded.updated_at
+            ''', (month, name, count, revenue, datetime.now().isoformat()))
+            refresh_views(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        moved[month] = count
+    return moved
+
+def archive(conn, today=None, archive_after=ARCHIVE_AFTER_MONTHS, archive_dir=None, progress=None):
+    """
+    Выгружает секции старше archive_after месяцев в сжатые CSV (шапки и
+    строки корзин - отдельными файлами с одним суффиксом) и удаляет из базы
+    их таблицы и строки корзин. Возвращает {месяц: путь к файлу шапок}.
+    """
+    archive_dir = archive_dir or ARCHIVE_DIR
+    cursor = conn.cursor()
+    first_kept = add_months(month_of(today or date.today()), -(archive_after - 1))
+    cursor.execute("SELECT month, table_name FROM order_partitions WHERE table_name IS NOT NULL AND month < ? "
+                   "ORDER BY month", (first_kept,))
+    partitions = cursor.fetchall()
+    written = {}
+    os.makedirs(archive_dir, exist_ok=True)
+    for n, (month, name) in enumerate(partitions):
+        if progress:
+            progress(n * 100 / len(partitions), f"Архивация {month}")
+        # Повторная архивация месяца (поздно завершенные заказы) - в отдельный файл
+        existing = archive_files(month, archive_dir)
+        suffix = f".{len(existing)}" if existing else ""
+        path = os.path.join(archive_dir, f"{ORDERS_PREFIX}_{month}{suffix}.csv.gz")
+        cursor.execute(f"SELECT COALESCE(SUM(total_price), 0) FROM {name}")
+        revenue = cursor.fetchone()[0]
+        cursor.execute(f"SELECT * FROM {name} ORDER BY order_date, id")
+        rows = _write_csv_gz(cursor, path)
+        cursor.execute(f"SELECT i.* FROM order_items i JOIN {name} o ON o.id = i.order_id "
+                       f"ORDER BY i.order_id, i.line_no")
+        _write_csv_gz(cursor, os.path.join(archive_dir, f"{ITEMS_PREFIX}_{month}{suffix}.csv.gz"))
+
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Строки и выручка месяца переходят из базы в архив
+            cursor.execute("UPDATE order_partitions SET table_name = NULL, rows = rows - ?, "
+                           "archived_rows = archived_rows + ?, revenue = revenue - ?, "
+                           "archived_revenue = archived_revenue + ?, updated_at = ? WHERE month = ?",
+                           (rows, rows, revenue, revenue, datetime.now().isoformat(), month))
+            refresh_views(cursor)
+            # Аналитическая копия удалит эти заказы по журналу
+            replication.log_changes(cursor, name)
+            cursor.execute(f"DELETE FROM order_items WHERE order_id IN (SELECT id FROM {name})")
+            cursor.execute(f"DROP TABLE {name}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        written[month] = path
+    return written
+
+def maintain(db_path, today=None, hot_months=HOT_MONTHS, archive_after=ARCHIVE_AFTER_MONTHS,
+             archive_dir=None, progress=None):
+    """Перенос в секции и архивация; возвращает сводку"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        moved = rotate(conn, today, hot_months,
+                       progress=(lambda p, m: progress(p * 0.7, m)) if progress else None)
+        archived = archive(conn, today, archive_after, archive_dir,
+                           progress=(lambda p, m: progress(70 + p * 0.3, m)) if progress else None)
+    finally:
+        conn.close()
+    return {"moved": moved, "archived": archived}
+
+def maintenance_job(ctx, db_path):
+    """Фоновая задача: перенос и архивация, результат - JSON со сводкой"""
+    summary = maintain(db_path, progress=ctx.progress)
+    output_path = ctx.result_path("partitions.json")
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump(summary, file, ensure_ascii=False, indent=2)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Секции и архив заказов')
+    parser.add_argument('command', choices=('maintain', 'list'))
+    parser.add_argument('--db', default=os.environ.get('FURNITURE_DB_PATH', 'furniture_production.db'))
+    parser.add_argument('--hot-months', type=int, default=HOT_MONTHS)
+    parser.add_argument('--archive-after', type=int, default=ARCHIVE_AFTER_MONTHS)
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'maintain':
+        result = maintain(args.db, hot_months=args.hot_months, archive_after=args.archive_after,
+                          archive_dir=args.archive_dir,
+                          progress=lambda percent, message: print(f"{percent:5.1f}% {message}"))
+        print(f"Перенесено в секции: {sum(result['moved'].values())} заказов, "
+              f"месяцев в архиве: {len(result['archived'])}")
+    else:
+        connection = sqlite3.connect(args.db)
+        for item in list_partitions(connection.cursor(), args.archive_dir):
+            print(f"{item['month']}: в базе {item['rows']} (выручка {item['revenue']:.0f}), "
+                  f"в архиве {item['archived_rows']} (выручка {item['archived_revenue']:.0f})")
+        connection.close()
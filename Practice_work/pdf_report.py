@@ -0,0 +1,315 @@
+# pdf_report.py
+"""
+PDF-дашборд по производству (аналог create_dashboard_pdf из Files_work.ipynb),
+построенный по живой базе данных вместо combined_data.csv.
+
+Отрисовка matplotlib занимает секунды и держит GIL, поэтому она выполняется
+в отдельном пуле процессов. Готовые PDF кэшируются на диске с ключом
+"версия каталога + снимок заказов": пока данные не изменились, повторный
+запрос сразу отдает готовый файл.
+"""
+import multiprocessing
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# Каталог для готовых отчетов
+CACHE_DIR = os.environ.get('FURNITURE_REPORT_CACHE_DIR', 'reports_cache')
+# Сколько последних отчетов хранить на диске
+CACHE_KEEP = int(os.environ.get('FURNITURE_REPORT_CACHE_KEEP', 10))
+# Количество процессов для отрисовки
+REPORT_PROCESSES = int(os.environ.get('FURNITURE_REPORT_PROCESSES', 2))
+
+_executor = None
+_pending = {}
+_lock = threading.Lock()
+
+
+def cache_path(snapshot):
+    """Путь к файлу отчета для снимка (версия каталога, число заказов, последний id, последняя смена статуса)"""
+    catalogue_version, orders_count, last_order_id, last_event_id = snapshot
+    name = f"dashboard_{catalogue_version[:16]}_{orders_count}_{last_order_id}_{last_event_id}.pdf"
+    return os.path.join(CACHE_DIR, name)
+
+def get_cached_report(snapshot):
+    path = cache_path(snapshot)
+    return path if os.path.exists(path) else None
+
+def submit_report(db_path, snapshot):
+    """
+    Ставит отрисовку отчета в пул процессов и возвращает Future с путем к файлу.
+    Одновременные запросы одного и того же снимка получают общий Future.
+    """
+    global _executor
+    path = cache_path(snapshot)
+    with _lock:
+        future = _pending.get(path)
+        if future is not None:
+            return future
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=REPORT_PROCESSES)
+        future = _executor.submit(render_dashboard_pdf, db_path, path)
+        _pending[path] = future
+
+    def _done(_):
+        with _lock:
+            _pending.pop(path, None)
+        _evict_old_reports()
+
+    future.add_done_callback(_done)
+    return future
+
+def _evict_old_reports():
+    """Удаляет старые отчеты, оставляя CACHE_KEEP самых свежих"""
+    try:
+        files = [os.path.join(CACHE_DIR, name) for name in os.listdir(CACHE_DIR) if name.endswith('.pdf')]
+    except FileNotFoundError:
+        return
+    files.sort(key=os.path.getmtime, reverse=True)
+    for path in files[CACHE_KEEP:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# ========== Отрисовка (выполняется в дочернем процессе) ==========
+def _shorten(text, length):
+    return text[:length] + '...' if len(text) > length else text
+
+def render_dashboard_pdf(db_path, output_path):
+    """Строит PDF-дашборд по базе данных и атомарно сохраняет его в output_path"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import numpy as np
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    matplotlib.rcParams['font.size'] = 10
+    matplotlib.rcParams['axes.titlesize'] = 12
+    matplotlib.rcParams['axes.labelsize'] = 11
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT COUNT(*), COUNT(DISTINCT product_name), COUNT(DISTINCT workshop_name),
+               COALESCE(SUM(manufacturing_time_hours), 0), COALESCE(SUM(total_labor_hours), 0)
+        FROM products
+    ''')
+    records, products_count, workshops_count, total_time, total_labor = cursor.fetchone()
+
+    cursor.execute('''
+        SELECT product_type, COUNT(DISTINCT product_name) FROM products
+        GROUP BY product_type ORDER BY 2 DESC
+    ''')
+    type_counts = cursor.fetchall()
+
+    cursor.execute('''
+        SELECT product_name, product_type, SUM(manufacturing_time_hours) AS hours,
+               MIN(minimum_partner_price)
+        FROM products GROUP BY product_name, product_type ORDER BY hours DESC
+    ''')
+    product_stats = cursor.fetchall()
+
+    cursor.execute('''
+        SELECT workshop_name, SUM(manufacturing_time_hours) AS hours FROM products
+        GROUP BY workshop_name ORDER BY hours DESC
+    ''')
+    workshop_time = cursor.fetchall()
+
+    cursor.execute('''
+        SELECT workshop_type, SUM(manufacturing_time_hours) AS hours FROM products
+        GROUP BY workshop_type ORDER BY hours DESC
+    ''')
+    workshop_type_time = cursor.fetchall()
+
+    cursor.execute('''
+        SELECT product_name, workshop_name, SUM(manufacturing_time_hours) FROM products
+        GROUP BY product_name, workshop_name
+    ''')
+    matrix_cells = cursor.fetchall()
+
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(total_price), 0) FROM orders_all")
+    orders_count, orders_revenue = cursor.fetchone()
+    cursor.execute('''
+        SELECT p.product_type, COALESCE(SUM(o.line_total), 0), SUM(o.quantity)
+        FROM order_lines o JOIN aggregated_products p ON p.article = o.product_id
+        GROUP BY p.product_type ORDER BY 2 DESC
+    ''')
+    revenue_by_type = cursor.fetchall()
+    cursor.execute("SELECT status, COUNT(*) FROM orders_all GROUP BY status ORDER BY 2 DESC")
+    orders_by_status = cursor.fetchall()
+    conn.close()
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+
+    with PdfPages(tmp_path) as pdf:
+        # Титульная страница
+        fig, ax = plt.subplots(figsize=(11, 8.5))
+        ax.axis('off')
+        ax.text(0.5, 0.7, "Аналитический отчет по производству мебели",
+                fontsize=24, fontweight='bold', ha='center', va='center', transform=ax.transAxes)
+        ax.text(0.5, 0.6, "На основе данных базы производства",
+                fontsize=14, ha='center', va='center', transform=ax.transAxes)
+        info_text = f"Дата генерации: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n"
+        info_text += f"Всего записей: {records}\n"
+        info_text += f"Всего продуктов: {products_count}\n"
+        info_text += f"Всего цехов: {workshops_count}\n"
+        info_text += f"Общее время производства: {total_time:.1f} часов\n"
+        info_text += f"Общие трудозатраты: {total_labor:.1f} человеко-часов\n"
+        info_text += f"Заказов: {orders_count} на сумму {orders_revenue:,.0f} ₽".replace(',', ' ')
+        ax.text(0.5, 0.4, info_text, fontsize=12, ha='center', va='center', transform=ax.transAxes,
+                bbox=dict(boxstyle="round,pad=0.5", facecolor="lightblue", alpha=0.5))
+        pdf.savefig(fig, bbox_inches='tight')
+        plt.close(fig)
+
+        # 1. Распределение продуктов по типам
+        if type_counts:
+            labels = [row[0] for row in type_counts]
+            values = [row[1] for row in type_counts]
+            colors = plt.cm.Set3(np.linspace(0, 1, len(values)))
+            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 7))
+            ax1.pie(values, labels=labels, autopct='%1.1f%%', colors=colors, startangle=90,
+                    textprops={'fontsize': 10})
+            ax1.set_title('Распределение продуктов по типам', fontsize=14, fontweight='bold')
+            bars = ax2.bar(range(len(values)), values, color=colors)
+            ax2.set_xticks(range(len(values)))
+            ax2.set_xticklabels(labels, rotation=45, ha='right')
+            ax2.set_title('Количество продуктов по типам', fontsize=14, fontweight='bold')
+            ax2.set_ylabel('Количество продуктов')
+            for bar in bars:
+                height = bar.get_height()
+                ax2.text(bar.get_x() + bar.get_width() / 2., height + 0.1,
+                         f'{int(height)}', ha='center', va='bottom', fontsize=10)
+            plt.tight_layout()
+            pdf.savefig(fig, bbox_inches='tight')
+            plt.close(fig)
+
+        # 2. Топ-10 продуктов по времени производства и разброс по типам
+        if product_stats:
+            top = product_stats[:10]
+            fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
+            bars = ax1.barh(range(len(top)), [row[2] for row in top])
+            ax1.set_yticks(range(len(top)))
+            ax1.set_yticklabels([_shorten(row[0], 40) for row in top], fontsize=9)
+            ax1.invert_yaxis()
+            ax1.set_xlabel('Общее время производства (часы)')
+            ax1.set_title('Топ-10 продуктов по времени производства', fontsize=14, fontweight='bold')
+            for bar, row in zip(bars, top):
+                ax1.text(row[2] + 0.1, bar.get_y() + bar.get_height() / 2,
+                         f'{row[2]:.1f} ч', ha='left', va='center', fontsize=9)
+
+            types = sorted({row[1] for row in product_stats})
+            data_to_plot = [[row[2] for row in product_stats if row[1] == pt] for pt in types]
+            bp = ax2.boxplot(data_to_plot, patch_artist=True)
+            for patch, color in zip(bp['boxes'], plt.cm.Pastel1(np.linspace(0, 1, len(types)))):
+                patch.set_facecolor(color)
+            ax2.set_xticklabels(types, rotation=45, ha='right')
+            ax2.set_ylabel('Время производства (часы)')
+            ax2.set_title('Распределение времени производства по типам продуктов', fontsize=14, fontweight='bold')
+            ax2.grid(True, alpha=0.3)
+            plt.tight_layout()
+            pdf.savefig(fig, bbox_inches='tight')
+            plt.close(fig)
+
+        # 3. Распределение по цехам
+        if workshop_time:
+            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 7))
+            values = [row[1] for row in workshop_time]
+            bars = ax1.bar(range(len(values)), values,
+                           color=plt.cm.viridis(np.linspace(0, 1, len(values))))
+            ax1.set_xticks(range(len(values)))
+            ax1.set_xticklabels([row[0] for row in workshop_time], rotation=90, ha='center', fontsize=8)
+            ax1.set_ylabel('Общее время производства (часы)')
+            ax1.set_title('Время производства по цехам', fontsize=14, fontweight='bold')
+            for bar, value in zip(bars, values):
+                ax1.text(bar.get_x() + bar.get_width() / 2., bar.get_height() + 0.1,
+                         f'{value:.1f}', ha='center', va='bottom', fontsize=8)
+            ax2.pie([row[1] for row in workshop_type_time], labels=[row[0] for row in workshop_type_time],
+                    autopct='%1.1f%%', startangle=90,
+                    colors=plt.cm.Set2(np.linspace(0, 1, len(workshop_type_time))))
+            ax2.set_title('Распределение времени по типам цехов', fontsize=14, fontweight='bold')
+            plt.tight_layout()
+            pdf.savefig(fig, bbox_inches='tight')
+            plt.close(fig)
+
+        # 4. Стоимость vs время производства
+        if product_stats:
+            fig, ax = plt.subplots(figsize=(12, 8))
+            types = sorted({row[1] for row in product_stats})
+            for i, pt in enumerate(types):
+                subset = [row for row in product_stats if row[1] == pt]
+                ax.scatter([row[2] for row in subset], [row[3] for row in subset], s=100, alpha=0.7,
+                           label=pt, color=plt.cm.tab20(i / len(types)), edgecolors='black', linewidth=0.5)
+            ax.set_xlabel('Общее время производства (часы)')
+            ax.set_ylabel('Минимальная цена партнера (руб)')
+            ax.set_title('Зависимость цены от времени производства', fontsize=14, fontweight='bold')
+            ax.legend(title='Тип продукта', fontsize=9, title_fontsize=10, bbox_to_anchor=(1.05, 1), loc='upper left')
+            ax.grid(True, alpha=0.3)
+            plt.tight_layout()
+            pdf.savefig(fig, bbox_inches='tight')
+            plt.close(fig)
+
+        # 5. Матрица продукт-цех (топ-15 продуктов по времени)
+        if matrix_cells:
+            top_products = [row[0] for row in product_stats[:15]]
+            workshops = sorted({row[1] for row in matrix_cells})
+            index = {name: i for i, name in enumerate(top_products)}
+            columns = {name: i for i, name in enumerate(workshops)}
+            matrix = np.zeros((len(top_products), len(workshops)))
+            for product_name, workshop_name, hours in matrix_cells:
+                if product_name in index:
+                    matrix[index[product_name], columns[workshop_name]] += hours
+            fig, ax = plt.subplots(figsize=(14, 10))
+            im = ax.imshow(matrix, cmap='YlOrRd', aspect='auto')
+            ax.set_xticks(np.arange(len(workshops)))
+            ax.set_yticks(np.arange(len(top_products)))
+            ax.set_xticklabels([_shorten(name, 20) for name in workshops], rotation=90, fontsize=8)
+            ax.set_yticklabels([_shorten(name, 30) for name in top_products], fontsize=8)
+            fig.colorbar(im, ax=ax, label='Время производства (часы)')
+            ax.set_title('Матрица времени производства: продукт × цех', fontsize=14, fontweight='bold')
+            plt.tight_layout()
+            pdf.savefig(fig, bbox_inches='tight')
+            plt.close(fig)
+
+        # 6. Заказы: выручка по типам продуктов и статусы
+        if orders_count:
+            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 7))
+            ax1.bar(range(len(revenue_by_type)), [row[1] for row in revenue_by_type],
+                    color=plt.cm.Set3(np.linspace(0, 1, max(len(revenue_by_type), 1))))
+            ax1.set_xticks(range(len(revenue_by_type)))
+            ax1.set_xticklabels([row[0] for row in revenue_by_type], rotation=45, ha='right')
+            ax1.set_ylabel('Выручка (руб)')
+            ax1.set_title('Выручка по типам продуктов', fontsize=14, fontweight='bold')
+            ax2.pie([row[1] for row in orders_by_status], labels=[row[0] for row in orders_by_status],
+                    autopct='%1.1f%%', startangle=90)
+            ax2.set_title('Заказы по статусам', fontsize=14, fontweight='bold')
+            plt.tight_layout()
+            pdf.savefig(fig, bbox_inches='tight')
+            plt.close(fig)
+
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def pdf_report_job(ctx, db_path, snapshot):
+    """
+    Фоновая задача: PDF-дашборд через общий кэш отчетов. Отрисовка - в пуле
+    процессов submit_report (matplotlib не потокобезопасен), одновременный
+    запрос того же снимка ждет тот же Future. В пуле процессов задач
+    (FURNITURE_JOB_EXECUTOR=process) отчет рисуется прямо в воркере: второй
+    пул внутри него не нужен, а одинаковые задачи объединяет родитель.
+    """
+    path = get_cached_report(snapshot)
+    if path is None:
+        ctx.progress(10, 'Построение диаграмм')
+        if multiprocessing.parent_process() is not None:
+            path = render_dashboard_pdf(db_path, cache_path(snapshot))
+            _evict_old_reports()
+        else:
+            path = submit_report(db_path, snapshot).result()
+    return path
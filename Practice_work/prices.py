@@ -0,0 +1,176 @@
+# prices.py
+"""
+История цен каталога.
+
+minimum_partner_price в products перезаписывается при каждой перезагрузке
+CSV, поэтому цена артикула на дату хранится отдельно: price_history - по
+интервалу [valid_from, valid_to) на каждую цену артикула (valid_to NULL -
+действует сейчас). Интервалы ведет record_prices после загрузки каталога:
+изменившаяся цена закрывает текущий интервал и открывает новый, снятый с
+продажи товар - только закрывает. Первая известная цена артикула действует
+"с начала времен" (BEGINNING): более ранних цен у нас нет, а заказы из
+старой базы и генератора данных должны получить цену.
+
+Цена на дату - PriceBook.price_at: интервалы артикула читаются из базы один
+раз (по индексу) и хранятся в памяти как отсортированные массивы начал, концов
+и цен; поиск - bisect. Ее используют создание заказа (цена строки на дату
+заказа) и отчеты (выручка по прайсу на дату заказа против фактической).
+Даты - строки ISO (как order_date), сравниваются лексикографически.
+"""
+import bisect
+import threading
+from datetime import datetime
+
+BEGINNING = '0001-01-01T00:00:00'
+BATCH_SIZE = 500
+
+
+def create_price_history_schema(cursor):
+    """Таблица интервалов цен; для новой таблицы - начальные цены из каталога"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'price_history'")
+    history_exists = cursor.fetchone() is not None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS price_history (
+        article INTEGER NOT NULL,
+        price REAL,
+        valid_from TEXT NOT NULL,
+        valid_to TEXT
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_price_history_article ON price_history (article, valid_from)")
+    if not history_exists:
+        record_prices(cursor)
+
+
+def _as_text(moment):
+    if moment is None:
+        return datetime.now().isoformat()
+    return moment.isoformat() if hasattr(moment, 'isoformat') else str(moment)
+
+
+def record_prices(cursor, articles=None, at=None):
+    """
+    Сверяет открытые интервалы с ценами aggregated_products (все артикулы или
+    указанные): изменившиеся и снятые закрываются моментом at, для новых цен
+    открывается интервал. Вызывается в транзакции загрузки каталога.
+    """
+    at = _as_text(at)
+    if articles is None:
+        cursor.execute("SELECT article FROM aggregated_products UNION SELECT article FROM price_history "
+                       "WHERE valid_to IS NULL")
+        articles = [row[0] for row in cursor.fetchall()]
+    articles = list(articles)
+    for start in range(0, len(articles), BATCH_SIZE):
+        chunk = articles[start:start + BATCH_SIZE]
+        marks = ', '.join('?' * len(chunk))
+        cursor.execute(f'''
+            UPDATE price_history SET valid_to = ?
+            WHERE valid_to IS NULL AND article IN ({marks})
+              AND price IS NOT (SELECT minimum_partner_price FROM aggregated_products a
+                                WHERE a.article = price_history.article)
+        ''', [at] + chunk)
+        cursor.execute(f'''
+            INSERT INTO price_history (article, price, valid_from, valid_to)
+            SELECT a.article, a.minimum_partner_price,
+                   CASE WHEN EXISTS (SELECT 1 FROM price_history h WHERE h.article = a.article)
+                        THEN ? ELSE '{BEGINNING}' END,
+                   NULL
+            FROM aggregated_products a
+            WHERE a.article IN ({marks})
+              AND NOT EXISTS (SELECT 1 FROM price_history h WHERE h.article = a.article AND h.valid_to IS NULL)
+        ''', [at] + chunk)
+
+
+class PriceBook:
+    def __init__(self, connect):
+        self.connect = connect
+        # артикул -> (начала, концы, цены) по возрастанию начала; только артикулы с историей
+        self._intervals = {}
+        # После preload в кэше вся история: отсутствующий артикул не читается из базы
+        self._complete = False
+        self._lock = threading.Lock()
+
+    def invalidate(self, articles=None):
+        """История изменилась (перезагрузка каталога): все или указанные артикулы читаются заново"""
+        with self._lock:
+            self._complete = False
+            if articles is None:
+                self._intervals = {}
+            else:
+                self._intervals = {article: intervals for article, intervals in self._intervals.items()
+                                   if article not in articles}
+
+    def _load(self, rows):
+        """Строки (артикул, начало, конец, цена), упорядоченные по артикулу и началу -> массивы"""
+        loaded = {}
+        for article, valid_from, valid_to, price in rows:
+            starts, ends, prices = loaded.setdefault(article, ([], [], []))
+            starts.append(valid_from)
+            ends.append(valid_to)
+            prices.append(price)
+        return loaded
+
+    def preload(self):
+        """Вся история одним запросом (для отчетов по многим артикулам)"""
+        conn = self.connect()
+        loaded = self._load(conn.execute(
+            "SELECT article, valid_from, valid_to, price FROM price_history ORDER BY article, valid_from"))
+        conn.close()
+        with self._lock:
+            self._intervals = loaded
+            self._complete = True
+
+    def intervals(self, article):
+        """Интервалы артикула; без истории - пустые (промахи не запоминаются, кэш ограничен каталогом)"""
+        intervals = self._intervals.get(article)
+        if intervals is None:
+            if self._complete:
+                return (), (), ()
+            conn = self.connect()
+            loaded = self._load(conn.execute(
+                "SELECT article, valid_from, valid_to, price FROM price_history "
+                "WHERE article = ? ORDER BY valid_from", (article,)))
+            conn.close()
+            intervals = loaded.get(article)
+            if intervals is None:
+                return (), (), ()
+            self._intervals[article] = intervals
+        return intervals
+
+    def price_at(self, article, moment=None):
+        """Цена артикула на момент (строка ISO или datetime; по умолчанию - сейчас); None - не продавался"""
+        moment = _as_text(moment)
+        starts, ends, prices = self.intervals(article)
+        i = bisect.bisect_right(starts, moment) - 1
+        if i < 0 or (ends[i] is not None and moment >= ends[i]):
+            return None
+        return prices[i]
+
+    def history(self, article):
+        """Интервалы цены артикула для API"""
+        starts, ends, prices = self.intervals(article)
+        return [{"valid_from": None if start == BEGINNING else start, "valid_to": end, "price": price}
+                for start, end, price in zip(starts, ends, prices)]
+
+
+def revenue_by_month(conn, book):
+    """
+    Выручка по месяцам: фактическая (line_total) и по прайсу на дату заказа
+    (количество × цена на order_date). Строки - (месяц, строк, выручка,
+    по прайсу, отклонение).
+    """
+    book.preload()
+    months = {}
+    for article, quantity, line_total, order_date in conn.execute('''
+        SELECT product_id, quantity, total_price, order_date FROM orders_all WHERE items_count = 1
+        UNION ALL
+        SELECT i.product_id, i.quantity, i.line_total, o.order_date
+        FROM order_items i JOIN orders_all o ON o.id = i.order_id
+    '''):
+        month = (order_date or '')[:7]
+        lines, revenue, list_revenue = months.get(month, (0, 0.0, 0.0))
+        price = book.price_at(article, order_date)
+        months[month] = (lines + 1, revenue + (line_total or 0.0),
+                         list_revenue + (price or 0.0) * (quantity or 0))
+    return [(month, lines, round(revenue, 2), round(list_revenue, 2), round(revenue - list_revenue, 2))
+            for month, (lines, revenue, list_revenue) in sorted(months.items())]
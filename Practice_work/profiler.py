@@ -0,0 +1,211 @@
+# profiler.py
+"""
+Профилирование медленных запросов в production.
+
+Фоновый поток раз в несколько миллисекунд снимает стеки потоков, которые
+сейчас обрабатывают запросы (sys._current_frames), - это сэмплирующий
+профилировщик без cProfile, поэтому быстрые запросы почти ничего не платят.
+Если запрос выполнялся дольше порога, его стеки, маршрут, параметры и
+список SQL-запросов с временем сохраняются в кольцевой буфер. Буфер
+доступен по адресу /admin/profiles.
+
+Настройки через переменные окружения:
+    FURNITURE_PROFILE=1                 - включить профилирование (по умолчанию
+                                          выключено: замер SQL оборачивает каждое
+                                          соединение и заметно замедляет запросы)
+    FURNITURE_SLOW_REQUEST_MS=1000      - порог медленного запроса
+    FURNITURE_PROFILE_INTERVAL_MS=5     - интервал снятия стеков
+    FURNITURE_PROFILE_BUFFER=50         - сколько профилей хранить
+"""
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+import metrics
+
+ENABLED = os.environ.get('FURNITURE_PROFILE', '').lower() in ('1', 'true', 'yes')
+THRESHOLD_MS = float(os.environ.get('FURNITURE_SLOW_REQUEST_MS', 1000))
+SAMPLE_INTERVAL = float(os.environ.get('FURNITURE_PROFILE_INTERVAL_MS', 5)) / 1000
+BUFFER_SIZE = int(os.environ.get('FURNITURE_PROFILE_BUFFER', 50))
+# Глубина стека и количество стеков/функций в сохраненном профиле
+MAX_STACK_DEPTH = 40
+TOP_STACKS = 20
+TOP_FUNCTIONS = 15
+
+
+class _ActiveRequest:
+    def __init__(self, route, method, params):
+        self.route = route
+        self.method = method
+        self.params = params
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.thread_name = threading.current_thread().name
+        self.samples = Counter()
+        self.sql = []
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}"
+
+def _stack(frame):
+    """Стек от корня к листу в виде кортежа строк 'файл:строка функция'"""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels)
+
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms=THRESHOLD_MS, interval=SAMPLE_INTERVAL, buffer_size=BUFFER_SIZE):
+        self.threshold_ms = threshold_ms
+        self.interval = interval
+        self._active = {}  # id потока -> _ActiveRequest
+        self._profiles = deque(maxlen=buffer_size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._has_active = threading.Event()
+        self._thread = None
+
+    # ----- сэмплирование -----
+    def _ensure_sampler(self):
+        # Поток запускается при первом запросе, чтобы импорт модуля ничего не запускал
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._sample_loop, name='profiler', daemon=True)
+                    self._thread.start()
+
+    def _sample_loop(self):
+        while True:
+            # Без активных запросов поток спит и не тратит процессор
+            self._has_active.wait()
+            time.sleep(self.interval)
+            # Под блокировкой: завершившийся запрос не должен меняться во время сохранения
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, request in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        request.samples[_stack(frame)] += 1
+                del frames
+
+    # ----- учет запросов -----
+    def start_request(self, route, method, params=None):
+        """Начало запроса в текущем потоке: возвращает токен для finish_request"""
+        self._ensure_sampler()
+        request = _ActiveRequest(route, method, dict(params or {}))
+        with self._lock:
+            self._active[threading.get_ident()] = request
+            self._has_active.set()
+        return request, metrics.start_sql_trace(request.sql)
+
+    def finish_request(self, token, status):
+        request, trace_token = token
+        metrics.stop_sql_trace(trace_token)
+        elapsed_ms = (time.perf_counter() - request.started) * 1000
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+            if not self._active:
+                self._has_active.clear()
+        if elapsed_ms >= self.threshold_ms:
+            self._store(request, status, elapsed_ms)
+        return elapsed_ms
+
+    def call(self, route, method, params, func, *args):
+        """Выполняет func как отдельный запрос (для асинхронных маршрутов в пуле потоков)"""
+        token = self.start_request(route, method, params)
+        status = 500
+        try:
+            result = func(*args)
+            status = 200
+            return result
+        finally:
+            self.finish_request(token, status)
+
+    def _store(self, request, status, elapsed_ms):
+        functions = Counter()
+        for stack, count in request.samples.items():
+            if stack:
+                functions[stack[-1]] += count
+        profile = {
+            "id": next(self._ids),
+            "route": request.route,
+            "method": request.method,
+            "params": request.params,
+            "status": status,
+            "duration_ms": round(elapsed_ms, 1),
+            "started_at": request.started_at,
+            "thread": request.thread_name,
+            "sample_interval_ms": self.interval * 1000,
+            "samples": sum(request.samples.values()),
+            "sql_count": len(request.sql),
+            "sql_total_ms": round(sum(ms for _, ms in request.sql), 2),
+            "sql": [{"statement": statement, "ms": round(ms, 2)} for statement, ms in request.sql],
+            "hot_functions": [{"function": name, "samples": count}
+                              for name, count in functions.most_common(TOP_FUNCTIONS)],
+            "stacks": [{"samples": count, "stack": list(stack)}
+                       for stack, count in request.samples.most_common(TOP_STACKS)],
+        }
+        with self._lock:
+            self._profiles.append(profile)
+        print(f"Медленный запрос {request.method} {request.route}: {elapsed_ms:.0f} мс, профиль #{profile['id']}")
+
+    # ----- просмотр -----
+    def list(self):
+        """Краткие сведения о сохраненных профилях, новые первыми"""
+        summary_keys = ("id", "route", "method", "params", "status", "duration_ms",
+                        "started_at", "samples", "sql_count", "sql_total_ms")
+        with self._lock:
+            profiles = list(self._profiles)
+        return [{key: profile[key] for key in summary_keys} for profile in reversed(profiles)]
+
+    def get(self, profile_id):
+        with self._lock:
+            for profile in self._profiles:
+                if profile["id"] == profile_id:
+                    return profile
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+def collapsed_stacks(profile):
+    """Профиль в формате collapsed stacks (для flamegraph.pl / speedscope)"""
+    return "".join(f"{';'.join(item['stack'])} {item['samples']}\n" for item in profile["stacks"])
+
+
+# Общий профилировщик процесса
+slow_requests = SlowRequestProfiler()
+
+def init_app(app):
+    """Регистрирует хуки Flask для профилирования (если не выключено)"""
+    if not ENABLED:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _profile_start():
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        g.profile_token = slow_requests.start_request(route, request.method, request.args.to_dict())
+
+    @app.after_request
+    def _profile_status(response):
+        g.profile_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _profile_finish(error=None):
+        token = g.pop('profile_token', None)
+        if token is not None:
+            slow_requests.finish_request(token, g.pop('profile_status', 500))
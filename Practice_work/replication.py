@@ -0,0 +1,353 @@
+# replication.py
+"""
+Аналитическая копия базы для отчетов.
+
+Если задан FURNITURE_ANALYTICS_DB, триггеры на orders пишут id измененных
+заказов в журнал order_changes основной базы, а фоновый поток читает журнал
+и переносит зафиксированные изменения в отдельный файл SQLite. Отчеты,
+сводка и выгрузки читают копию, поэтому тяжелые запросы не держат блокировки
+основной базы, а основная база хранит только короткий хвост журнала
+(применённые записи удаляются).
+
+Копия повторяет orders_all основной базы: заказы секций старых месяцев
+(partitions.py) в ней в общей таблице orders, выгруженные в архив - удаляются
+(архивация пишет их id в журнал, удаление таблицы секции триггеры не видят).
+Каталог секций order_partitions копируется на каждом шаге: строки и выручка
+секций в копии нулевые (их заказы уже в orders), архивные - как в основной
+базе, поэтому сводка по копии и по основной базе совпадает. Каталог
+(products, aggregated_products) копируется целиком при смене версии.
+
+Отставание копии - метрики furniture_replication_lag_seconds и
+furniture_replication_lag_changes, а также GET /api/replication.
+
+    FURNITURE_ANALYTICS_DB=analytics.db          - включить копию
+    FURNITURE_REPLICATION_INTERVAL_MS=200        - период опроса журнала
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import metrics
+
+ANALYTICS_DB = os.environ.get('FURNITURE_ANALYTICS_DB') or None
+ENABLED = ANALYTICS_DB is not None
+INTERVAL = float(os.environ.get('FURNITURE_REPLICATION_INTERVAL_MS', 200)) / 1000
+BATCH_SIZE = 5000
+# Ограничение числа параметров в одном IN (...)
+CHUNK_SIZE = 500
+CATALOGUE_TABLES = ('products', 'aggregated_products', 'catalogue_meta', 'price_history')
+# Текущее время в секундах Unix с долями (unixepoch('subsec') появился только в SQLite 3.42)
+_NOW_SQL = "((julianday('now') - 2440587.5) * 86400.0)"
+
+metrics.registry.describe('furniture_replication_lag_seconds', 'gauge',
+                          'Возраст самого старого непримененного изменения')
+metrics.registry.describe('furniture_replication_lag_changes', 'gauge',
+                          'Непримененных записей журнала изменений')
+
+
+# ========== Журнал изменений в основной базе ==========
+def create_changelog_schema(cursor, enabled=ENABLED):
+    """
+    Журнал order_changes и триггеры на orders. Без копии триггеры удаляются,
+    чтобы вставка заказа не платила за журнал; при повторном включении
+    меняется эпоха журнала и копия пересобирается целиком.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS order_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id INTEGER NOT NULL,
+        changed_at REAL NOT NULL
+    )
+    ''')
+    triggers = {
+        'trg_orders_changelog_insert': "AFTER INSERT ON orders BEGIN "
+            f"INSERT INTO order_changes (order_id, changed_at) VALUES (NEW.id, {_NOW_SQL}); END",
+        'trg_orders_changelog_update': "AFTER UPDATE ON orders BEGIN "
+            f"INSERT INTO order_changes (order_id, changed_at) VALUES (NEW.id, {_NOW_SQL}); END",
+        'trg_orders_changelog_delete': "AFTER DELETE ON orders BEGIN "
+            f"INSERT INTO order_changes (order_id, changed_at) VALUES (OLD.id, {_NOW_SQL}); END",
+    }
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_orders_changelog_%'")
+    existing = {row[0] for row in cursor.fetchall()}
+    if not enabled:
+        for name in existing:
+            cursor.execute(f"DROP TRIGGER {name}")
+        return
+    if existing == set(triggers):
+        return
+    for name, body in triggers.items():
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+    # Пока триггеров не было, изменения не записывались: копия должна пересобраться
+    cursor.execute("INSERT INTO catalogue_meta (key, value) VALUES ('changelog_epoch', ?) "
+                   "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (uuid.uuid4().hex,))
+
+
+def log_changes(cursor, table):
+    """
+    Пишет в журнал id всех заказов таблицы table - для изменений в обход
+    триггеров orders (удаление секции при архивации). Без копии журнал не ведется.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_orders_changelog_delete'")
+    if cursor.fetchone() is None:
+        return
+    cursor.execute(f"INSERT INTO order_changes (order_id, changed_at) SELECT id, {_NOW_SQL} FROM {table}")
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def _columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [(row[1], row[2]) for row in cursor.fetchall()]
+
+
+# ========== Копия ==========
+class Replicator:
+    def __init__(self, primary_path, replica_path, interval=INTERVAL):
+        self.primary_path = primary_path
+        self.replica_path = replica_path
+        self.interval = interval
+        self.ready = False
+        self.applied_seq = 0
+        self.lag = None
+        self.last_error = None
+        # Что уже есть в копии: эпоха журнала и версия каталога
+        self._epoch = None
+        self._catalogue_version = None
+        self._schema_ready = False
+        self._thread = None
+        self._stop = threading.Event()
+
+    # ----- фоновый поток -----
+    def start(self):
+        # После fork (gunicorn --preload) поток родителя в воркере не работает - запускаем свой
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='replication', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                # Пока журнал не разобран, следующий шаг - сразу
+                busy = self.sync_once()
+                self.last_error = None
+            except sqlite3.Error as e:
+                # База занята или схема меняется - повторим на следующем шаге
+                self.last_error = str(e)
+                busy = False
+            if not busy:
+                self._stop.wait(self.interval)
+
+    # ----- один шаг -----
+    def sync_once(self):
+        """Применяет очередную порцию журнала; True - в журнале остались записи"""
+        primary = sqlite3.connect(self.primary_path)
+        try:
+            pcur = primary.cursor()
+            epoch = self._meta(pcur, 'changelog_epoch')
+            version = self._meta(pcur, 'version') or 'none'
+            pcur.execute("SELECT 1 FROM order_changes WHERE seq > ? LIMIT 1", (self.applied_seq,))
+            idle = (self.ready and pcur.fetchone() is None
+                    and epoch == self._epoch and version == self._catalogue_version)
+            more = False
+            if not idle:
+                # Копию могут вести несколько воркеров: запись в нее - под блокировкой
+                replica = sqlite3.connect(self.replica_path, isolation_level=None)
+                try:
+                    more = self._sync_replica(pcur, replica.cursor(), epoch, version)
+                finally:
+                    replica.close()
+                # Примененное больше не нужно основной базе
+                pcur.execute("DELETE FROM order_changes WHERE seq <= ?", (self.applied_seq,))
+                primary.commit()
+            self._report_lag(pcur)
+            return more
+        finally:
+            primary.close()
+
+    def _sync_replica(self, pcur, rcur, epoch, version):
+        if not self._schema_ready:
+            # Читатели отчетов не ждут, пока идет применение пачки
+            rcur.execute("PRAGMA journal_mode=WAL")
+        rcur.execute("BEGIN IMMEDIATE")
+        try:
+            if not self._schema_ready:
+                self._ensure_schema(pcur, rcur)
+            if self._state(rcur, 'catalogue_version') != version or not self._schema_ready and any(
+                    rcur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                 (table,)).fetchone() is None for table in CATALOGUE_TABLES):
+                # Новая версия каталога или таблица каталога, которой в копии еще нет
+                self._sync_catalogue(pcur, rcur, version)
+            if self._state(rcur, 'epoch') != epoch:
+                self._full_copy(pcur, rcur, epoch)
+                more = True
+            else:
+                more = self._apply_changes(pcur, rcur)
+            self._sync_partitions(pcur, rcur)
+            self.applied_seq = int(self._state(rcur, 'applied_seq') or 0)
+            rcur.execute("COMMIT")
+        except Exception:
+            rcur.execute("ROLLBACK")
+            raise
+        self._schema_ready = True
+        self._epoch, self._catalogue_version = epoch, version
+        self.ready = True
+        return more
+
+    def _ensure_schema(self, pcur, rcur):
+        rcur.execute("CREATE TABLE IF NOT EXISTS replication_state (key TEXT PRIMARY KEY, value TEXT)")
+        for table, key, key_definition in (('orders', 'id', 'id INTEGER PRIMARY KEY'),
+                                           ('order_items', None, None),
+                                           ('order_partitions', 'month', 'month TEXT PRIMARY KEY')):
+            columns = [(name, kind) for name, kind in _columns(pcur, table) if name != key]
+            if key:
+                definition = ", ".join([key_definition] + [f"{name} {kind}" for name, kind in columns])
+            else:
+                definition = ", ".join(f"{name} {kind}" for name, kind in columns)
+            rcur.execute(f"CREATE TABLE IF NOT EXISTS {table} ({definition})")
+            existing = {name for name, _ in _columns(rcur, table)}
+            for name, kind in columns:
+                if name not in existing:
+                    rcur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {kind}")
+        rcur.execute("CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)")
+        rcur.execute("CREATE INDEX IF NOT EXISTS idx_orders_date_id ON orders (order_date, id)")
+        rcur.execute("CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)")
+        # Те же имена, что в основной базе, чтобы отчеты работали без изменений;
+        # в копии все заказы в одной таблице, секций нет
+        rcur.execute("CREATE VIEW IF NOT EXISTS orders_all AS SELECT * FROM orders")
+        rcur.execute("CREATE VIEW IF NOT EXISTS order_lines AS "
+                     "SELECT order_id, line_no, product_id, product_name, quantity, unit_price, line_total "
+                     "FROM order_items UNION ALL "
+                     "SELECT id, 1, product_id, product_name, quantity, unit_price, total_price "
+                     "FROM orders WHERE items_count = 1")
+
+    def _meta(self, pcur, key):
+        pcur.execute("SELECT value FROM catalogue_meta WHERE key = ?", (key,))
+        row = pcur.fetchone()
+        return row[0] if row else None
+
+    def _state(self, rcur, key):
+        rcur.execute("SELECT value FROM replication_state WHERE key = ?", (key,))
+        row = rcur.fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, rcur, **values):
+        rcur.executemany("INSERT INTO replication_state (key, value) VALUES (?, ?) "
+                         "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                         [(key, str(value)) for key, value in values.items()])
+
+    def _sync_catalogue(self, pcur, rcur, version):
+        """Каталог небольшой: при смене версии копируется целиком"""
+        for table in CATALOGUE_TABLES:
+            pcur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+            rcur.execute(f"DROP TABLE IF EXISTS {table}")
+            rcur.execute(pcur.fetchone()[0])
+            pcur.execute(f"SELECT * FROM {table}")
+            rows = pcur.fetchall()
+            if rows:
+                rcur.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(rows[0]))})", rows)
+        self._set_state(rcur, catalogue_version=version)
+
+    def _sync_partitions(self, pcur, rcur):
+        """
+        Каталог секций (месяцы - строки): таблиц секций в копии нет, их заказы
+        в orders, поэтому строки и выручка секций обнуляются, архив - как есть
+        """
+        pcur.execute("SELECT month, archived_rows, archived_revenue, updated_at FROM order_partitions")
+        rows = pcur.fetchall()
+        rcur.execute("DELETE FROM order_partitions")
+        rcur.executemany("INSERT INTO order_partitions (month, table_name, rows, archived_rows, revenue, "
+                         "archived_revenue, updated_at) VALUES (?, NULL, 0, ?, 0, ?, ?)", rows)
+
+    def _copy_orders(self, pcur, rcur, order_ids=None):
+        """Текущие версии заказов (все или order_ids) из основной базы в копию"""
+        columns = ", ".join(name for name, _ in _columns(pcur, 'orders'))
+        item_columns = ", ".join(name for name, _ in _columns(pcur, 'order_items'))
+        if order_ids is None:
+            rcur.execute("DELETE FROM orders")
+            rcur.execute("DELETE FROM order_items")
+            batches = [(f"SELECT {columns} FROM orders_all", [],
+                        f"SELECT {item_columns} FROM order_items", [])]
+        else:
+            batches = []
+            for chunk in _chunks(order_ids):
+                marks = ", ".join('?' * len(chunk))
+                rcur.execute(f"DELETE FROM orders WHERE id IN ({marks})", chunk)
+                rcur.execute(f"DELETE FROM order_items WHERE order_id IN ({marks})", chunk)
+                batches.append((f"SELECT {columns} FROM orders_all WHERE id IN ({marks})", chunk,
+                                f"SELECT {item_columns} FROM order_items WHERE order_id IN ({marks})", chunk))
+        for orders_sql, orders_args, items_sql, items_args in batches:
+            for sql, args, table, names in ((orders_sql, orders_args, 'orders', columns),
+                                            (items_sql, items_args, 'order_items', item_columns)):
+                pcur.execute(sql, args)
+                marks = ", ".join('?' * len(names.split(', ')))
+                while True:
+                    rows = pcur.fetchmany(BATCH_SIZE)
+                    if not rows:
+                        break
+                    rcur.executemany(f"INSERT INTO {table} ({names}) VALUES ({marks})", rows)
+
+    def _full_copy(self, pcur, rcur, epoch):
+        """Первичная (или после смены эпохи) копия всех заказов, которые есть в основной базе"""
+        pcur.execute("SELECT COALESCE(MAX(seq), 0) FROM order_changes")
+        start_seq = pcur.fetchone()[0]
+        self._copy_orders(pcur, rcur)
+        # Изменения после start_seq применятся повторно - это безопасно
+        self._set_state(rcur, epoch=epoch, applied_seq=start_seq, applied_at=time.time())
+
+    def _apply_changes(self, pcur, rcur):
+        applied = int(self._state(rcur, 'applied_seq') or 0)
+        pcur.execute("SELECT seq, order_id FROM order_changes WHERE seq > ? ORDER BY seq LIMIT ?",
+                     (applied, BATCH_SIZE))
+        changes = pcur.fetchall()
+        if not changes:
+            return False
+        # Строка заказа берется текущей: несколько изменений одного заказа - одна запись
+        order_ids = sorted({order_id for _, order_id in changes})
+        self._copy_orders(pcur, rcur, order_ids)
+        self._set_state(rcur, applied_seq=changes[-1][0], applied_at=time.time())
+        return len(changes) == BATCH_SIZE
+
+    def _report_lag(self, pcur):
+        pcur.execute("SELECT COUNT(*), MIN(changed_at) FROM order_changes WHERE seq > ?", (self.applied_seq,))
+        pending, oldest = pcur.fetchone()
+        lag_seconds = max(0.0, time.time() - oldest) if oldest is not None else 0.0
+        metrics.registry.set('furniture_replication_lag_seconds', (), round(lag_seconds, 3))
+        metrics.registry.set('furniture_replication_lag_changes', (), pending)
+        self.lag = {"seconds": round(lag_seconds, 3), "changes": pending}
+
+    def status(self):
+        return {
+            "enabled": True,
+            "ready": self.ready,
+            "replica": self.replica_path,
+            "applied_seq": self.applied_seq,
+            "lag": self.lag,
+            "error": self.last_error,
+        }
+
+
+# Копия процесса (создается при подготовке базы, если FURNITURE_ANALYTICS_DB задан)
+replicator = None
+
+def start(primary_path, replica_path=None):
+    global replicator
+    if replicator is None or replicator.primary_path != primary_path:
+        if replicator is not None:
+            replicator.stop()
+        replicator = Replicator(primary_path, replica_path or ANALYTICS_DB)
+    replicator.start()
+    return replicator
+
+def reporting_db_path(primary_path):
+    """Файл для отчетов: копия, если она готова, иначе основная база"""
+    if replicator is not None and replicator.ready:
+        return replicator.replica_path
+    return primary_path
@@ -0,0 +1,55 @@
+# conftest.py
+"""
+Модули приложения лежат в Practice_work без пакета: импорт из корня.
+Тесты работают во временном каталоге: база и файлы, которые пишет
+приложение, создаются там, рабочая furniture_production.db не трогается.
+"""
+import atexit
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+
+WORK_DIR = tempfile.mkdtemp(prefix='furniture_tests_')
+atexit.register(shutil.rmtree, WORK_DIR, True)
+os.environ['FURNITURE_DB_PATH'] = os.path.join(WORK_DIR, 'furniture_production.db')
+os.environ['FURNITURE_CSV_PATH'] = os.path.join(HERE, 'combined_data.csv')
+os.chdir(WORK_DIR)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Приложение на пустой временной базе с каталогом из CSV"""
+    import app
+    monkeypatch.setattr(app, 'DB_PATH', str(tmp_path / 'furniture.db'))
+    monkeypatch.setattr(app, '_db_ready', False)
+    app.ensure_db()
+    return app.app.test_client()
+
+
+@pytest.fixture
+def article(client):
+    """Первый артикул каталога"""
+    import app
+    conn = sqlite3.connect(app.DB_PATH)
+    article, = conn.execute("SELECT article FROM aggregated_products ORDER BY article LIMIT 1").fetchone()
+    conn.close()
+    return article
+
+
+@pytest.fixture
+def place_order(client, article):
+    """Создает заказ формой /api/create_order; по умолчанию - первый артикул каталога"""
+    def place(**fields):
+        form = dict({'product_article': article, 'quantity': 1,
+                     'customer_name': 'Иван', 'customer_phone': '+79160000001'}, **fields)
+        response = client.post('/api/create_order', data=form)
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+    return place
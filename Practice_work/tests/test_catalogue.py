@@ -0,0 +1,80 @@
+# test_catalogue.py
+"""Перезагрузка каталога из CSV разницей с текущими строками products"""
+import csv
+import os
+import sqlite3
+
+import pytest
+
+import app
+import catalogue
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_CSV = os.path.join(HERE, 'combined_data.csv')
+
+
+def read_rows():
+    with open(SOURCE_CSV, encoding='utf-8-sig', newline='') as file:
+        return list(csv.DictReader(file))
+
+
+def write_rows(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def cursor(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'furniture.db')
+    cursor = conn.cursor()
+    app.create_schema(cursor)
+    catalogue.reload_catalogue(cursor, SOURCE_CSV, 'v1')
+    yield cursor
+    conn.close()
+
+
+def products(cursor):
+    cursor.execute("SELECT id, article, workshop_name FROM products")
+    return {(article, workshop): product_id for product_id, article, workshop in cursor.fetchall()}
+
+
+def test_rekeyed_row_keeps_its_id_next_to_appended_rows(cursor, tmp_path):
+    rows = read_rows()
+    last_id = max(int(row['id']) for row in rows)
+    # Строка переехала в другой цех (новый ключ) с тем же id, в конец дописана строка со следующим id
+    rows[4]['workshop_name'] = 'Новый цех'
+    appended = dict(rows[0], id=str(last_id + 1), article='9000001')
+    path = tmp_path / 'catalogue.csv'
+    write_rows(path, rows + [appended])
+
+    report = catalogue.reload_catalogue(cursor, path, 'v2')
+
+    assert (report['rows_added'], report['rows_removed']) == (2, 1)
+    ids = products(cursor)
+    assert ids[(int(rows[4]['article']), 'Новый цех')] == int(rows[4]['id'])
+    assert ids[(9000001, appended['workshop_name'])] == last_id + 1
+
+
+def test_taken_id_is_assigned_after_explicit_ids(cursor, tmp_path):
+    rows = read_rows()
+    last_id = max(int(row['id']) for row in rows)
+    # Новая строка с id, занятым оставшейся строкой, и дописанная строка со следующим id
+    duplicate = dict(rows[0], id=rows[1]['id'], article='9000002')
+    appended = dict(rows[0], id=str(last_id + 1), article='9000003')
+    path = tmp_path / 'catalogue.csv'
+    write_rows(path, rows + [duplicate, appended])
+
+    catalogue.reload_catalogue(cursor, path, 'v2')
+
+    ids = products(cursor)
+    assert ids[(int(rows[1]['article']), rows[1]['workshop_name'])] == int(rows[1]['id'])
+    assert ids[(9000003, appended['workshop_name'])] == last_id + 1
+    assert ids[(9000002, duplicate['workshop_name'])] == last_id + 2
+
+
+def test_unchanged_csv_touches_nothing(cursor):
+    report = catalogue.reload_catalogue(cursor, SOURCE_CSV, 'v2')
+    assert report['id'] is None
+    assert report['rows_unchanged'] == len(read_rows())
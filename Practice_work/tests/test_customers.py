@@ -0,0 +1,37 @@
+# test_customers.py
+"""Покупатели: нормализация ключей и поиск одного покупателя по телефону или email"""
+import customers
+
+
+def test_phone_formats_give_one_key():
+    assert {customers.normalize_phone(phone) for phone in
+            ('8 (916) 123-45-67', '+7 916 1234567', '9161234567')} == {'79161234567'}
+    assert customers.customer_keys('+7 916 123-45-67', ' Ivan@Example.RU ') == [
+        'phone:79161234567', 'email:ivan@example.ru']
+    assert customers.customer_keys('12', 'не почта') == []
+
+
+def test_orders_with_same_phone_share_customer(client, place_order):
+    first = place_order(customer_phone='8 (916) 123-45-67')
+    second = place_order(customer_phone='+7 916 1234567', customer_name='Иван Петров')
+    assert first['customer_id'] == second['customer_id']
+
+    customer = client.get(f"/api/customers/{first['customer_id']}").get_json()
+    assert customer['orders_count'] == 2
+
+
+def test_email_match_links_new_phone_to_customer(client, place_order):
+    first = place_order(customer_phone='+79160000001', customer_email='ivan@example.ru')
+    second = place_order(customer_phone='+79990000002', customer_email='IVAN@example.ru')
+    assert first['customer_id'] == second['customer_id']
+
+    customer = client.get('/api/customers/lookup', query_string={'phone': '8 999 000-00-02'}).get_json()
+    assert customer['id'] == first['customer_id']
+    assert customer['keys'] == ['email:ivan@example.ru', 'phone:79160000001', 'phone:79990000002']
+
+
+def test_different_contacts_are_different_customers(client, place_order):
+    first = place_order(customer_phone='+79160000001')
+    second = place_order(customer_phone='+79160000002')
+    assert first['customer_id'] != second['customer_id']
+    assert client.get('/api/customers/lookup', query_string={'phone': '+79160000003'}).status_code == 404
@@ -0,0 +1,25 @@
+# test_etag.py
+"""Условные запросы: 304 на совпавший If-None-Match, новый ETag после изменения данных"""
+
+
+def test_matching_etag_gets_304_without_body(client):
+    first = client.get('/api/stats')
+    assert first.status_code == 200 and first.headers['ETag']
+
+    second = client.get('/api/stats', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304
+    assert second.data == b''
+
+
+def test_etag_changes_with_data(client, place_order):
+    etag = client.get('/api/stats').headers['ETag']
+    place_order()
+
+    response = client.get('/api/stats', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['total_orders'] == 1
+
+
+def test_streams_and_random_samples_have_no_etag(client):
+    assert 'ETag' not in client.get('/api/random_products').headers
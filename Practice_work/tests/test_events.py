@@ -0,0 +1,53 @@
+# test_events.py
+"""Лента заказов: возобновление по Last-Event-ID, reset для чужих и вытесненных id"""
+import asyncio
+import threading
+
+import events
+
+
+def next_chunks(stream, count):
+    return [next(stream) for _ in range(count)]
+
+
+def test_resume_from_last_event_id_skips_seen_events():
+    broker = events.EventBroker()
+    broker.publish('order_created', {'id': 1})
+    broker.publish('order_created', {'id': 2})
+    last_id = events.parse_last_event_id(f"{broker.epoch}-1", broker.epoch)
+
+    retry, chunk = next_chunks(events.stream_events(broker, last_id), 2)
+    assert retry.startswith('retry:')
+    assert chunk == f'id: {broker.epoch}-2\nevent: order_created\ndata: {{"id": 2}}\n\n'
+
+
+def test_foreign_last_event_id_gets_reset():
+    broker = events.EventBroker()
+    broker.publish('order_created', {'id': 1})
+    # id другого процесса: номер 1 ничего не значит для этого буфера
+    last_id = events.parse_last_event_id('0000abcd-1', broker.epoch)
+    assert last_id == events.FOREIGN_ID
+
+    _, chunk = next_chunks(events.stream_events(broker, last_id), 2)
+    assert chunk.startswith(f'id: {broker.epoch}-1\nevent: reset\n')
+
+
+def test_evicted_events_give_reset():
+    broker = events.EventBroker(history_size=2)
+    for n in range(5):
+        broker.publish('order_created', {'id': n})
+    assert broker.since(1) is None
+    assert [event[0] for event in broker.since(3)] == [4, 5]
+
+
+def test_async_subscriber_wakes_on_publish_from_thread():
+    broker = events.EventBroker()
+
+    async def subscribe():
+        waiter = asyncio.ensure_future(broker.wait_async(broker.last_id, timeout=5))
+        await asyncio.sleep(0.05)
+        threading.Thread(target=broker.publish, args=('order_created', {'id': 1})).start()
+        return await waiter
+
+    received = asyncio.run(subscribe())
+    assert [event[1:] for event in received] == [('order_created', {'id': 1})]
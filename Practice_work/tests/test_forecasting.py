@@ -0,0 +1,61 @@
+# test_forecasting.py
+"""Ежедневный пересчет прогноза: заявку в базе получает один воркер"""
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import app
+import forecasting
+
+
+@pytest.fixture
+def connect(client):
+    connections = []
+
+    def connect():
+        # Как у воркеров: отдельное соединение с явными транзакциями
+        conn = sqlite3.connect(app.DB_PATH, isolation_level=None)
+        connections.append(conn)
+        return conn
+    yield connect
+    for conn in connections:
+        conn.close()
+
+
+def test_only_one_worker_claims_stale_forecast(connect):
+    first, second = connect(), connect()
+    assert forecasting.claim_refresh(first)
+    assert not forecasting.claim_refresh(second)
+    assert 'refreshing_since' in forecasting.metadata(second.cursor())
+
+
+def test_refresh_clears_claim_and_forecast_is_fresh(connect):
+    conn = connect()
+    assert forecasting.claim_refresh(conn)
+    forecasting.refresh(conn)
+    meta = forecasting.metadata(conn.cursor())
+    assert 'refreshing_since' not in meta
+    assert not forecasting.is_stale(conn.cursor())
+    assert not forecasting.claim_refresh(connect())
+
+
+def test_released_or_expired_claim_can_be_taken(connect):
+    conn = connect()
+    assert forecasting.claim_refresh(conn)
+    forecasting.release_claim(conn)
+    assert forecasting.claim_refresh(conn)
+
+    # Воркер с заявкой упал: через CLAIM_TIMEOUT пересчет заявляет другой
+    expired = (datetime.now() - forecasting.CLAIM_TIMEOUT).isoformat(timespec='seconds')
+    conn.execute("UPDATE forecast_meta SET value = ? WHERE key = 'refreshing_since'", (expired,))
+    assert forecasting.claim_refresh(connect())
+
+
+def test_forecast_route_does_not_queue_refresh_claimed_elsewhere(client, connect, monkeypatch):
+    monkeypatch.setattr(app, '_forecast_job', None)
+    assert forecasting.claim_refresh(connect())
+
+    body = client.get('/api/forecast').get_json()
+    assert body['refresh_job'] is None
+    assert body['refreshing_since'] is not None
@@ -0,0 +1,87 @@
+# test_idempotency.py
+"""Ключи идемпотентности: повтор отправки возвращает исходный заказ без второй записи"""
+import sqlite3
+import uuid
+
+import pytest
+
+import app
+import idempotency
+
+
+def orders_count():
+    conn = sqlite3.connect(app.DB_PATH)
+    count, = conn.execute("SELECT COUNT(*) FROM orders").fetchone()
+    conn.close()
+    return count
+
+
+def test_repeated_key_replays_original_order(client, article, place_order):
+    key = uuid.uuid4().hex
+    first = place_order(idempotency_key=key)
+    second = client.post('/api/create_order', headers={'Idempotency-Key': key}, data={
+        'product_article': article, 'quantity': 1, 'customer_name': 'Иван', 'customer_phone': '+79160000001'})
+
+    assert second.status_code == 200
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert second.get_json()['order_id'] == first['order_id']
+    assert second.get_json()['replayed'] is True
+    assert orders_count() == 1
+
+
+def test_replay_after_cache_eviction_uses_unique_index(place_order):
+    key = uuid.uuid4().hex
+    first = place_order(idempotency_key=key)
+    idempotency.recent_orders.clear()
+
+    second = place_order(idempotency_key=key)
+    assert second['replayed'] is True
+    assert (second['order_id'], second['customer_id']) == (first['order_id'], first['customer_id'])
+    assert orders_count() == 1
+
+
+def test_without_key_every_submit_creates_order(place_order):
+    assert place_order()['order_id'] != place_order()['order_id']
+    assert orders_count() == 2
+
+
+@pytest.mark.parametrize('form, message', [
+    ({'idempotency_key': 'x' * (idempotency.MAX_KEY_LENGTH + 1)}, 'длиннее'),
+    ({'idempotency_key': 123}, 'строкой'),
+])
+def test_invalid_keys_are_rejected(form, message):
+    with pytest.raises(ValueError, match=message):
+        idempotency.request_key({}, form)
+
+
+def test_blank_key_is_ignored():
+    assert idempotency.request_key({'Idempotency-Key': '  '}, {}) is None
+    assert idempotency.request_key({}, {'idempotency_key': ' k1 '}) == 'k1'
+
+
+def cart_body(key, **fields):
+    conn = sqlite3.connect(app.DB_PATH)
+    articles = [row[0] for row in conn.execute("SELECT article FROM aggregated_products ORDER BY article LIMIT 2")]
+    conn.close()
+    return dict({'customer_name': 'Иван', 'customer_phone': '+79160000001', 'idempotency_key': key,
+                 'items': [{'product_article': article, 'quantity': 2} for article in articles]}, **fields)
+
+
+def test_cart_order_replay_writes_lines_once(client):
+    key = uuid.uuid4().hex
+    first = client.post('/api/orders', json=cart_body(key))
+    assert first.status_code == 200, first.get_json()
+    second = client.post('/api/orders', json=cart_body(key))
+
+    assert second.get_json()['replayed'] is True
+    assert second.get_json()['order_id'] == first.get_json()['order_id']
+    conn = sqlite3.connect(app.DB_PATH)
+    assert conn.execute("SELECT COUNT(*) FROM order_items").fetchone() == (2,)
+    conn.close()
+    assert orders_count() == 1
+
+
+def test_non_string_json_key_gets_400(client):
+    response = client.post('/api/orders', json=cart_body(123))
+    assert response.status_code == 400
+    assert orders_count() == 0
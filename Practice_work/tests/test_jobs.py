@@ -0,0 +1,88 @@
+# test_jobs.py
+"""Фоновые задачи: статус и результат, отмена, объединение одинаковых задач, TTL"""
+import os
+import threading
+import time
+
+import jobs
+
+
+def wait(job):
+    # Статус обновляет колбэк Future: ждем его, а не только результат
+    deadline = time.monotonic() + 10
+    while job.finished_at is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def write_file(ctx, text):
+    ctx.progress(50, 'Пишем файл')
+    path = ctx.result_path('result.txt')
+    with open(path, 'w') as file:
+        file.write(text)
+    return path
+
+
+def test_job_status_and_result():
+    manager = jobs.JobManager('thread', workers=1)
+    manager.register('write', write_file)
+    job = manager.submit('write', 'готово')
+    wait(job)
+
+    status = manager.status(manager.get(job.id))
+    assert status['status'] == jobs.DONE and status['progress'] == 100
+    with open(job.result) as file:
+        assert file.read() == 'готово'
+
+
+def test_running_job_stops_at_next_progress():
+    started, release = threading.Event(), threading.Event()
+
+    def blocking(ctx):
+        started.set()
+        release.wait(10)
+        ctx.progress(90, 'Почти')
+        return 'не должно вернуться'
+
+    manager = jobs.JobManager('thread', workers=1)
+    manager.register('blocking', blocking)
+    job = manager.submit('blocking')
+    assert started.wait(10)
+    assert manager.cancel(job.id)
+    release.set()
+    wait(job)
+    assert manager.get(job.id).status == jobs.CANCELLED
+    assert not manager.cancel(job.id)
+
+
+def test_shared_kind_returns_active_job_with_same_args():
+    release = threading.Event()
+
+    def blocking(ctx, key):
+        release.wait(10)
+        return key
+
+    manager = jobs.JobManager('thread', workers=2)
+    manager.register('shared', blocking, shared=True)
+    first = manager.submit('shared', 'a')
+    assert manager.submit('shared', 'a') is first
+    other = manager.submit('shared', 'b')
+    assert other is not first
+    release.set()
+    wait(first)
+    wait(other)
+    # Завершенная задача больше не объединяется с новой
+    again = manager.submit('shared', 'a')
+    assert again is not first
+    wait(again)
+
+
+def test_expired_job_is_evicted_with_its_file():
+    manager = jobs.JobManager('thread', workers=1, ttl=0)
+    manager.register('write', write_file)
+    job = manager.submit('write', 'временный')
+    wait(job)
+    assert os.path.exists(job.result)
+
+    manager.evict_expired()
+    assert manager.get(job.id) is None
+    assert not os.path.exists(job.result)
@@ -0,0 +1,63 @@
+# test_leadtime.py
+"""Оценка даты отгрузки: рабочие дни, очередь цехов из открытых заказов, кэш маршрутов"""
+from datetime import date
+
+import pytest
+
+import app
+import leadtime
+
+
+@pytest.mark.parametrize('start, days, expected', [
+    (date(2026, 10, 16), 1, date(2026, 10, 19)),   # пятница -> понедельник
+    (date(2026, 10, 17), 1, date(2026, 10, 19)),   # с субботы - как с пятницы
+    (date(2026, 10, 14), 5, date(2026, 10, 21)),   # неделя - тот же день недели
+    (date(2026, 10, 14), 0, date(2026, 10, 14)),
+])
+def test_add_workdays(start, days, expected):
+    assert leadtime.add_workdays(start, days) == expected
+
+
+@pytest.fixture
+def estimator(client):
+    # Очередь цехов без задержки снимка: каждая оценка видит текущие заказы
+    return leadtime.LeadTimeEstimator(app.get_db_connection, backlog_ttl=0)
+
+
+def test_open_orders_queue_ahead_of_new_order(client, place_order, article, estimator):
+    empty = estimator.estimate([(article, 1)], today=date(2026, 10, 19))
+    assert empty['queue_days'] == 0
+    assert empty['work_days'] >= 1 and empty['ship_date'] > '2026-10-19'
+
+    booked = estimator.estimate([(article, 5)])['production_days']
+    order_id = place_order(quantity=5)['order_id']
+    assert estimator.estimate([(article, 1)])['queue_days'] == pytest.approx(booked, abs=0.01)
+
+    # Отмененный заказ из очереди уходит
+    client.post(f'/api/orders/{order_id}/status', json={'status': 'отменён'})
+    assert estimator.estimate([(article, 1)])['queue_days'] == 0
+
+
+def test_unknown_article_is_not_cached(estimator, article):
+    with pytest.raises(KeyError):
+        estimator.estimate([(999999999, 1)])
+    estimator.route(article)
+    assert list(estimator._routes) == [article]
+
+
+def test_invalidate_drops_changed_routes_only(estimator):
+    conn = app.get_db_connection()
+    first, second = [row[0] for row in conn.execute(
+        "SELECT article FROM aggregated_products ORDER BY article LIMIT 2")]
+    conn.close()
+    estimator.route(first)
+    estimator.route(second)
+    estimator.invalidate([first])
+    assert list(estimator._routes) == [second]
+
+
+def test_lead_time_route(client, article):
+    response = client.get('/api/lead_time', query_string={'article': article, 'quantity': 2})
+    assert response.status_code == 200 and response.get_json()['work_days'] >= 1
+    assert client.get('/api/lead_time', query_string={'article': 999999999}).status_code == 404
+    assert client.get('/api/lead_time', query_string={'article': article, 'quantity': 0}).status_code == 400
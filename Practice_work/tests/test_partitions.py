@@ -0,0 +1,111 @@
+# test_partitions.py
+"""Секции заказов: перенос завершенных месяцев, страницы и сводка через секции, архивация"""
+import sqlite3
+import uuid
+
+import pytest
+
+import app
+import idempotency
+import metrics
+import partitions
+
+# Месяц заказа и статус; последние два остаются в горячей таблице
+ORDERS = [('2023-01-05', 'доставлен'), ('2023-01-20', 'отменён'), ('2023-02-03', 'доставлен'),
+          ('2023-02-10', 'новый'), (None, 'новый')]
+
+
+@pytest.fixture
+def orders(client, article):
+    """Заказы из ORDERS: первый - корзина из двух строк, ключи идемпотентности у всех"""
+    conn = sqlite3.connect(app.DB_PATH)
+    articles = [row[0] for row in conn.execute("SELECT article FROM aggregated_products ORDER BY article LIMIT 2")]
+    ids, keys = [], []
+    for n, (order_date, status) in enumerate(ORDERS):
+        key = uuid.uuid4().hex
+        items = [{'product_article': a, 'quantity': 1} for a in (articles if n == 0 else articles[:1])]
+        response = client.post('/api/orders', json={'customer_name': 'Иван', 'customer_phone': '+79160000001',
+                                                    'items': items, 'idempotency_key': key})
+        assert response.status_code == 200, response.get_json()
+        ids.append(response.get_json()['order_id'])
+        keys.append(key)
+        if order_date is not None:
+            conn.execute("UPDATE orders SET order_date = ?, status = ? WHERE id = ?",
+                         (f"{order_date}T10:00:00", status, ids[-1]))
+            conn.commit()
+    conn.close()
+    return ids, keys
+
+
+def maintain(tmp_path, archive_after=1000):
+    return partitions.maintain(app.DB_PATH, archive_after=archive_after, archive_dir=str(tmp_path / 'archive'))
+
+
+def test_rotate_moves_only_finished_orders(client, orders, tmp_path):
+    stats = client.get('/api/stats').get_json()
+    counts = client.get('/api/orders/status_counts').get_json()
+
+    assert maintain(tmp_path)['moved'] == {'2023-01': 2, '2023-02': 1}
+    conn = sqlite3.connect(app.DB_PATH)
+    assert conn.execute("SELECT COUNT(*) FROM orders").fetchone() == (2,)
+    assert conn.execute("SELECT COUNT(*) FROM orders_all").fetchone() == (5,)
+    conn.close()
+    # Сводка и счетчики статусов считают секции вместе с горячей таблицей
+    moved_stats = client.get('/api/stats').get_json()
+    assert (moved_stats['total_orders'], moved_stats['total_revenue']) == (stats['total_orders'], stats['total_revenue'])
+    assert client.get('/api/orders/status_counts').get_json() == counts
+
+
+def test_pages_walk_hot_table_and_partitions(client, orders, tmp_path):
+    ids, _ = orders
+    maintain(tmp_path)
+
+    seen, cursor = [], None
+    while True:
+        page = client.get('/api/orders/page', query_string={'limit': 2, 'cursor': cursor or ''}).get_json()
+        seen += [item['id'] for item in page['items']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    # Новые сверху: текущий заказ, затем 2023-02 и 2023-01 по убыванию даты
+    assert seen == [ids[4], ids[3], ids[2], ids[1], ids[0]]
+
+
+def test_archive_exports_headers_and_cart_lines(client, orders, tmp_path):
+    ids, _ = orders
+    revenue = client.get('/api/stats').get_json()['total_revenue']
+    maintain(tmp_path)
+    summary = maintain(tmp_path, archive_after=12)
+    assert set(summary['archived']) == {'2023-01', '2023-02'}
+
+    archive_dir = str(tmp_path / 'archive')
+    headers = list(partitions.read_archive('2023-01', archive_dir))
+    lines = list(partitions.read_archive('2023-01', archive_dir, partitions.ITEMS_PREFIX))
+    assert sorted(int(row['id']) for row in headers) == ids[:2]
+    assert {int(row['order_id']) for row in lines} == {ids[0]}
+
+    conn = sqlite3.connect(app.DB_PATH)
+    assert conn.execute("SELECT COUNT(*) FROM order_items WHERE order_id IN (?, ?, ?)", ids[:3]).fetchone() == (0,)
+    assert conn.execute("SELECT COUNT(*) FROM orders_all").fetchone() == (2,)
+    conn.close()
+    # Архив в сводке отдельно от заказов в базе
+    stats = client.get('/api/stats').get_json()
+    assert (stats['total_orders'], stats['archived_orders']) == (2, 3)
+    assert stats['total_revenue'] + stats['archived_revenue'] == pytest.approx(revenue)
+
+
+def test_key_of_moved_order_still_replays(client, article, orders, tmp_path):
+    ids, keys = orders
+    maintain(tmp_path)
+    idempotency.recent_orders.clear()
+
+    response = client.post('/api/create_order', data={'idempotency_key': keys[0], 'product_article': article,
+                                                      'quantity': 1, 'customer_name': 'Иван',
+                                                      'customer_phone': '+79160000001'})
+    assert response.get_json()['replayed'] is True
+    assert response.get_json()['order_id'] == ids[0]
+
+
+def test_partition_tables_share_one_metric_label():
+    labels = {metrics.normalize_statement(f"SELECT * FROM orders_p{month} WHERE id = 1") for month in ('202301', '202302')}
+    assert labels == {'SELECT * FROM orders_pYYYYMM WHERE id = ?'}
@@ -0,0 +1,66 @@
+# test_prices.py
+"""История цен: интервалы [valid_from, valid_to), цена на дату на границах интервалов"""
+import sqlite3
+
+import pytest
+
+import app
+import prices
+
+T1, T2 = '2025-03-01T00:00:00', '2025-06-01T00:00:00'
+
+
+@pytest.fixture
+def book(tmp_path):
+    """Артикул 1: 100 с начала времен, 120 с T1, снят с продажи в T2; артикул 2 - без изменений"""
+    path = str(tmp_path / 'prices.db')
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE aggregated_products (article INTEGER PRIMARY KEY, minimum_partner_price REAL)")
+    cursor.executemany("INSERT INTO aggregated_products VALUES (?, ?)", [(1, 100.0), (2, 50.0)])
+    prices.create_price_history_schema(cursor)
+    cursor.execute("UPDATE aggregated_products SET minimum_partner_price = 120 WHERE article = 1")
+    prices.record_prices(cursor, [1], at=T1)
+    cursor.execute("DELETE FROM aggregated_products WHERE article = 1")
+    prices.record_prices(cursor, [1], at=T2)
+    conn.commit()
+    conn.close()
+    return prices.PriceBook(lambda: sqlite3.connect(path))
+
+
+@pytest.mark.parametrize('moment, expected', [
+    ('1990-01-01T00:00:00', 100.0),        # первая цена действует с начала времен
+    ('2025-02-28T23:59:59.999999', 100.0),
+    (T1, 120.0),                           # начало интервала включено
+    ('2025-05-31T23:59:59', 120.0),
+    (T2, None),                            # конец не включен: снят с продажи
+    ('2026-01-01T00:00:00', None),
+])
+def test_price_at_interval_boundaries(book, moment, expected):
+    assert book.price_at(1, moment) == expected
+
+
+def test_history_lists_closed_intervals(book):
+    assert book.history(1) == [
+        {"valid_from": None, "valid_to": T1, "price": 100.0},
+        {"valid_from": T1, "valid_to": T2, "price": 120.0},
+    ]
+    assert book.price_at(2, '2026-01-01T00:00:00') == 50.0
+
+
+def test_unknown_article_is_not_cached(book):
+    assert book.price_at(3, T1) is None
+    book.price_at(1, T1)
+    assert list(book._intervals) == [1]
+    book.preload()
+    assert book.price_at(3, T1) is None
+
+
+def test_order_is_priced_by_server(client, place_order, article):
+    price = app.price_book.price_at(article)
+    order_id = place_order(quantity=2, unit_price=1, total_price=2)['order_id']
+    conn = sqlite3.connect(app.DB_PATH)
+    unit_price, total_price = conn.execute("SELECT unit_price, total_price FROM orders WHERE id = ?",
+                                           (order_id,)).fetchone()
+    conn.close()
+    assert (unit_price, total_price) == (price, 2 * price)
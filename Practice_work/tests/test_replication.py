@@ -0,0 +1,71 @@
+# test_replication.py
+"""Аналитическая копия: первичная копия, догон по журналу, сводка как у основной базы"""
+import sqlite3
+
+import pytest
+
+import app
+import partitions
+import replication
+
+
+@pytest.fixture
+def replica(client, tmp_path):
+    """Журнал изменений включен в основной базе, копия - отдельный файл"""
+    conn = sqlite3.connect(app.DB_PATH)
+    replication.create_changelog_schema(conn.cursor(), enabled=True)
+    conn.commit()
+    conn.close()
+    return replication.Replicator(app.DB_PATH, str(tmp_path / 'analytics.db'))
+
+
+def catch_up(replica):
+    while replica.sync_once():
+        pass
+
+
+def replica_orders(replica):
+    conn = sqlite3.connect(replica.replica_path)
+    rows = dict(conn.execute("SELECT id, status FROM orders"))
+    conn.close()
+    return rows
+
+
+def pending_changes():
+    conn = sqlite3.connect(app.DB_PATH)
+    count, = conn.execute("SELECT COUNT(*) FROM order_changes").fetchone()
+    conn.close()
+    return count
+
+
+def test_replica_catches_up_with_new_orders_and_status_changes(client, place_order, replica):
+    first = place_order()['order_id']
+    catch_up(replica)
+    assert replica.ready and replica_orders(replica) == {first: 'новый'}
+
+    second = place_order()['order_id']
+    client.post(f'/api/orders/{first}/status', json={'status': 'в производстве'})
+    assert replica_orders(replica) == {first: 'новый'}
+    catch_up(replica)
+    assert replica_orders(replica) == {first: 'в производстве', second: 'новый'}
+    # Примененные записи удалены из журнала основной базы
+    assert pending_changes() == 0
+    assert replica.status()['lag']['changes'] == 0
+
+
+def test_replica_stats_match_primary_after_archiving(client, place_order, replica, tmp_path, monkeypatch):
+    ids = [place_order()['order_id'] for _ in range(3)]
+    conn = sqlite3.connect(app.DB_PATH)
+    conn.execute("UPDATE orders SET order_date = '2023-01-05T10:00:00', status = 'доставлен' WHERE id IN (?, ?)",
+                 ids[:2])
+    conn.commit()
+    conn.close()
+    catch_up(replica)
+    partitions.maintain(app.DB_PATH, archive_after=12, archive_dir=str(tmp_path / 'archive'))
+    catch_up(replica)
+
+    assert replica_orders(replica) == {ids[2]: 'новый'}
+    primary_stats = app.query_stats()
+    monkeypatch.setattr(replication, 'replicator', replica)
+    assert app.analytics_db_path() == replica.replica_path
+    assert app.query_stats() == primary_stats
@@ -0,0 +1,52 @@
+# test_status.py
+"""Смена статуса заказа: разрешенные переходы, 409 на запрещенные, история и счетчики"""
+
+
+def change(client, order_id, status):
+    return client.post(f'/api/orders/{order_id}/status', json={'status': status})
+
+
+def test_allowed_transitions_are_recorded(client, place_order):
+    order_id = place_order()['order_id']
+    for status in ('в производстве', 'готов', 'доставлен'):
+        response = change(client, order_id, status)
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()['order']['status'] == status
+
+    events = client.get(f'/api/orders/{order_id}/events').get_json()
+    assert [event['to_status'] for event in events] == ['новый', 'в производстве', 'готов', 'доставлен']
+
+
+def test_rejected_transition_returns_409_with_allowed_statuses(client, place_order):
+    order_id = place_order()['order_id']
+    response = change(client, order_id, 'доставлен')
+    assert response.status_code == 409
+    body = response.get_json()
+    assert body['status'] == 'новый'
+    assert body['allowed'] == ['в производстве', 'отменён']
+
+
+def test_finished_order_cannot_change(client, place_order):
+    order_id = place_order()['order_id']
+    assert change(client, order_id, 'отменён').status_code == 200
+    response = change(client, order_id, 'в производстве')
+    assert response.status_code == 409
+    assert response.get_json()['allowed'] == []
+
+
+def test_unknown_status_and_missing_order(client, place_order):
+    order_id = place_order()['order_id']
+    assert change(client, order_id, 'потерян').status_code == 400
+    assert change(client, order_id + 1000, 'готов').status_code == 404
+
+
+def test_status_counts_follow_transitions(client, place_order):
+    first, second = place_order()['order_id'], place_order()['order_id']
+    change(client, first, 'в производстве')
+    change(client, second, 'отменён')
+
+    body = client.get('/api/orders/status_counts').get_json()
+    assert body['counts']['новый'] == 0
+    assert body['counts']['в производстве'] == 1
+    assert body['counts']['отменён'] == 1
+    assert body['open'] == 1
@@ -0,0 +1,102 @@
+# test_storage_postgres.py
+"""
+PostgresStorage на настоящем сервере: FURNITURE_TEST_DATABASE_URL или
+временный сервер pgserver (pip install pgserver). Без них тесты пропускаются.
+"""
+import os
+import sqlite3
+
+import pytest
+
+psycopg = pytest.importorskip('psycopg')
+
+import app
+import storage
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TABLES = ('orders', 'order_items', 'products', 'aggregated_products', 'catalogue_meta')
+
+
+@pytest.fixture(scope='session')
+def database_url(tmp_path_factory):
+    url = os.environ.get('FURNITURE_TEST_DATABASE_URL')
+    if url:
+        yield url
+        return
+    pgserver = pytest.importorskip('pgserver')
+    server = pgserver.get_server(str(tmp_path_factory.mktemp('pgdata')), cleanup_mode='stop')
+    yield server.get_uri()
+    server.cleanup()
+
+
+@pytest.fixture
+def backend(database_url, tmp_path, monkeypatch):
+    """Пустой сервер, каталог из CSV во временной базе SQLite, приложение на PostgreSQL"""
+    with psycopg.connect(database_url) as conn:
+        conn.execute("DROP TABLE IF EXISTS " + ", ".join(TABLES))
+    monkeypatch.setattr(app, 'DB_PATH', str(tmp_path / 'furniture.db'))
+    monkeypatch.setattr(app, 'CSV_PATH', os.path.join(HERE, 'combined_data.csv'))
+    monkeypatch.setattr(app, '_db_ready', False)
+    backend = storage.PostgresStorage(database_url)
+    monkeypatch.setattr(app, 'storage_backend', backend)
+    app.ensure_db()
+    return backend
+
+
+def make_orders(backend, count):
+    conn = sqlite3.connect(app.DB_PATH)
+    articles = [row[0] for row in conn.execute("SELECT article FROM aggregated_products ORDER BY article")]
+    conn.close()
+    order_data = {'customer_name': 'Иван', 'customer_phone': '+79160000000', 'customer_email': None,
+                  'delivery_address': None, 'order_notes': None, 'urgency': 'обычный',
+                  'payment_method': 'наличные', 'delivery_date': None}
+    ids = []
+    for n in range(count):
+        order = dict(order_data, urgency='срочный' if n % 3 == 0 else 'обычный')
+        # Несколько заказов в одну секунду: порядок страниц задает id
+        order_id, _, _ = backend.save_order(order, [{'product_article': articles[n % len(articles)], 'quantity': 2}],
+                                            f"2026-03-{1 + n // 4:02d}T10:00:00")
+        ids.append(order_id)
+    return ids
+
+
+def test_orders_page_walks_all_orders(backend):
+    ids = make_orders(backend, 25)
+    client = app.app.test_client()
+    seen, cursor, total = [], None, None
+    while True:
+        response = client.get('/api/orders/page', query_string={'limit': 10, 'cursor': cursor or ''})
+        assert response.status_code == 200
+        page = response.get_json()
+        if total is None:
+            total = page['total']
+        seen += [item['id'] for item in page['items']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert total == 25
+    assert seen == sorted(ids, key=lambda order_id: (ids.index(order_id) // 4, order_id), reverse=True)
+
+
+def test_orders_page_filters(backend):
+    make_orders(backend, 12)
+    client = app.app.test_client()
+    page = client.get('/api/orders/page', query_string={'urgency': 'срочный'}).get_json()
+    assert page['total'] == 4
+    page = client.get('/api/orders/page', query_string={'status': 'новый', 'date_to': '2026-03-01'}).get_json()
+    assert page['total'] == 4
+    page = client.get('/api/orders/page', query_string={'q': 'Иван', 'limit': 5}).get_json()
+    assert page['total'] == 12 and len(page['items']) == 5
+
+
+def test_status_counts(backend):
+    make_orders(backend, 7)
+    response = app.app.test_client().get('/api/orders/status_counts')
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert summary['counts']['новый'] == 7
+    assert summary['open'] == 7
+
+
+def test_sqlite_only_routes_answer_501(backend):
+    assert app.app.test_client().get('/api/orders/partitions').status_code == 501
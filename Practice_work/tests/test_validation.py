@@ -0,0 +1,47 @@
+# test_validation.py
+"""Проверка заказа по схеме: все ошибки одним ответом 400 до записи в базу"""
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+import app
+import validation
+
+
+def test_valid_form_is_parsed_with_defaults():
+    values = validation.ORDER_SCHEMA.validate({
+        'product_article': ' 42 ', 'quantity': '3', 'customer_name': ' Иван ', 'customer_phone': '+7 (916) 123-45-67',
+    })
+    assert values['product_article'] == 42 and values['quantity'] == 3
+    assert values['customer_name'] == 'Иван'
+    assert values['urgency'] == 'обычный' and values['delivery_date'] == ''
+
+
+@pytest.mark.parametrize('field, value, code', [
+    ('customer_name', '   ', 'required'),
+    ('customer_phone', '12-34', 'invalid_phone'),
+    ('customer_email', 'ivan@', 'invalid_email'),
+    ('quantity', '0', 'too_small'),
+    ('quantity', 'много', 'invalid'),
+    ('urgency', 'вчера', 'invalid_choice'),
+    ('delivery_date', (date.today() - timedelta(days=1)).isoformat(), 'date_too_early'),
+])
+def test_field_errors(field, value, code):
+    data = {'product_article': '1', 'quantity': '1', 'customer_name': 'Иван', 'customer_phone': '+79160000001'}
+    with pytest.raises(validation.ValidationError) as error:
+        validation.ORDER_SCHEMA.validate(dict(data, **{field: value}))
+    assert [(e['field'], e['code']) for e in error.value.errors] == [(field, code)]
+
+
+def test_invalid_order_gets_400_with_all_errors(client, article):
+    response = client.post('/api/create_order', data={
+        'product_article': article, 'quantity': '0', 'customer_name': '', 'customer_phone': 'нет',
+    })
+    assert response.status_code == 400
+    fields = {error['field'] for error in response.get_json()['errors']}
+    assert fields == {'quantity', 'customer_name', 'customer_phone'}
+
+    conn = sqlite3.connect(app.DB_PATH)
+    assert conn.execute("SELECT COUNT(*) FROM orders").fetchone() == (0,)
+    conn.close()
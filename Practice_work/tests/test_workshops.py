@@ -0,0 +1,74 @@
+# test_workshops.py
+"""Счетчики загрузки цехов: триггеры на заказы и строки корзин совпадают с полным пересчетом"""
+import sqlite3
+
+import pytest
+
+import app
+import workshops
+
+
+def load():
+    conn = sqlite3.connect(app.DB_PATH)
+    rows = {workshop: (round(hours, 6), lines) for workshop, hours, lines in
+            conn.execute("SELECT workshop_name, booked_hours, open_lines FROM workshop_load")}
+    conn.close()
+    # Цеха, где все вычли, - то же, что цеха без строки
+    return {workshop: value for workshop, value in rows.items() if value != (0, 0)}
+
+
+def rebuilt():
+    conn = sqlite3.connect(app.DB_PATH)
+    workshops.rebuild_workshop_load(conn.cursor())
+    conn.commit()
+    conn.close()
+    return load()
+
+
+def route_hours(article, quantity):
+    conn = sqlite3.connect(app.DB_PATH)
+    rows = conn.execute("SELECT workshop_name, SUM(total_labor_hours) FROM products WHERE article = ? "
+                        "GROUP BY workshop_name", (article,)).fetchall()
+    conn.close()
+    return {workshop: round(quantity * hours, 6) for workshop, hours in rows}
+
+
+def test_new_order_books_its_route(place_order, article):
+    place_order(quantity=3)
+    assert {workshop: hours for workshop, (hours, _) in load().items()} == route_hours(article, 3)
+
+
+def test_triggers_match_rebuild_through_status_changes(client, place_order):
+    conn = sqlite3.connect(app.DB_PATH)
+    articles = [row[0] for row in conn.execute("SELECT article FROM aggregated_products ORDER BY article LIMIT 3")]
+    conn.close()
+    single = place_order(product_article=articles[2], quantity=2)['order_id']
+    cart = client.post('/api/orders', json={
+        'customer_name': 'Иван', 'customer_phone': '+79160000001',
+        'items': [{'product_article': a, 'quantity': n + 1} for n, a in enumerate(articles[:2])],
+    }).get_json()['order_id']
+    assert load() == rebuilt()
+
+    for order_id, status in ((cart, 'в производстве'), (single, 'отменён'), (cart, 'готов')):
+        assert client.post(f'/api/orders/{order_id}/status', json={'status': status}).status_code == 200
+        counters = load()
+        assert counters == rebuilt(), status
+    assert counters == {}
+
+
+def test_deleted_open_order_releases_load(place_order):
+    order_id = place_order()['order_id']
+    conn = sqlite3.connect(app.DB_PATH)
+    conn.execute("DELETE FROM orders WHERE id = ?", (order_id,))
+    conn.commit()
+    conn.close()
+    assert load() == {}
+
+
+def test_utilization_orders_busiest_first(client, place_order):
+    place_order(quantity=10)
+    rows = client.get('/api/workshops').get_json()
+    assert rows[0]['open_lines'] >= 1
+    assert [row['queue_days'] for row in rows] == sorted((row['queue_days'] for row in rows), reverse=True)
+    assert rows[0]['load_percent'] == pytest.approx(
+        100 * rows[0]['booked_hours'] / (rows[0]['capacity_hours'] * workshops.PLANNING_DAYS), abs=0.1)
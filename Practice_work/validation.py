@@ -0,0 +1,229 @@
+# validation.py
+"""
+Проверка входных данных API до обращения к базе.
+
+Схема описывается словарем полей и компилируется один раз при импорте:
+регулярные выражения компилируются, списки допустимых значений превращаются
+в frozenset, а каждое поле - в готовую функцию разбора. Проверка запроса -
+это один проход по кортежу таких функций без разбора схемы на каждый вызов.
+Все ошибки собираются сразу и возвращаются списком
+{"field", "code", "message"}, чтобы форма могла подсветить все поля.
+"""
+import math
+import re
+from datetime import date, timedelta
+
+PHONE_PATTERN = re.compile(r'\+?[0-9 ()\-]{7,25}')
+EMAIL_PATTERN = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
+_NON_DIGITS = re.compile(r'\D')
+
+
+class ValidationError(ValueError):
+    """Ошибки проверки: errors - список {"field", "code", "message"}"""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(f"{error['field']}: {error['message']}" for error in errors))
+        self.errors = errors
+
+
+class _FieldError(Exception):
+    def __init__(self, code, message):
+        self.code = code
+        self.message = message
+
+
+def field(kind, required=False, default=None, **rules):
+    """Описание поля схемы: kind - str, int, float, choice, phone, email или date"""
+    return dict(rules, kind=kind, required=required, default=default)
+
+
+# ========== Разбор значений ==========
+def _parse_str(rules):
+    max_length = rules.get('max_length')
+
+    def parse(raw):
+        value = raw.strip()
+        if max_length is not None and len(value) > max_length:
+            raise _FieldError('too_long', f"Не длиннее {max_length} символов")
+        return value
+    return parse
+
+def _parse_number(rules, convert, kind_message):
+    minimum, maximum = rules.get('min'), rules.get('max')
+
+    def parse(raw):
+        try:
+            value = convert(raw.strip())
+        except ValueError:
+            raise _FieldError('invalid', kind_message) from None
+        if isinstance(value, float) and not math.isfinite(value):
+            raise _FieldError('invalid', kind_message)
+        if minimum is not None and value < minimum:
+            raise _FieldError('too_small', f"Не меньше {minimum}")
+        if maximum is not None and value > maximum:
+            raise _FieldError('too_large', f"Не больше {maximum}")
+        return value
+    return parse
+
+def _parse_choice(rules):
+    choices = frozenset(rules['choices'])
+    message = "Допустимые значения: " + ", ".join(rules['choices'])
+
+    def parse(raw):
+        value = raw.strip()
+        if value not in choices:
+            raise _FieldError('invalid_choice', message)
+        return value
+    return parse
+
+def _parse_phone(rules):
+    def parse(raw):
+        value = raw.strip()
+        digits = len(_NON_DIGITS.sub('', value))
+        if not PHONE_PATTERN.fullmatch(value) or not 10 <= digits <= 15:
+            raise _FieldError('invalid_phone', "Телефон в формате +7 (999) 123-45-67")
+        return value
+    return parse
+
+def _parse_email(rules):
+    def parse(raw):
+        value = raw.strip()
+        if len(value) > 254 or not EMAIL_PATTERN.fullmatch(value):
+            raise _FieldError('invalid_email', "Некорректный email")
+        return value
+    return parse
+
+def _parse_date(rules):
+    min_days, max_days = rules.get('min_days'), rules.get('max_days')
+
+    def parse(raw):
+        try:
+            value = date.fromisoformat(raw.strip())
+        except ValueError:
+            raise _FieldError('invalid_date', "Дата в формате ГГГГ-ММ-ДД") from None
+        today = date.today()
+        if min_days is not None and value < today + timedelta(days=min_days):
+            raise _FieldError('date_too_early', "Дата доставки не может быть в прошлом")
+        if max_days is not None and value > today + timedelta(days=max_days):
+            raise _FieldError('date_too_late', f"Дата доставки не позже чем через {max_days} дней")
+        return value.isoformat()
+    return parse
+
+_PARSERS = {
+    'str': _parse_str,
+    'int': lambda rules: _parse_number(rules, int, "Нужно целое число"),
+    'float': lambda rules: _parse_number(rules, float, "Нужно число"),
+    'choice': _parse_choice,
+    'phone': _parse_phone,
+    'email': _parse_email,
+    'date': _parse_date,
+}
+
+
+# ========== Компиляция схемы ==========
+class Schema:
+    def __init__(self, fields, checks=()):
+        # (имя, обязательное, значение по умолчанию, функция разбора)
+        self._fields = tuple(
+            (name, spec['required'], spec['default'], _PARSERS[spec['kind']](spec))
+            for name, spec in fields.items()
+        )
+        self._checks = tuple(checks)
+
+    def validate(self, data):
+        """
+        Разбирает данные формы/JSON (объект с .get) в словарь значений.
+        Пустые необязательные поля получают значение по умолчанию.
+        ValidationError - со всеми найденными ошибками.
+        """
+        values, errors = {}, []
+        for name, required, default, parse in self._fields:
+            raw = data.get(name)
+            if raw is not None and not isinstance(raw, str):
+                raw = str(raw)
+            if raw is None or not raw.strip():
+                if required:
+                    errors.append({"field": name, "code": 'required', "message": "Обязательное поле"})
+                values[name] = default
+                continue
+            try:
+                values[name] = parse(raw)
+            except _FieldError as e:
+                errors.append({"field": name, "code": e.code, "message": e.message})
+        if not errors:
+            # Проверки между полями - только если сами поля корректны
+            for check in self._checks:
+                error = check(values)
+                if error is not None:
+                    errors.append(error)
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+def compile_schema(fields, checks=()):
+    return Schema(fields, checks)
+
+
+# ========== Схема заказа ==========
+URGENCIES = ('обычный', 'срочный', 'очень срочно')
+PAYMENT_METHODS = ('наличные', 'карта', 'перевод')
+MAX_QUANTITY = 1000
+
+# Покупатель и условия заказа (общие для заказа из формы и корзины)
+_ORDER_DETAILS = {
+    'customer_name': field('str', required=True, max_length=200),
+    'customer_phone': field('phone', required=True),
+    'customer_email': field('email', default=''),
+    'delivery_address': field('str', default='', max_length=500),
+    'order_notes': field('str', default='', max_length=2000),
+    'urgency': field('choice', default='обычный', choices=URGENCIES),
+    'payment_method': field('choice', default='наличные', choices=PAYMENT_METHODS),
+    'delivery_date': field('date', default='', min_days=0, max_days=365),
+}
+
+# Цену и сумму считает сервер (история цен на дату заказа): поля формы с ценой не читаются
+ORDER_SCHEMA = compile_schema({
+    'product_article': field('int', required=True, min=1),
+    'quantity': field('int', required=True, min=1, max=MAX_QUANTITY),
+    **_ORDER_DETAILS,
+})
+
+
+# ========== Корзина ==========
+MAX_CART_ITEMS = 100
+
+CART_SCHEMA = compile_schema(_ORDER_DETAILS)
+ORDER_ITEM_SCHEMA = compile_schema({
+    'product_article': field('int', required=True, min=1),
+    'quantity': field('int', required=True, min=1, max=MAX_QUANTITY),
+})
+
+def validate_cart(data):
+    """
+    Заказ из корзины: {поля покупателя, "items": [{"product_article", "quantity"}, ...]}.
+    Возвращает (данные заказа, строки); одинаковые товары объединяются в одну строку.
+    """
+    errors, order_data, lines = [], None, {}
+    try:
+        order_data = CART_SCHEMA.validate(data)
+    except ValidationError as e:
+        errors += e.errors
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        errors.append({"field": 'items', "code": 'required', "message": "Корзина пуста"})
+    elif len(items) > MAX_CART_ITEMS:
+        errors.append({"field": 'items', "code": 'too_many', "message": f"Не больше {MAX_CART_ITEMS} позиций"})
+    else:
+        for n, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors.append({"field": f'items[{n}]', "code": 'invalid', "message": "Позиция должна быть объектом"})
+                continue
+            try:
+                line = ORDER_ITEM_SCHEMA.validate(item)
+            except ValidationError as e:
+                errors += [dict(error, field=f"items[{n}].{error['field']}") for error in e.errors]
+                continue
+            lines[line['product_article']] = lines.get(line['product_article'], 0) + line['quantity']
+    if errors:
+        raise ValidationError(errors)
+    return order_data, [{"product_article": article, "quantity": quantity} for article, quantity in lines.items()]
@@ -0,0 +1,151 @@
+# workshops.py
+"""
+Загрузка цехов открытыми заказами.
+
+Таблица workshop_load хранит по каждому цеху трудоемкость (чел.-ч) и число
+строк заказов, которые еще в работе (новые и в производстве). Ее ведут
+триггеры: вставка заказа или строки корзины прибавляет количество ×
+трудоемкость по маршруту артикула (products), переход заказа в готовый,
+доставленный или отмененный - вычитает. Поэтому экран загрузки и очередь
+в оценке даты отгрузки (leadtime.py) читают несколько строк на цех, а не
+все открытые заказы. При перезагрузке каталога трудоемкость меняется, и
+счетчики пересчитываются целиком (rebuild_workshop_load).
+
+Мощность цеха за смену - бригада × FURNITURE_SHIFT_HOURS чел.-ч.
+"""
+import os
+
+SHIFT_HOURS = float(os.environ.get('FURNITURE_SHIFT_HOURS', 8))
+# Горизонт планирования (рабочих дней) для процента загрузки
+PLANNING_DAYS = int(os.environ.get('FURNITURE_PLANNING_DAYS', 20))
+# Заказы, которые еще занимают цеха
+PRODUCTION_STATUSES = ('новый', 'в производстве')
+# Литерал для SQL триггеров (параметры в триггерах недоступны)
+_IN_PRODUCTION = "('" + "', '".join(PRODUCTION_STATUSES) + "')"
+
+_UPSERT = '''
+    ON CONFLICT (workshop_name) DO UPDATE SET
+        booked_hours = booked_hours + excluded.booked_hours,
+        open_lines = open_lines + excluded.open_lines
+'''
+
+# Строки открытых заказов: заказ с одним товаром - шапка, из корзины - order_items
+_OPEN_LINES_SQL = f'''
+    SELECT product_id, quantity FROM orders
+    WHERE status IN {_IN_PRODUCTION} AND items_count = 1
+    UNION ALL
+    SELECT i.product_id, i.quantity FROM orders o JOIN order_items i ON i.order_id = o.id
+    WHERE o.status IN {_IN_PRODUCTION} AND o.items_count > 1
+'''
+
+
+def create_workshop_load_schema(cursor):
+    """Таблица счетчиков и триггеры; для новой таблицы - начальный пересчет"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'workshop_load'")
+    load_exists = cursor.fetchone() is not None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS workshop_load (
+        workshop_name TEXT PRIMARY KEY,
+        booked_hours REAL NOT NULL DEFAULT 0,
+        open_lines INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    if not load_exists:
+        rebuild_workshop_load(cursor)
+
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_workshop_load_insert AFTER INSERT ON orders
+    WHEN NEW.status IN {_IN_PRODUCTION} AND NEW.items_count = 1
+    BEGIN
+        INSERT INTO workshop_load (workshop_name, booked_hours, open_lines)
+        SELECT workshop_name, NEW.quantity * COALESCE(total_labor_hours, 0), 1
+        FROM products WHERE article = NEW.product_id
+        {_UPSERT};
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_workshop_load_item AFTER INSERT ON order_items
+    WHEN (SELECT status FROM orders WHERE id = NEW.order_id) IN {_IN_PRODUCTION}
+    BEGIN
+        INSERT INTO workshop_load (workshop_name, booked_hours, open_lines)
+        SELECT workshop_name, NEW.quantity * COALESCE(total_labor_hours, 0), 1
+        FROM products WHERE article = NEW.product_id
+        {_UPSERT};
+    END
+    ''')
+    # Заказ вошел в производство (+1) или вышел из него (-1).
+    # WHERE 1 обязателен: без него ON CONFLICT читается как условие JOIN
+    for name, event, row, when, sign in (
+        ('trg_workshop_load_status', 'UPDATE OF status', 'NEW',
+         f"(OLD.status IN {_IN_PRODUCTION}) IS NOT (NEW.status IN {_IN_PRODUCTION})",
+         f"CASE WHEN NEW.status IN {_IN_PRODUCTION} THEN 1 ELSE -1 END"),
+        ('trg_workshop_load_delete', 'DELETE', 'OLD', f"OLD.status IN {_IN_PRODUCTION}", "-1"),
+    ):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON orders
+        WHEN {when}
+        BEGIN
+            INSERT INTO workshop_load (workshop_name, booked_hours, open_lines)
+            SELECT p.workshop_name, {sign} * x.quantity * COALESCE(p.total_labor_hours, 0), {sign}
+            FROM (
+                SELECT {row}.product_id AS product_id, {row}.quantity AS quantity WHERE {row}.items_count = 1
+                UNION ALL
+                SELECT product_id, quantity FROM order_items WHERE order_id = {row}.id AND {row}.items_count > 1
+            ) x
+            JOIN products p ON p.article = x.product_id
+            WHERE 1
+            {_UPSERT};
+        END
+        ''')
+
+
+def rebuild_workshop_load(cursor):
+    """Полный пересчет счетчиков по открытым заказам (после загрузки каталога)"""
+    cursor.execute("DELETE FROM workshop_load")
+    cursor.execute(f'''
+        INSERT INTO workshop_load (workshop_name, booked_hours, open_lines)
+        SELECT p.workshop_name, SUM(x.quantity * COALESCE(p.total_labor_hours, 0)), COUNT(*)
+        FROM ({_OPEN_LINES_SQL}) x
+        JOIN products p ON p.article = x.product_id
+        GROUP BY p.workshop_name
+    ''')
+
+
+def booked_hours(cursor):
+    """Цех -> чел.-ч открытых заказов"""
+    cursor.execute("SELECT workshop_name, booked_hours FROM workshop_load")
+    return dict(cursor.fetchall())
+
+def utilization(cursor, shift_hours=SHIFT_HOURS, planning_days=PLANNING_DAYS):
+    """
+    Загрузка цехов: трудоемкость открытых заказов против мощности бригады.
+    queue_days - рабочих дней до разбора очереди, load_percent - доля
+    мощности за горизонт планирования. Самые загруженные цеха - первыми.
+    """
+    cursor.execute('''
+        SELECT w.workshop_name, w.workshop_type, w.people,
+               COALESCE(l.booked_hours, 0), COALESCE(l.open_lines, 0)
+        FROM (
+            SELECT workshop_name, MAX(workshop_type) AS workshop_type,
+                   MAX(number_of_people_for_production) AS people
+            FROM products GROUP BY workshop_name
+        ) w
+        LEFT JOIN workshop_load l ON l.workshop_name = w.workshop_name
+    ''')
+    rows = []
+    for workshop, workshop_type, people, hours, open_lines in cursor.fetchall():
+        capacity = max(people or 1, 1) * shift_hours
+        # Накопленная погрешность вычитаний не должна давать -0.0
+        hours = max(hours, 0.0)
+        rows.append({
+            "workshop_name": workshop,
+            "workshop_type": workshop_type,
+            "people": people,
+            "capacity_hours": capacity,
+            "booked_hours": round(hours, 1),
+            "open_lines": open_lines,
+            "queue_days": round(hours / capacity, 1),
+            "load_percent": round(100 * hours / (capacity * planning_days), 1),
+        })
+    rows.sort(key=lambda row: row['queue_days'], reverse=True)
+    return rows